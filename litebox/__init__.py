@@ -1 +1,5 @@
 from litebox.main import LiteBox
+from litebox.query import Q
+from litebox.tracking import Tracked, tracked
+from litebox.utils import Text
+from litebox.rtree import RTree
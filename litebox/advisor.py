@@ -0,0 +1,148 @@
+"""
+Query log and index advisor, used by LiteBox(log_queries=True) and LiteBox(auto_index=True).
+
+The log keeps, for each query shape seen by find(), how often it ran, how long it took, and how
+many objects it returned. Each shape maps to a candidate index: the columns it compares for
+equality, followed by at most one column it compares by range. Candidates that aren't covered by
+an existing index are suggested in order of the time spent on their queries.
+
+Counts decay by half every time decay() is called, so the log follows a changing query mix.
+"""
+
+from collections import OrderedDict
+from typing import Collection, Iterable, List, Optional, Tuple
+
+from litebox.constants import QUERY_CACHE_SIZE
+from litebox.exceptions import InvalidQueryError
+from litebox.planner import INDEX_MAX_EXPONENT
+from litebox.where import And, Between, Compare, In, IsNull, Node, parse_where
+
+AUTO_INDEX_INTERVAL = 100  # auto_index reconsiders indices every this many queries
+AUTO_INDEX_MIN_RUNS = 10  # a candidate needs this many recent queries to be created
+AUTO_INDEX_MIN_SECONDS = 0.05  # and this much recent time spent on them
+MAX_AUTO_INDICES = 4  # most indices auto_index will keep at once
+
+# A candidate is (equality columns, range column or None).
+Candidate = Tuple[Tuple[str, ...], Optional[str]]
+
+
+class ShapeStats:
+    def __init__(self, candidate: Optional[Candidate]):
+        self.candidate = candidate
+        self.runs = 0.0
+        self.seconds = 0.0
+        self.rows = 0.0
+
+
+def candidate_index(node: Node) -> Optional[Candidate]:
+    """Get the index that would best serve a parsed where clause, or None if there isn't one."""
+    children = node.children if isinstance(node, And) else [node]
+    eq_cols = set()
+    range_cols = []
+    for child in children:
+        if (
+            (isinstance(child, Compare) and child.op == "=")
+            or (isinstance(child, In) and not child.negated)
+            or (isinstance(child, IsNull) and not child.negated)
+        ):
+            eq_cols.add(child.field)
+        elif (isinstance(child, Compare) and child.op != "!=") or isinstance(
+            child, Between
+        ):
+            range_cols.append(child.field)
+    range_cols = [c for c in range_cols if c not in eq_cols]
+    if not eq_cols and not range_cols:
+        return None
+    # Equality columns can go in any order; sort them so equivalent queries agree.
+    return tuple(sorted(eq_cols)), (range_cols[0] if range_cols else None)
+
+
+def index_columns(candidate: Candidate) -> Tuple[str, ...]:
+    eq_cols, range_col = candidate
+    return eq_cols if range_col is None else eq_cols + (range_col,)
+
+
+def covers(index_cols: Tuple[str, ...], candidate: Candidate) -> bool:
+    """Check whether an existing index serves a candidate as well as the candidate would."""
+    eq_cols, range_col = candidate
+    n = len(eq_cols)
+    if set(index_cols[:n]) != set(eq_cols):
+        return False
+    return range_col is None or index_cols[n : n + 1] == (range_col,)
+
+
+class QueryLog:
+    def __init__(self, fields: Collection[str], per_column: bool = False):
+        self.fields = fields
+        self.per_column = per_column  # suggest single-column indices only
+        self.shapes = OrderedDict()  # maps {where template: ShapeStats}, LRU
+        self.n_logged = 0
+
+    def record(
+        self, template: str, seconds: float, n_found: int, node: Optional[Node] = None
+    ):
+        """Log a query run. node is its parse tree, if it's already been parsed."""
+        stats = self.shapes.pop(template, None)  # re-inserted below, as most recent
+        if stats is None:
+            try:
+                if node is None:
+                    node = parse_where(template, self.fields)
+                candidate = candidate_index(node)
+            except InvalidQueryError:
+                candidate = None  # SQL the parser doesn't handle; no suggestion for it
+            if candidate is not None and self.per_column:
+                eq_cols, range_col = candidate
+                candidate = (eq_cols[:1], None) if eq_cols else candidate
+            stats = ShapeStats(candidate)
+        self.shapes[template] = stats
+        if len(self.shapes) > QUERY_CACHE_SIZE:
+            self.shapes.popitem(last=False)
+        stats.runs += 1
+        stats.seconds += seconds
+        stats.rows += n_found
+        self.n_logged += 1
+
+    def decay(self):
+        for stats in self.shapes.values():
+            stats.runs /= 2
+            stats.seconds /= 2
+            stats.rows /= 2
+
+    def suggest(
+        self,
+        existing: Iterable[Tuple[str, ...]],
+        n_rows: int,
+        min_runs: float = 1,
+        min_seconds: float = 0,
+    ) -> List[Tuple[str, ...]]:
+        """
+        Get the column tuples of indices worth creating, best first. Skips candidates covered by
+        the existing indices, and those whose queries return too many rows for an index to help.
+        """
+        existing = list(existing)
+        totals = dict()  # maps {candidate: [runs, seconds, rows]}
+        for stats in self.shapes.values():
+            if stats.candidate is None:
+                continue
+            total = totals.setdefault(stats.candidate, [0.0, 0.0, 0.0])
+            total[0] += stats.runs
+            total[1] += stats.seconds
+            total[2] += stats.rows
+        max_rows = n_rows**INDEX_MAX_EXPONENT
+        ranked = []
+        for candidate, (runs, seconds, rows) in totals.items():
+            if runs < min_runs or seconds < min_seconds or rows / runs >= max_rows:
+                continue
+            if any(covers(cols, candidate) for cols in existing):
+                continue
+            ranked.append((seconds, index_columns(candidate)))
+        ranked.sort(key=lambda sc: -sc[0])
+        return [cols for _, cols in ranked]
+
+    def uses(self, index_cols: Tuple[str, ...]) -> float:
+        """How many recent queries (decayed) an index serves."""
+        return sum(
+            stats.runs
+            for stats in self.shapes.values()
+            if stats.candidate is not None and covers(index_cols, stats.candidate)
+        )
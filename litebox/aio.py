@@ -0,0 +1,228 @@
+"""
+asyncio interface to LiteBox.
+
+AsyncLiteBox runs all of its LiteBox's work on one dedicated thread, so slow queries and bulk
+adds don't block the event loop. That thread builds the LiteBox and owns its SQLite connection.
+Work runs in the order it was submitted.
+
+Two optimizations for busy services:
+ - Identical finds that overlap in time run once, and each caller gets a copy of the result.
+ - add() calls made in the same event loop tick are sent to the thread as one add_many().
+
+    abox = AsyncLiteBox(objs, on={'size': int})
+    big = await abox.find('size > ?', (1000,))
+    async for obj in abox.find_iter('size > 10'):
+        ...
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Union
+
+from litebox.main import LiteBox
+from litebox.query import to_sql
+from litebox.resultset import ResultSet
+from litebox.where import Node
+
+
+class AsyncLiteBox:
+    def __init__(self, *args, **kwargs):
+        """Takes the same arguments as LiteBox. The LiteBox is built on the worker thread."""
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="litebox")
+        self._box_future = self._executor.submit(LiteBox, *args, **kwargs)
+        self._inflight = dict()  # maps {find args: future}, for coalescing
+        self._add_batch = None  # objects from add() calls waiting to be sent
+        self._add_future = None  # resolves when the current add batch is done
+
+    @property
+    def box(self) -> LiteBox:
+        """The underlying LiteBox. Blocks until it is built."""
+        return self._box_future.result()
+
+    async def find(
+        self,
+        where: Optional[Union[str, Node]] = None,
+        params: Optional[Union[Sequence, Dict[str, Any]]] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        order_by: Optional[str] = None,
+        columns: Optional[Sequence[str]] = None,
+        arrays: bool = False,
+        within: Optional[ResultSet] = None,
+        result_set: bool = False,
+        match: Optional[Union[str, Dict[str, str]]] = None,
+    ) -> Union[List[Any], Dict[str, Any], ResultSet]:
+        key = None
+        # Only results that are copied for each caller are shared.
+        if not arrays and not result_set and within is None and match is None:
+            key = _find_key(where, params, limit, offset, order_by, columns)
+        fut = self._inflight.get(key) if key is not None else None
+        if fut is not None:
+            # Someone is already running this find; share its result.
+            return list(await asyncio.shield(fut))
+        fut = self._submit(
+            lambda box: box.find(
+                where,
+                params,
+                limit,
+                offset,
+                order_by,
+                columns,
+                arrays,
+                within,
+                result_set,
+                match,
+            )
+        )
+        if key is None:
+            return await fut
+        self._inflight[key] = fut
+        try:
+            return await asyncio.shield(fut)
+        finally:
+            if self._inflight.get(key) is fut:
+                del self._inflight[key]
+
+    async def find_iter(
+        self,
+        where: Optional[Union[str, Node]] = None,
+        params: Optional[Union[Sequence, Dict[str, Any]]] = None,
+        batch_size: int = 1000,
+        order_by: Optional[str] = None,
+    ):
+        """Like LiteBox.find_iter(), reading batch_size objects per trip to the worker thread."""
+        it = await self._submit(
+            lambda box: box.find_iter(where, params, batch_size, order_by)
+        )
+        while True:
+            batch = await self._submit(lambda box: list(islice(it, batch_size)))
+            if not batch:
+                return
+            for obj in batch:
+                yield obj
+
+    async def find_ids(
+        self,
+        where=None,
+        params=None,
+        limit=None,
+        offset=None,
+        order_by=None,
+        within=None,
+        match=None,
+    ) -> List[int]:
+        return await self._submit(
+            lambda box: box.find_ids(
+                where, params, limit, offset, order_by, within, match
+            )
+        )
+
+    async def count(self, where=None, params=None) -> int:
+        return await self._submit(lambda box: box.count(where, params))
+
+    async def exists(self, where=None, params=None) -> bool:
+        return await self._submit(lambda box: box.exists(where, params))
+
+    async def aggregate(self, where, aggregates, params=None, group_by=None):
+        return await self._submit(
+            lambda box: box.aggregate(where, aggregates, params, group_by)
+        )
+
+    async def explain(self, where, params=None) -> Dict[str, Any]:
+        return await self._submit(lambda box: box.explain(where, params))
+
+    async def add(self, obj: Any):
+        """Add an object. Adds made in the same event loop tick go in one add_many()."""
+        loop = asyncio.get_running_loop()
+        if self._add_batch is None:
+            self._add_batch = []
+            self._add_future = loop.create_future()
+            loop.call_soon(self._flush_adds)
+        self._add_batch.append(obj)
+        await asyncio.shield(self._add_future)
+
+    async def add_many(self, objs: Iterable[Any], columns=None):
+        await self._write(lambda box: box.add_many(objs, columns))
+
+    async def update(self, obj: Any):
+        await self._write(lambda box: box.update(obj))
+
+    async def update_many(self, objs: Iterable[Any]) -> List[Any]:
+        return await self._write(lambda box: box.update_many(objs))
+
+    async def remove(self, obj: Any):
+        await self._write(lambda box: box.remove(obj))
+
+    async def remove_many(self, objs: Iterable[Any]) -> List[Any]:
+        return await self._write(lambda box: box.remove_many(objs))
+
+    def close(self):
+        """Stop the worker thread, after it finishes the work already submitted."""
+        self._flush_adds()
+        self._executor.shutdown(wait=True)
+
+    async def __aenter__(self) -> "AsyncLiteBox":
+        return self
+
+    async def __aexit__(self, *exc):
+        self._flush_adds()
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    def __len__(self) -> int:
+        return len(self.box)
+
+    def __contains__(self, obj: Any) -> bool:
+        return obj in self.box
+
+    def _submit(self, fn: Callable[[LiteBox], Any]) -> asyncio.Future:
+        """Run fn(box) on the worker thread, after any work submitted before it."""
+        self._flush_adds()
+        return asyncio.wrap_future(self._executor.submit(lambda: fn(self.box)))
+
+    def _write(self, fn: Callable[[LiteBox], Any]) -> asyncio.Future:
+        # Finds submitted after this write must not share results from before it.
+        self._inflight.clear()
+        return self._submit(fn)
+
+    def _flush_adds(self):
+        """Send the objects from pending add() calls to the worker thread as one add_many()."""
+        if self._add_batch is None:
+            return
+        batch, done = self._add_batch, self._add_future
+        self._add_batch = self._add_future = None
+        self._inflight.clear()
+        work = self._executor.submit(lambda: self.box.add_many(batch))
+        loop = done.get_loop()
+        work.add_done_callback(
+            lambda w: loop.call_soon_threadsafe(_copy_outcome, w, done)
+        )
+
+
+def _copy_outcome(src, dst: asyncio.Future):
+    """Resolve dst with the result or exception of the finished future src."""
+    if dst.cancelled():
+        return
+    if src.exception() is not None:
+        dst.set_exception(src.exception())
+    else:
+        dst.set_result(src.result())
+
+
+def _find_key(where, params, limit, offset, order_by, columns=None) -> Optional[tuple]:
+    """A hashable key for a find() call, or None if its arguments aren't hashable."""
+    try:
+        if isinstance(where, Node):
+            sql, args, in_lists = to_sql(where)
+            where = (sql, tuple(args), tuple(map(tuple, in_lists)))
+        if isinstance(params, dict):
+            params = tuple(sorted(params.items()))
+        elif params is not None:
+            params = tuple(params)
+        if columns is not None and not isinstance(columns, str):
+            columns = tuple(columns)
+        key = (where, params, limit, offset, order_by, columns)
+        hash(key)
+        return key
+    except TypeError:
+        return None
@@ -0,0 +1,451 @@
+"""
+Pure-Python columnar engine, used by LiteBox(engine="columnar").
+
+Each field is stored as a column (a list of values, one per slot). Indexed columns also keep a
+sorted index: the non-null values in order, with a parallel array of the slots holding them.
+Range and equality predicates are answered with bisect on the sorted index, and the results are
+intersected or filtered per slot. No SQL is involved.
+
+Stored and query values are converted to the type of their field, the way SQLite's column
+affinity would: '5' stored in an int field is 5, and s = 1 on a str field compares with '1'.
+Values that still differ in type sort the way SQLite orders them: numbers before text, and text
+before bytes.
+"""
+
+import re
+from array import array
+from itertools import compress, repeat
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from litebox.exceptions import InvalidQueryError
+from litebox.fieldtypes import sqlite_type
+from litebox.where import OPS, And, Between, Compare, In, IsNull, Node, Or, resolve
+
+AGGREGATE_RE = re.compile(
+    r"^\s*(count|sum|avg|min|max)\s*\(\s*(\*|\w+)\s*\)\s*$", re.IGNORECASE
+)
+NUMBER_RE = re.compile(r"^\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?\s*$")
+# SQLite sorts values of different storage classes as NULL < numbers < text < blobs.
+NULL_CLASS, NUMERIC_CLASS, TEXT_CLASS, BLOB_CLASS = 0, 1, 2, 3
+AFFINITY_CLASSES = {"INTEGER": NUMERIC_CLASS, "REAL": NUMERIC_CLASS, "TEXT": TEXT_CLASS}
+# Types that each affinity stores as they are.
+NATIVE_TYPES = {
+    NUMERIC_CLASS: {int, float, bool, type(None)},
+    TEXT_CLASS: {str, type(None)},
+}
+
+
+def storage_class(value: Any) -> int:
+    if isinstance(value, (int, float)):
+        return NUMERIC_CLASS
+    return TEXT_CLASS if isinstance(value, str) else BLOB_CLASS
+
+
+def sort_key(value: Any) -> Tuple[int, Any]:
+    """Key that orders values of any type the way SQLite does."""
+    if value is None:
+        return NULL_CLASS, 0
+    return storage_class(value), value
+
+
+def apply_affinity(value: Any, affinity: int) -> Any:
+    """Convert a value as SQLite does when storing it in, or comparing it with, a column."""
+    if affinity == NUMERIC_CLASS and isinstance(value, str):
+        m = NUMBER_RE.match(value)
+        if m is None:
+            return value
+        return float(value) if m.group(2) or "." in m.group(1) else int(value)
+    if affinity == TEXT_CLASS and isinstance(value, (int, float)):
+        return repr(value) if isinstance(value, float) else str(int(value))
+    return value
+
+
+class SortedIndex:
+    """
+    Non-null values of one column in sorted order, with the slot of each value. Once values of
+    more than one storage class are present, the keys are their sort_key()s instead.
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.slots = array("q")
+        self.dirty = True
+        self.mixed = False
+
+    def rebuild(self, column: List[Any], live: Iterable[int]):
+        order = [s for s in live if column[s] is not None]
+        try:
+            order.sort(key=column.__getitem__)
+            self.keys = list(map(column.__getitem__, order))
+            self.mixed = False
+        except TypeError:
+            order.sort(key=lambda s: sort_key(column[s]))
+            self.keys = [sort_key(column[s]) for s in order]
+            self.mixed = True
+        self.slots = array("q", order)
+        self.dirty = False
+
+    def insert(self, value: Any, slot: int):
+        if self.dirty or value is None:
+            return
+        if not self.mixed and self.keys and self._other_class(value):
+            self.keys = list(map(sort_key, self.keys))
+            self.mixed = True
+        key = sort_key(value) if self.mixed else value
+        pos = bisect_right(self.keys, key)
+        self.keys.insert(pos, key)
+        self.slots.insert(pos, slot)
+
+    def delete(self, value: Any, slot: int):
+        if self.dirty or value is None:
+            return
+        pos = bisect_left(self.keys, sort_key(value) if self.mixed else value)
+        while self.slots[pos] != slot:
+            pos += 1
+        del self.keys[pos]
+        del self.slots[pos]
+
+    def span(self, op: str, value: Any):
+        """Get the (start, stop) positions in keys that satisfy 'key <op> value'."""
+        if value is None:
+            return 0, 0
+        if self.mixed:
+            value = sort_key(value)
+        elif self.keys and self._other_class(value):
+            # Every key is on the same side of a value of another storage class.
+            everything = OPS[op](storage_class(self.keys[0]), storage_class(value))
+            return (0, len(self.keys)) if everything else (0, 0)
+        if op == "=":
+            return bisect_left(self.keys, value), bisect_right(self.keys, value)
+        if op == "<":
+            return 0, bisect_left(self.keys, value)
+        if op == "<=":
+            return 0, bisect_right(self.keys, value)
+        if op == ">":
+            return bisect_right(self.keys, value), len(self.keys)
+        if op == ">=":
+            return bisect_left(self.keys, value), len(self.keys)
+        raise ValueError(op)
+
+    def _other_class(self, value: Any) -> bool:
+        return storage_class(value) != storage_class(self.keys[0])
+
+
+class ColumnarEngine:
+    def __init__(self, columns: Dict[str, type]):
+        """columns maps {column name: field type}."""
+        self.columns = {c: [] for c in columns}
+        self.col_list = [self.columns[c] for c in columns]
+        self.affinities = {
+            c: AFFINITY_CLASSES.get(sqlite_type(t), BLOB_CLASS)
+            for c, t in columns.items()
+        }
+        self._affinity_list = list(self.affinities.values())
+        self.ptrs = []  # slot -> ptr, or None if the slot is free
+        self.slot_of = dict()  # ptr -> slot
+        self.free = []
+        self.indices = dict()  # maps {column name: SortedIndex}
+
+    def create_index(self, column: str):
+        if column not in self.indices:
+            self.indices[column] = SortedIndex()
+            self._index(column)
+
+    def drop_index(self, column: str):
+        del self.indices[column]
+
+    def insert(self, ptr: int, values: Sequence[Any]):
+        values = list(map(apply_affinity, values, self._affinity_list))
+        slot = self._claim_slot(ptr, values)
+        try:
+            for name, idx in self.indices.items():
+                idx.insert(self.columns[name][slot], slot)
+        except TypeError:
+            # Values that can't be ordered; leave the engine as it was.
+            self._release_slot(slot)
+            for idx in self.indices.values():
+                idx.dirty = True
+            raise
+
+    def insert_many(self, ptrs: Sequence[int], rows: Iterable[Sequence[Any]]):
+        slots = [self._claim_slot(ptr, values) for ptr, values in zip(ptrs, rows)]
+        self._apply_affinities(slots)
+        # Cheaper to sort once on the next query than to insort each value.
+        for idx in self.indices.values():
+            idx.dirty = True
+
+    def delete(self, ptr: int):
+        slot = self.slot_of[ptr]
+        for name, idx in self.indices.items():
+            idx.delete(self.columns[name][slot], slot)
+        self._release_slot(slot)
+
+    def query(self, node: Node, params: Any = None) -> List[int]:
+        """Get the ptrs of rows matching the node, in slot order."""
+        slots = set(self._eval(node, params))
+        ptrs = self.ptrs
+        return [ptrs[s] for s in sorted(slots)]
+
+    def sort(self, ptrs: List[int], keys: List[Tuple[str, bool]]) -> List[int]:
+        """Sort ptrs by [(column, descending), ...]. Nulls sort first, as in SQLite."""
+        slot_of = self.slot_of
+        for name, descending in reversed(keys):
+            col = self.columns[name]
+
+            def key(ptr):
+                return sort_key(col[slot_of[ptr]])
+
+            ptrs = sorted(ptrs, key=key, reverse=descending)
+        return ptrs
+
+    def rows(self, ptrs: List[int], columns: Sequence[str]) -> List[Tuple]:
+        """The values of columns for each of ptrs, as tuples."""
+        slots = list(map(self.slot_of.__getitem__, ptrs))
+        values = [list(map(self.columns[c].__getitem__, slots)) for c in columns]
+        return list(zip(*values))
+
+    def aggregate(
+        self, ptrs: List[int], exprs: List[str], group_cols: List[str]
+    ) -> List[Tuple[Tuple, Tuple]]:
+        """
+        Compute aggregates like "avg(x)" over ptrs, as [(group key, values), ...] sorted by key.
+        Supports count, sum, avg, min and max, treating nulls as SQL does.
+        """
+        funcs = []
+        for expr in exprs:
+            m = AGGREGATE_RE.match(expr)
+            if m is None or (m.group(2) != "*" and m.group(2) not in self.columns):
+                raise InvalidQueryError(
+                    f"Unsupported aggregate for columnar engine: {expr!r}"
+                )
+            funcs.append((m.group(1).lower(), m.group(2)))
+
+        slots = [self.slot_of[p] for p in ptrs]
+        groups = dict()
+        if group_cols:
+            key_cols = [self.columns[c] for c in group_cols]
+            for s in slots:
+                groups.setdefault(tuple(col[s] for col in key_cols), []).append(s)
+        else:
+            groups[()] = slots
+
+        out = []
+        for key, group_slots in groups.items():
+            values = []
+            for func, arg in funcs:
+                if arg == "*":
+                    values.append(len(group_slots))
+                    continue
+                col = self.columns[arg]
+                vals = [col[s] for s in group_slots if col[s] is not None]
+                if func == "count":
+                    values.append(len(vals))
+                elif not vals:
+                    values.append(None)
+                elif func == "sum":
+                    values.append(sum(vals))
+                elif func == "avg":
+                    values.append(sum(vals) / len(vals))
+                else:
+                    pick = min if func == "min" else max
+                    try:
+                        values.append(pick(vals))
+                    except TypeError:
+                        values.append(pick(vals, key=sort_key))
+            out.append((key, tuple(values)))
+        out.sort(key=lambda kv: list(map(sort_key, kv[0])))
+        return out
+
+    def _claim_slot(self, ptr: int, values: Sequence[Any]) -> int:
+        if self.free:
+            slot = self.free.pop()
+            self.ptrs[slot] = ptr
+            for col, v in zip(self.col_list, values):
+                col[slot] = v
+        else:
+            slot = len(self.ptrs)
+            self.ptrs.append(ptr)
+            for col, v in zip(self.col_list, values):
+                col.append(v)
+        self.slot_of[ptr] = slot
+        return slot
+
+    def _apply_affinities(self, slots: List[int]):
+        """Convert the values just stored in slots the way their columns' affinities would."""
+        for col, affinity in zip(self.col_list, self._affinity_list):
+            native = NATIVE_TYPES.get(affinity)
+            if native is None or set(map(type, map(col.__getitem__, slots))) <= native:
+                continue
+            for s in slots:
+                col[s] = apply_affinity(col[s], affinity)
+
+    def _release_slot(self, slot: int):
+        del self.slot_of[self.ptrs[slot]]
+        for col in self.col_list:
+            col[slot] = None
+        self.ptrs[slot] = None
+        self.free.append(slot)
+
+    def _index(self, field: str) -> Optional[SortedIndex]:
+        idx = self.indices.get(field)
+        if idx is not None and idx.dirty:
+            idx.rebuild(self.columns[field], self.slot_of.values())
+        return idx
+
+    def _span(self, node: Node, params: Any):
+        """
+        Positions (start, stop) in the sorted index of node's field that hold the rows matching
+        node, or None if node can't be answered from a single index range.
+        """
+        if isinstance(node, Compare) and node.op != "!=":
+            idx = self._index(node.field)
+            if idx is not None:
+                value = self._value(node.field, node.value, params)
+                return idx.span(node.op, value)
+        elif isinstance(node, Between):
+            idx = self._index(node.field)
+            if idx is not None:
+                lo = self._value(node.field, node.lo, params)
+                hi = self._value(node.field, node.hi, params)
+                start = idx.span(">=", lo)
+                stop = idx.span("<=", hi)
+                return max(start[0], stop[0]), min(start[1], stop[1])
+        return None
+
+    def _value(self, field: str, value: Any, params: Any) -> Any:
+        """Resolve a query value and convert it for comparison with field."""
+        affinity = self.affinities[field]
+        value = resolve(value, params)
+        if isinstance(value, list):
+            return [apply_affinity(v, affinity) for v in value]
+        return apply_affinity(value, affinity)
+
+    def _in_spans(self, node: Node, params: Any):
+        """Index spans for each value of an IN (...) node, or None if it can't use an index."""
+        if isinstance(node, In) and not node.negated and node.field in self.indices:
+            return [
+                self._span(Compare(node.field, "=", v), params) for v in node.values
+            ]
+        return None
+
+    def _span_slots(self, field: str, spans) -> Iterable[int]:
+        slots = self.indices[field].slots
+        if len(spans) == 1:
+            start, stop = spans[0]
+            return slots[start:stop]
+        out = set()
+        for start, stop in spans:
+            out.update(slots[start:stop])
+        return out
+
+    def _eval(self, node: Node, params: Any) -> Iterable[int]:
+        """Get the slots matching node. May contain duplicates if node is an Or."""
+        if isinstance(node, Or):
+            out = set()
+            for child in node.children:
+                out.update(self._eval(child, params))
+            return out
+        children = node.children if isinstance(node, And) else [node]
+
+        # Find the most selective index lookup. Range bounds on the same field (x > 1 and x < 5)
+        # combine into one span, since they're positions in the same sorted index.
+        field_spans = dict()  # maps {field: [start, stop, child positions]}
+        best = None  # (estimated rows, field, spans, child positions)
+        for i, child in enumerate(children):
+            span = self._span(child, params)
+            if span is not None:
+                fs = field_spans.setdefault(
+                    child.field, [0, len(self.indices[child.field].keys), []]
+                )
+                fs[0], fs[1] = max(fs[0], span[0]), min(fs[1], span[1])
+                fs[2].append(i)
+                continue
+            spans = self._in_spans(child, params)
+            if spans is not None:
+                n = sum(max(stop - start, 0) for start, stop in spans)
+                if best is None or n < best[0]:
+                    best = (n, child.field, spans, [i])
+        for field, (start, stop, positions) in field_spans.items():
+            n = max(stop - start, 0)
+            if best is None or n < best[0]:
+                best = (n, field, [(start, stop)], positions)
+
+        if best is None:
+            candidates = self.slot_of.values()
+            rest = children
+        else:
+            # Start from the most selective indexed predicate, then filter by the rest.
+            _, field, spans, used = best
+            candidates = self._span_slots(field, spans)
+            rest = [c for i, c in enumerate(children) if i not in used]
+        for child in rest:
+            candidates = self._filter(candidates, child, params)
+        return candidates
+
+    def _filter(
+        self, candidates: Iterable[int], node: Node, params: Any
+    ) -> Iterable[int]:
+        """Keep the candidate slots that satisfy node."""
+        if isinstance(node, Compare) and node.op != "!=":
+            value = self._value(node.field, node.value, params)
+            if value is None:
+                return []
+            # Fast path: map / compress run the comparisons without a Python-level loop. Nulls
+            # raise TypeError on ordering comparisons, in which case take the slow path.
+            try:
+                candidates = list(candidates)
+                values = map(self.columns[node.field].__getitem__, candidates)
+                return list(
+                    compress(candidates, map(OPS[node.op], values, repeat(value)))
+                )
+            except TypeError:
+                pass
+        test = self._compile_test(node, params)
+        return [s for s in candidates if test(s)]
+
+    def _compile_test(self, node: Node, params: Any):
+        """Make a function slot -> bool that evaluates node on one row."""
+        if isinstance(node, And):
+            tests = [self._compile_test(c, params) for c in node.children]
+            return lambda s: all(t(s) for t in tests)
+        if isinstance(node, Or):
+            tests = [self._compile_test(c, params) for c in node.children]
+            return lambda s: any(t(s) for t in tests)
+        col = self.columns[node.field]
+        if isinstance(node, IsNull):
+            if node.negated:
+                return lambda s: col[s] is not None
+            return lambda s: col[s] is None
+        if isinstance(node, In):
+            values = set(self._value(node.field, node.values, params))
+            if node.negated:
+                if None in values:
+                    return lambda s: False  # x NOT IN (..., NULL) is never true in SQL
+                return lambda s: col[s] is not None and col[s] not in values
+            values.discard(None)
+            return lambda s: col[s] in values
+        if isinstance(node, Between):
+            lo = self._compare_test(col, ">=", self._value(node.field, node.lo, params))
+            hi = self._compare_test(col, "<=", self._value(node.field, node.hi, params))
+            return lambda s: lo(s) and hi(s)
+        value = self._value(node.field, node.value, params)
+        return self._compare_test(col, node.op, value)
+
+    def _compare_test(self, col: List[Any], op: str, value: Any):
+        """Make a function slot -> bool that evaluates 'col <op> value' on one row."""
+        if value is None:
+            return lambda s: False
+        op = OPS[op]
+        value_class = storage_class(value)
+
+        def test(s):
+            v = col[s]
+            if v is None:
+                return False
+            try:
+                return op(v, value)
+            except TypeError:
+                return op(storage_class(v), value_class)
+
+        return test
@@ -0,0 +1,209 @@
+"""
+Locking and connections for LiteBox(concurrent=True).
+
+The table lives in a named in-memory database that several connections can open. Writes go
+through the LiteBox's own connection while holding the write lock. Queries hold the read lock
+and run on a connection belonging to the calling thread, so queries from different threads run
+in parallel; SQLite releases the GIL while it executes them.
+
+LiteBox(background_indices=True) builds its indices in an IndexBuilder thread, on a copy of the
+database, and swaps the copy in when done.
+"""
+
+import functools
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from litebox.constants import QUERY_CACHE_SIZE
+
+
+class RWLock:
+    """
+    Readers-writer lock. Waiting writers go before new readers, so queries can't starve writes.
+    The writer may re-acquire the lock, for reading or writing.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None  # thread id of the writer
+        self._write_depth = 0
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        if self._writer == threading.get_ident():
+            yield  # the writer can read
+            return
+        with self._cond:
+            while self._writer is not None or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer != me:
+                self._writers_waiting += 1
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+                self._writers_waiting -= 1
+                self._writer = me
+            self._write_depth += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._write_depth -= 1
+                if not self._write_depth:
+                    self._writer = None
+                    self._cond.notify_all()
+
+
+class ConnectionPool:
+    """One read connection per thread, all to the same database. Each runs pragmas on opening."""
+
+    def __init__(self, uri: str, pragmas: Sequence[str] = ()):
+        self.uri = uri
+        self.pragmas = list(pragmas)
+        self._local = threading.local()
+        self._conns = []  # type: List[sqlite3.Connection]
+        self._lock = threading.Lock()
+
+    def get(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Not bound to this thread, so that close() can run on any thread.
+            conn = self._local.conn = connect(self.uri, check_same_thread=False)
+            for pragma in self.pragmas:
+                conn.execute(pragma)
+            with self._lock:
+                self._conns.append(conn)
+        return conn
+
+    def close(self):
+        """Close every thread's connection. Call with no queries running, under the write lock."""
+        with self._lock:
+            conns, self._conns = self._conns, []
+        for conn in conns:
+            conn.close()
+
+
+class IndexBuilder(threading.Thread):
+    """
+    Builds indices on a copy of a database, in a thread of its own, while the original answers
+    queries. Once done, finish() copies the database, indices and all, back over the original.
+    """
+
+    def __init__(
+        self, conn: sqlite3.Connection, table: str, indices: Dict[str, Tuple[str, ...]]
+    ):
+        super().__init__(daemon=True)
+        self.table = table
+        self.indices = indices  # maps {index name: tuple of column names}
+        self.error = None  # type: Optional[sqlite3.Error]
+        self.changed = set()  # row ids changed in the original since it was copied
+        # Copying an in-memory database takes a small fraction of the time indexing it does.
+        self.copy = sqlite3.connect(
+            ":memory:", isolation_level=None, check_same_thread=False
+        )
+        self.copy.execute("PRAGMA journal_mode=OFF")
+        conn.backup(self.copy)
+
+    def run(self):
+        try:
+            for name, cols in self.indices.items():
+                self.copy.execute(
+                    f"CREATE INDEX idx_{name} ON {self.table}({','.join(cols)})"
+                )
+                self.copy.execute(f"ANALYZE idx_{name}")
+        except sqlite3.Error as e:
+            self.error = e
+
+    def finish(self, conn: sqlite3.Connection):
+        """Copy the indexed database over conn's, after the thread is done."""
+        try:
+            if self.error is None:
+                self.copy.backup(conn)
+        finally:
+            self.copy.close()
+
+
+def connect(uri: str, check_same_thread: bool = True) -> sqlite3.Connection:
+    return sqlite3.connect(
+        uri,
+        uri=True,
+        cached_statements=3 * QUERY_CACHE_SIZE,
+        isolation_level=None,
+        check_same_thread=check_same_thread,
+    )
+
+
+def shared_memory_uri(name: str) -> str:
+    """
+    URI of a named in-memory database that other connections in this process can open.
+    Without the memdb VFS (SQLite 3.36+), uses a shared cache, which serializes queries.
+    """
+    uri = f"file:/{name}?vfs=memdb"
+    try:
+        sqlite3.connect(uri, uri=True).close()
+        return uri
+    except sqlite3.OperationalError:
+        return f"file:{name}?mode=memory&cache=shared"
+
+
+def writes(method):
+    """
+    Run a LiteBox method under the write lock, if the box is concurrent. A box reading a saved
+    file in place is copied into memory first.
+    """
+    return _writer(method, wait=True)
+
+
+def flushes(method):
+    """Like writes, but doesn't wait for a background index build; for applying pending changes."""
+    return _writer(method, wait=False)
+
+
+def _writer(method, wait: bool):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if wait and self._index_builder is not None:
+            self.wait_for_indices()
+        if self._rwlock is None:
+            if self._path is not None:
+                self._copy_on_write()
+            return method(self, *args, **kwargs)
+        with self._rwlock.write():
+            if self._path is not None:
+                self._copy_on_write()
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+def reads(method):
+    """Apply pending changes, then run a LiteBox query method under the read lock."""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self._sync()
+        if self._rwlock is None:
+            return method(self, *args, **kwargs)
+        # The columnar engine rebuilds its indices lazily during queries, so its queries can't
+        # share the lock.
+        lock = self._rwlock.read() if self._columnar is None else self._rwlock.write()
+        with lock:
+            return method(self, *args, **kwargs)
+
+    return wrapper
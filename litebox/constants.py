@@ -1,2 +1,21 @@
 PYOBJ_ID_COL = "obj_id__"
 PYOBJ_COL = "obj__"
+KEY_COL = "key__"  # holds the key of each object, for LiteBoxes with key=
+# values_<field>__ holds (row id, value) for multi-valued fields
+VALUES_TABLE_PREFIX = "values_"
+FTS_TABLE_PREFIX = "fts_"  # fts_<field>__ is the full-text index of a Text field
+# bound names for find(match=) queries are match0__, match1__, ...
+MATCH_PARAM = "match"
+RTREE_PARAM = "rtree"  # bound names for R*Tree searches are rtree1__, rtree2__, ...
+LIMIT_PARAM = "limit__"  # bound names for LIMIT and OFFSET when params are named
+OFFSET_PARAM = "offset__"
+# holds the row ids of the ResultSet passed as find(within=)
+WITHIN_TABLE = "temp.within__"
+QUERY_CACHE_SIZE = 128  # number of distinct query shapes remembered per LiteBox
+SQLITE_ENGINE = "sqlite"
+COLUMNAR_ENGINE = "columnar"
+BULK_CHUNK_SIZE = 10**5  # rows per transaction during bulk inserts
+# With defer_indices, add_many() drops the B-tree indices while inserting at least this many
+# rows, and at least as many as the table holds, then rebuilds them. Rebuilding costs about as
+# much as updating the indices row by row once a batch is the size of the table.
+DEFER_INDICES_MIN_ROWS = 10**4
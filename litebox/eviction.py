@@ -0,0 +1,94 @@
+"""
+Eviction for bounded LiteBoxes, made with LiteBox(max_size=..., ttl=...).
+
+Each policy ranks objects by a column of the table, lowest first, and keeps an index on it. When
+a LiteBox grows past max_size, it finds the last object to evict by walking that index, then
+removes everything up to it with one range DELETE. With a ttl, objects are stamped with the
+time they were added, and expired objects are removed with one range DELETE before the next
+query.
+"""
+
+import time
+from itertools import repeat
+from typing import Any, Dict, Iterable, Optional
+
+ADDED_COL = "added__"  # for ttl, the Unix time when each object was added
+ORDER_COL = "order__"  # for FIFO, a counter value from when each object was added
+USED_COL = "used__"  # for LRU, a counter value from when each object was last found
+# When over max_size, evict this fraction of max_size beyond the excess, so that adding objects
+# one by one doesn't run an eviction for each.
+EVICT_FRACTION = 0.05
+
+
+class EvictionPolicy:
+    """
+    Decides which objects a LiteBox with max_size evicts first: those with the lowest value in
+    the policy's column. Subclass to make a new policy. Ties are evicted in row id order.
+    """
+
+    column = None
+
+    def stamp(self) -> Any:
+        """The column value for an object being added now. By default, the current time."""
+        return time.time()
+
+    def stamps(self, n: int) -> Iterable[Any]:
+        """Column values for n objects being added now, in order."""
+        return repeat(self.stamp(), n)
+
+    def touch(self, ptrs: Iterable[int]):
+        """Called with the row ids of objects returned by find()."""
+
+    def pending(self) -> Dict[int, Any]:
+        """Column values to write before the next eviction, {row id: value}. Clears them."""
+        return {}
+
+    def resume(self, last: Optional[Any]):
+        """Carry on from a loaded table, where last is the largest value in the column."""
+
+
+class _Counter(EvictionPolicy):
+    """Stamps objects with a counter, so that objects added together keep their order."""
+
+    def __init__(self):
+        self.tick = 0
+
+    def stamp(self) -> int:
+        self.tick += 1
+        return self.tick
+
+    def stamps(self, n: int) -> range:
+        self.tick += n
+        return range(self.tick - n + 1, self.tick + 1)
+
+    def resume(self, last: Optional[int]):
+        self.tick = last or 0
+
+
+class FIFO(_Counter):
+    """Evict the objects that were added first."""
+
+    column = ORDER_COL
+
+
+class LRU(_Counter):
+    """Evict the objects that find() returned least recently."""
+
+    column = USED_COL
+
+    def __init__(self):
+        super().__init__()
+        # maps {row id: tick}, for rows found since the last eviction
+        self.touched = dict()
+
+    def touch(self, ptrs: Iterable[int]):
+        # Kept here, so queries don't pay for an UPDATE; written out when evicting.
+        self.tick += 1
+        self.touched.update(dict.fromkeys(ptrs, self.tick))
+
+    def pending(self) -> Dict[int, int]:
+        touched, self.touched = self.touched, dict()
+        return touched
+
+
+POLICIES = {"fifo": FIFO, "lru": LRU}
@@ -12,3 +12,23 @@ class NotInIndexError(Exception):
 
 class FieldsTypeError(Exception):
     pass
+
+
+class InvalidQueryError(Exception):
+    pass
+
+
+class IndexNotFoundError(Exception):
+    pass
+
+
+class KeyNotSetError(Exception):
+    pass
+
+
+class InvalidSnapshotError(Exception):
+    pass
+
+
+class InvalidEvictionError(Exception):
+    pass
@@ -0,0 +1,112 @@
+"""
+Field types and how their values are stored in SQLite.
+
+Besides int, float, bool and str, fields can be datetime, date, Enum, Decimal or bytes. Values
+are stored in compact native forms that SQLite compares directly:
+ - datetime and date: INTEGER microseconds since 1970-01-01 UTC. Aware datetimes are converted
+   to UTC; naive ones are taken to be in UTC already.
+ - Enum: the INTEGER position of the member in its Enum, so members sort in definition order.
+ - Decimal: REAL, so comparisons are as precise as a float's 15 or so significant digits.
+ - bytes: BLOB, unchanged.
+Query values are converted the same way, so find('created > ?', (some_datetime,)) works.
+"""
+
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Callable, Dict, Optional
+
+EPOCH = datetime(1970, 1, 1)
+EPOCH_DATE = EPOCH.date()
+ONE_MICROSECOND = timedelta(microseconds=1)
+MICROS_PER_DAY = 86400 * 10**6
+
+SQLITE_TYPES = {
+    int: "INTEGER",
+    float: "REAL",
+    bool: "INTEGER",
+    str: "TEXT",
+    bytes: "BLOB",
+    datetime: "INTEGER",
+    date: "INTEGER",
+    Decimal: "REAL",
+}
+# Values of these types are stored as they are; checked first, since they're the most common.
+PLAIN_TYPES = {int, float, bool, str, bytes, type(None)}
+
+_ENUM_CODES = dict()  # maps {Enum class: {member: position}}
+
+
+def is_enum(pytype: Any) -> bool:
+    return isinstance(pytype, type) and issubclass(pytype, Enum)
+
+
+def sqlite_type(pytype: Any) -> str:
+    """The column type for a field type. Text and multi-valued fields are stored as TEXT."""
+    if is_enum(pytype):
+        return "INTEGER"
+    return SQLITE_TYPES.get(pytype, "TEXT")
+
+
+def encode_time(value: Any) -> Any:
+    """A datetime or date as microseconds since the epoch. Other values pass through."""
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return (value - EPOCH) // ONE_MICROSECOND
+    if isinstance(value, date):
+        return (value - EPOCH_DATE).days * MICROS_PER_DAY
+    return value
+
+
+def enum_code(value: Any) -> Any:
+    """The position of an Enum member in its Enum. Other values pass through."""
+    if not isinstance(value, Enum):
+        return value
+    codes = _ENUM_CODES.get(type(value))
+    if codes is None:
+        codes = {member: i for i, member in enumerate(type(value))}
+        _ENUM_CODES[type(value)] = codes
+    return codes[value]
+
+
+def encode_decimal(value: Any) -> Any:
+    return float(value) if isinstance(value, Decimal) else value
+
+
+def encode_value(value: Any) -> Any:
+    """Convert a query value, of any type, the way a field of its type is stored."""
+    if type(value) in PLAIN_TYPES:
+        return value
+    if isinstance(value, date):  # including datetime
+        return encode_time(value)
+    if isinstance(value, Enum):
+        return enum_code(value)
+    return encode_decimal(value)
+
+
+def field_encoder(pytype: Any) -> Optional[Callable[[Any], Any]]:
+    """The function that converts values of a field type for storage, or None if they're stored as is."""
+    if pytype in (datetime, date):
+        return encode_time
+    if is_enum(pytype):
+        return enum_code
+    if pytype is Decimal:
+        return encode_decimal
+    return None
+
+
+def field_decoder(pytype: Any) -> Optional[Callable[[Any], Any]]:
+    """The function that turns stored values of a field type back into Python values, or None."""
+    if pytype is datetime:
+        return lambda v: None if v is None else EPOCH + timedelta(microseconds=v)
+    if pytype is date:
+        return lambda v: (
+            None if v is None else EPOCH_DATE + timedelta(days=v // MICROS_PER_DAY)
+        )
+    if is_enum(pytype):
+        members = list(pytype)
+        return lambda v: None if v is None else members[v]
+    if pytype is Decimal:
+        return lambda v: None if v is None else Decimal(repr(v))
+    return None
@@ -1,13 +1,107 @@
-from typing import List, Tuple, Dict, Any, Optional, Iterable, Union, Callable
+from collections import OrderedDict, deque
+from contextlib import nullcontext
+from itertools import chain, islice, repeat
+from operator import itemgetter
+from typing import (
+    List,
+    Tuple,
+    Dict,
+    Any,
+    Optional,
+    Iterable,
+    Iterator,
+    Union,
+    Callable,
+    Sequence,
+)
 
+import os
+import re
 import sqlite3
+import threading
+import time
+from urllib.request import pathname2url
 
+from litebox.advisor import (
+    QueryLog,
+    candidate_index,
+    AUTO_INDEX_INTERVAL,
+    AUTO_INDEX_MIN_RUNS,
+    AUTO_INDEX_MIN_SECONDS,
+    MAX_AUTO_INDICES,
+)
+from litebox.columnar import ColumnarEngine
+from litebox.concurrency import (
+    RWLock,
+    ConnectionPool,
+    IndexBuilder,
+    connect,
+    shared_memory_uri,
+    flushes,
+    reads,
+    writes,
+)
 from litebox.constants import *
-from litebox.exceptions import NotInIndexError
+from litebox.exceptions import (
+    NotInIndexError,
+    InvalidEngineError,
+    InvalidFields,
+    IndexNotFoundError,
+    InvalidQueryError,
+    KeyNotSetError,
+    InvalidSnapshotError,
+    InvalidEvictionError,
+)
+from litebox.eviction import ADDED_COL, EVICT_FRACTION, POLICIES, EvictionPolicy
 from litebox.globals import get_next_table_id
-from litebox.utils import get_field, validate_fields, get_field_name
-
-PYTYPE_TO_SQLITE = {float: "NUMBER", int: "NUMBER", str: "TEXT", bool: "NUMBER"}
+from litebox.planner import Plan, Planner
+from litebox.resultset import ResultSet
+from litebox.fieldtypes import (
+    encode_value,
+    field_decoder,
+    field_encoder,
+    sqlite_type,
+)
+from litebox.rtree import (
+    NEAREST_GROWTH,
+    NEAREST_MAX_ROUNDS,
+    RTREE_TYPES,
+    RTree,
+    best_rtree,
+    column_defs,
+    table_name as rtree_table,
+)
+from litebox.snapshot import (
+    MMAP_SIZE,
+    SNAPSHOT_VERSION,
+    read_meta,
+    type_from_name,
+    type_name,
+    write_meta,
+)
+from litebox.tracking import is_tracked, watch, unwatch
+from litebox.weak import WeakObjectMap
+from litebox.utils import (
+    get_field,
+    validate_fields,
+    get_field_name,
+    normalize_where,
+    infer_type,
+    RowExtractor,
+    encode_values,
+    decode_values,
+    multi_value_type,
+    Text,
+)
+from litebox.query import IN_TABLE_PREFIX, to_sql
+from litebox.where import (
+    Contains,
+    Match,
+    Node,
+    parse_where,
+    parse_order_by,
+    resolve,
+)
 
 
 class LiteBox:
@@ -15,143 +109,2151 @@ class LiteBox:
         self,
         objs: Optional[Iterable[Any]] = None,
         on: Dict[Union[str, Callable], type] = None,
-        index: Optional[List[Union[Tuple, str]]] = None,
+        index: Optional[List[Union[Tuple, str, RTree]]] = None,
+        engine: str = SQLITE_ENGINE,
+        track: bool = False,
+        log_queries: bool = False,
+        auto_index: bool = False,
+        concurrent: bool = False,
+        key: Optional[Union[str, Callable]] = None,
+        weak: bool = False,
+        max_size: Optional[int] = None,
+        ttl: Optional[float] = None,
+        eviction: Union[str, EvictionPolicy] = "lru",
+        strict: bool = False,
+        without_rowid: bool = False,
+        defer_indices: bool = False,
+        background_indices: bool = False,
     ):
         validate_fields(on)
+        if engine not in (SQLITE_ENGINE, COLUMNAR_ENGINE):
+            raise InvalidEngineError(
+                f"Expected engine '{SQLITE_ENGINE}' or '{COLUMNAR_ENGINE}', got {engine!r}"
+            )
+        if engine == COLUMNAR_ENGINE and (max_size is not None or ttl is not None):
+            raise InvalidEngineError("max_size and ttl need the sqlite engine")
+        if engine == COLUMNAR_ENGINE and (strict or without_rowid):
+            raise InvalidEngineError("strict and without_rowid need the sqlite engine")
+        if engine == COLUMNAR_ENGINE and background_indices:
+            raise InvalidEngineError("background_indices needs the sqlite engine")
+        # maps {field name: value type} for multi-valued fields, like List[str]
+        self._multi = {
+            get_field_name(f): multi_value_type(t)
+            for f, t in on.items()
+            if multi_value_type(t) is not None
+        }
+        if engine == COLUMNAR_ENGINE and self._multi:
+            raise InvalidEngineError("Multi-valued fields need the sqlite engine")
+        self._text = [get_field_name(f) for f, t in on.items() if t is Text]
+        if engine == COLUMNAR_ENGINE and self._text:
+            raise InvalidEngineError("Text fields need the sqlite engine")
+        # Functions that convert field values for storage and back, by field name.
+        self._encoders = {
+            get_field_name(f): field_encoder(t)
+            for f, t in on.items()
+            if field_encoder(t) is not None
+        }
+        if engine == COLUMNAR_ENGINE and self._encoders:
+            raise InvalidEngineError(
+                "datetime, date, Enum and Decimal fields need the sqlite engine"
+            )
+        self._decoders = {
+            get_field_name(f): field_decoder(t)
+            for f, t in on.items()
+            if field_decoder(t) is not None
+        }
+        for name in self._multi:
+            self._encoders[name] = encode_values
+            self._decoders[name] = decode_values
+        self._encode_params = len(self._encoders) > len(self._multi)
+        self.strict = strict
+        self.without_rowid = without_rowid
+        self.defer_indices = defer_indices
+        # The thread building indices, with background_indices.
+        self._index_builder = None
+        # The file the table is read from in place, if loaded with mmap and not changed since.
+        self._path = None
         self.fields = on
-        self.obj_map = dict()  # maps {id(object): object}
+        self._field_names = {get_field_name(f) for f in on}
+        self.engine = engine
+        self.key = key
+        self._key_extractor = None if key is None else RowExtractor([key])
+        self.weak = weak
+        self.max_size = max_size
+        self.ttl = ttl
+        self._eviction = None
+        self._extra_cols = []  # columns for eviction, before the key column
+        if max_size is not None:
+            if isinstance(eviction, str):
+                if eviction not in POLICIES:
+                    raise InvalidEvictionError(
+                        f"Expected eviction in {sorted(POLICIES)}, got {eviction!r}"
+                    )
+                eviction = POLICIES[eviction]()
+            if eviction.column is None or eviction.column == ADDED_COL:
+                raise InvalidEvictionError(
+                    f"Eviction policy {eviction!r} needs a column other than {ADDED_COL}"
+                )
+            self._eviction = eviction
+            self._extra_cols.append(eviction.column)
+        if ttl is not None:
+            self._extra_cols.append(ADDED_COL)
+        self._next_expiry = float("inf")  # when the oldest object expires, with a ttl
+        self._dead = deque()  # (row id, key) of weakly-held objects that died
+        # maps {id(object): object}, or {row id: object} with a key
+        self.obj_map = dict()
+        if weak:
+            key_of = None if key is None else lambda obj: get_field(obj, key)
+            self.obj_map = WeakObjectMap(
+                lambda ptr, dead_key: self._dead.append((ptr, dead_key)), key_of
+            )
+        self._key_ptrs = dict()  # with a key, maps {key: row id}
+        self._next_ptr = 1  # with a key, the next row id to hand out
+        self._extractor = RowExtractor(
+            self.fields,
+            {
+                i: self._encoders[get_field_name(f)]
+                for i, f in enumerate(self.fields)
+                if get_field_name(f) in self._encoders
+            },
+        )
+        self.track = track
+        # Tracked objects changed since their last update; {id(obj): obj}
+        self._dirty = dict()
+        # Held while marking an object dirty and while taking the dirty objects to flush, so
+        # that no thread adds to a dict that has already been taken.
+        self._dirty_lock = threading.Lock() if concurrent else nullcontext()
+        # Attribute names that affect stored values. None means any attribute can, via a callable.
+        self._tracked_names = None
+        if all(isinstance(f, str) for f in self.fields):
+            self._tracked_names = set(self.fields)
+        # LRU of query shapes; maps {(where template, named params): compiled query}
+        self._query_cache = OrderedDict()
+        self.indices = dict()  # maps {index name: tuple of column names}
+        self.rtrees = dict()  # maps {R*Tree index name: tuple of column names}
+        self._planner = None
+        self.auto_index = auto_index
+        self._auto_indices = set()  # names of indices created by auto_index
+        self._query_log = None
+        self._rwlock = RWLock() if concurrent else None
+        self._pool = None  # per-thread read connections, when concurrent
+        if log_queries or auto_index:
+            self._query_log = QueryLog(
+                [get_field_name(f) for f in self.fields],
+                per_column=engine == COLUMNAR_ENGINE,
+            )
+        if engine == COLUMNAR_ENGINE:
+            self.conn = None
+            self._columnar = ColumnarEngine(
+                {get_field_name(f): t for f, t in self.fields.items()}
+            )
+            if objs is not None:
+                self.add_many(objs)
+            self._create_indices(index)
+            return
+
+        self._columnar = None
         self.table_name = "ri_" + str(get_next_table_id())
-        self.conn = sqlite3.connect(":memory:")
+        self._connect(concurrent)
 
         # create sqlite table
+        col_defs = self._column_defs()
         lbl = [f"CREATE TABLE {self.table_name} ("]
-        for field, pytype in self.fields.items():
-            s_type = PYTYPE_TO_SQLITE[pytype]
-            lbl.append(f"{get_field_name(field)} {s_type},")
+        for col_def in col_defs:
+            if strict and " " not in col_def:
+                col_def += " ANY"  # strict tables need a type on every column
+            lbl.append(f"{col_def},")
         lbl.append(f"{PYOBJ_ID_COL} INTEGER PRIMARY KEY")
-        lbl.append(")")
+        options = ["STRICT"] * strict + ["WITHOUT ROWID"] * without_rowid
+        lbl.append(") " + ", ".join(options))
         cur = self.conn.cursor()
         cur.execute("\n".join(lbl))
+        for name in self._multi:
+            self._create_values_table(name)
+        self._planner = Planner(
+            self.conn, self.table_name, col_defs + [f"{PYOBJ_ID_COL} INTEGER"]
+        )
+        self._init_sql()
 
         if objs is not None:
             self.add_many(objs)
 
         # Deferring creation of indices until after data has been added is much faster.
-        self._create_indices(index)
+        self._create_indices([] if background_indices else index)
+        for name in self._text:
+            self._create_text_index(name)
+        for col in self._extra_cols:
+            self.conn.execute(f"CREATE INDEX idx_{col} ON {self.table_name}({col})")
+        for name in self._multi:
+            table = f"{VALUES_TABLE_PREFIX}{name}__"
+            self.conn.execute(f"CREATE INDEX idx_{table} ON {table}(v, {PYOBJ_ID_COL})")
+            self.conn.execute(
+                f"CREATE INDEX idx_{table}_{PYOBJ_ID_COL} ON {table}({PYOBJ_ID_COL})"
+            )
+        if background_indices:
+            self._start_index_builder(self._index_list(index))
 
-    def find(self, where: Optional[Union[str, Callable]] = None) -> List[Any]:
-        """Find Python objects that match the query constraints."""
-        if not where:
+    def _create_values_table(self, name: str):
+        """
+        Make the table of (row id, value) pairs for the multi-valued field name, kept in step
+        with the JSON in the main table by triggers on it.
+        """
+        table = f"{VALUES_TABLE_PREFIX}{name}__"
+        affinity = sqlite_type(self._multi[name])
+        fill = (
+            f"INSERT INTO {table} SELECT DISTINCT NEW.{PYOBJ_ID_COL}, value "
+            f"FROM json_each(NEW.{name});"
+        )
+        clear = f"DELETE FROM {table} WHERE {PYOBJ_ID_COL} = OLD.{PYOBJ_ID_COL};"
+        # INSERT OR REPLACE doesn't fire delete triggers on the rows it replaces.
+        replace = ""
+        if self.weak and self.key is None:
+            replace = f"DELETE FROM {table} WHERE {PYOBJ_ID_COL} = NEW.{PYOBJ_ID_COL};"
+        self.conn.executescript(f"""
+            CREATE TABLE {table} ({PYOBJ_ID_COL} INTEGER, v {affinity});
+            CREATE TRIGGER {table}_insert AFTER INSERT ON {self.table_name}
+            BEGIN {replace} {fill} END;
+            CREATE TRIGGER {table}_update AFTER UPDATE OF {name} ON {self.table_name}
+            WHEN OLD.{name} IS NOT NEW.{name}
+            BEGIN {clear} {fill} END;
+            CREATE TRIGGER {table}_delete AFTER DELETE ON {self.table_name}
+            BEGIN {clear} END;
+            """)
+
+    def _create_text_index(self, name: str):
+        """
+        Make the FTS5 index for the Text field name, and index the rows already there. Triggers
+        on the main table keep it in step.
+        """
+        fts = f"{FTS_TABLE_PREFIX}{name}__"
+        put = (
+            f"INSERT INTO {fts}(rowid, {name}) VALUES (NEW.{PYOBJ_ID_COL}, NEW.{name});"
+        )
+        # The index reads its text from the main table, so a deletion must name the old text.
+        drop = (
+            f"INSERT INTO {fts}({fts}, rowid, {name}) "
+            f"VALUES ('delete', OLD.{PYOBJ_ID_COL}, OLD.{name});"
+        )
+        script = f"""
+            CREATE VIRTUAL TABLE {fts} USING fts5(
+                {name}, content='{self.table_name}', content_rowid='{PYOBJ_ID_COL}'
+            );
+            CREATE TRIGGER {fts}_insert AFTER INSERT ON {self.table_name}
+            BEGIN {put} END;
+            CREATE TRIGGER {fts}_update AFTER UPDATE OF {name} ON {self.table_name}
+            WHEN OLD.{name} IS NOT NEW.{name}
+            BEGIN {drop} {put} END;
+            CREATE TRIGGER {fts}_delete AFTER DELETE ON {self.table_name}
+            BEGIN {drop} END;
+            """
+        if self.weak and self.key is None:
+            # INSERT OR REPLACE doesn't fire delete triggers on the rows it replaces.
+            script += f"""
+            CREATE TRIGGER {fts}_replace BEFORE INSERT ON {self.table_name}
+            BEGIN
+                INSERT INTO {fts}({fts}, rowid, {name})
+                SELECT 'delete', {PYOBJ_ID_COL}, {name} FROM {self.table_name}
+                WHERE {PYOBJ_ID_COL} = NEW.{PYOBJ_ID_COL};
+            END;
+            """
+        # Indexing all rows in one pass is several times faster than one at a time.
+        script += f"INSERT INTO {fts}({fts}) VALUES ('rebuild');"
+        self.conn.executescript(script)
+
+    def _connect(
+        self,
+        concurrent: bool,
+        uri: Optional[str] = None,
+        pragmas: Sequence[str] = (),
+        read_only: bool = False,
+    ):
+        """
+        Open the connection, and in concurrent mode the per-thread read connections.
+        The database is in memory unless uri names a file, which is opened read-only.
+        """
+        # Each query shape compiles to three statements (index search, full scan, and sample
+        # count); size SQLite's statement cache so every shape in our query cache keeps them all.
+        # Runs in autocommit mode; bulk operations open their own transactions.
+        if concurrent and uri is None:
+            # A named in-memory database, so each thread can open its own connection to it.
+            uri = shared_memory_uri(self.table_name)
+        if uri is None:
+            self.conn = sqlite3.connect(
+                ":memory:", cached_statements=3 * QUERY_CACHE_SIZE, isolation_level=None
+            )
+        else:
+            self.conn = connect(uri, check_same_thread=not concurrent)
+        if concurrent:
+            self._pool = ConnectionPool(uri, pragmas)
+        if not read_only:
+            # Nothing in memory survives a crash anyway, so skip the rollback journal and syncing.
+            self.conn.execute("PRAGMA journal_mode=OFF")
+            self.conn.execute("PRAGMA synchronous=OFF")
+        for pragma in pragmas:
+            self.conn.execute(pragma)
+
+    def _column_defs(self) -> List[str]:
+        """Column definitions for the table, except the row id."""
+        col_defs = [
+            f"{get_field_name(field)} {sqlite_type(pytype)}"
+            for field, pytype in self.fields.items()
+        ]
+        col_defs += self._extra_cols
+        if self.key is not None:
+            col_defs.append(KEY_COL)  # no type, so keys are stored as they are
+        return col_defs
+
+    def _init_sql(self):
+        cols = [get_field_name(f) for f in self.fields] + self._extra_cols
+        if self.key is not None:
+            cols.append(KEY_COL)
+        col_str = ",".join(cols) + f",{PYOBJ_ID_COL}"
+        value_str = ",".join(["?"] * (len(cols) + 1))
+        # A weakly-held object's id can be reused before its row is deleted; replace the row.
+        insert = "INSERT OR REPLACE" if self.weak and self.key is None else "INSERT"
+        self._insert_sql = (
+            f"{insert} INTO {self.table_name} ({col_str}) VALUES ({value_str})"
+        )
+        self._delete_sql = f"DELETE FROM {self.table_name} WHERE {PYOBJ_ID_COL}=?"
+        set_str = ",".join(f"{get_field_name(f)}=?" for f in self.fields)
+        self._update_sql = (
+            f"UPDATE {self.table_name} SET {set_str} WHERE {PYOBJ_ID_COL}=?"
+        )
+        # An upsert is a new version of the object, so it gets new eviction stamps.
+        set_cols = [get_field_name(f) for f in self.fields] + self._extra_cols
+        excluded_str = ",".join(f"{c}=excluded.{c}" for c in set_cols)
+        self._upsert_sql = (
+            f"{self._insert_sql} ON CONFLICT({PYOBJ_ID_COL}) "
+            f"DO UPDATE SET {excluded_str}"
+        )
+
+    def find(
+        self,
+        where: Optional[Union[str, Node]] = None,
+        params: Optional[Union[Sequence, Dict[str, Any]]] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        order_by: Optional[str] = None,
+        columns: Optional[Sequence[str]] = None,
+        arrays: bool = False,
+        within: Optional[ResultSet] = None,
+        result_set: bool = False,
+        match: Optional[Union[str, Dict[str, str]]] = None,
+    ) -> Union[List[Any], Dict[str, Any], ResultSet]:
+        """
+        Find Python objects that match where, or with columns, tuples of their field values.
+        where is SQL with ? or :name placeholders bound from params, or a Q expression.
+        """
+        select = None
+        if columns is not None:
+            if result_set:
+                raise InvalidQueryError("result_set=True can't be used with columns")
+            select = self._projection(columns)
+        elif arrays:
+            raise InvalidQueryError("arrays=True needs columns")
+        elif result_set:
+            select = ()
+        if self._query_log is None or not where:
+            found = self._find(
+                where, params, limit, offset, order_by, select, within, match
+            )
+        else:
+            t0 = time.perf_counter()
+            found = self._find(
+                where, params, limit, offset, order_by, select, within, match
+            )
+            self._log_query(where, time.perf_counter() - t0, len(found))
+        if select and self._decoders:
+            found = self._decode_rows(select, found)
+        if arrays:
+            return _to_arrays(select, found)
+        if result_set:
+            return ResultSet(self, found)
+        return found
+
+    def find_ids(
+        self,
+        where: Optional[Union[str, Node]] = None,
+        params: Optional[Union[Sequence, Dict[str, Any]]] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        order_by: Optional[str] = None,
+        within: Optional[ResultSet] = None,
+        match: Optional[Union[str, Dict[str, str]]] = None,
+    ) -> List[int]:
+        """
+        Like find(), but returns the row ids of the matches instead of the objects. A row id is
+        id(obj), or with key=, a number assigned when the object was added.
+        """
+        return self._find(where, params, limit, offset, order_by, (), within, match)
+
+    @reads
+    def _find(
+        self,
+        where: Optional[Union[str, Node]],
+        params: Optional[Union[Sequence, Dict[str, Any]]],
+        limit: Optional[int],
+        offset: Optional[int],
+        order_by: Optional[str],
+        select: Optional[Tuple[str, ...]] = None,
+        within: Optional[ResultSet] = None,
+        match: Optional[Union[str, Dict[str, str]]] = None,
+    ) -> List[Any]:
+        """
+        Find objects, or with select, the rows of select's columns. select=() finds row ids.
+        """
+        paged = limit is not None or offset is not None or order_by is not None
+        everything = select is None and within is None and match is None
+        if not where and not paged and everything:
+            if self._eviction is not None:
+                self._eviction.touch(list(self.obj_map))
             return list(self.obj_map.values())
 
+        where, params, node = self._prepare_where(where, params)
+        if within is not None and within.box is not self:
+            raise InvalidQueryError("within must be a ResultSet from this LiteBox")
+
+        if self._columnar is not None:
+            if match is not None:
+                raise InvalidEngineError(
+                    "match needs the sqlite engine and Text fields"
+                )
+            if where and not paged and within is None:
+                node = self._compile_query(where, False)
+                return self._results(self._columnar.query(node, params), select)
+            ptrs = self._columnar_ptrs(where, params, order_by)
+            if within is not None:
+                ptrs = list(filter(within.ids.__contains__, ptrs))
+            start = offset or 0
+            ptrs = ptrs[start:] if limit is None else ptrs[start : start + limit]
+            return self._results(ptrs, select)
+
+        select_sql = self._select_sql(select, within)
+        cur = self._reader().cursor()
+        from_sql = None
+        if match is not None:
+            # The full-text search drives the query, so there's no plan to make.
+            from_sql, params, rank = self._match_sql(match, params)
+            order_by = order_by or rank
+            paged = True
+        if paged or not where:
+            if within is not None:
+                where = self._within_where(within, where)
+            sql, args = self._select(
+                where, params, order_by, limit, offset, select_sql, from_sql
+            )
+            cur.execute(sql, args)
+            return self._rows(cur, select, within)
+
+        # SQLite will often use an index where a full scan would be faster, which is slow on
+        # queries returning a large number of items. The planner picks one or the other.
+        plan, index_sql, scan_sql = self._plan(where, params, node, select_sql)
+        if within is None:
+            routed = plan.use_index and self._rtree_select(
+                where, params, node, select_sql
+            )
+            if routed:
+                cur.execute(*routed)
+            else:
+                cur.execute(index_sql if plan.use_index else scan_sql, params or ())
+            found = self._rows(cur, select)
+            self._planner.record(plan, len(found))
+            return found
+
+        # Look up the rows in within if there are fewer of them than matches for where.
+        # Otherwise, find the matches as usual and keep those in within.
+        expected = plan.estimate
+        if expected is None:
+            expected = 0 if plan.use_index else len(self.obj_map)
+        if len(within) < expected:
+            sql, args = self._select(
+                self._within_where(within, where), params, None, select_sql=select_sql
+            )
+            cur.execute(sql, args)
+        else:
+            cur.execute(index_sql if plan.use_index else scan_sql, params or ())
+        return self._rows(cur, select, within)
+
+    def _match_sql(
+        self,
+        match: Union[str, Dict[str, str]],
+        params: Optional[Union[Sequence, Dict[str, Any]]],
+    ) -> Tuple[str, Union[Sequence, Dict[str, Any]], str]:
         """
-        Optimization: SQLite will often try to use its indices in scenarios where it shouldn't.
-        This results in poor time performance on queries returning a large number of items.
-        Benchmarking says n_objects^(0.6) is a good max for using the index.
+        Join the table to the full-text search of each Text field in match. Returns the FROM
+        clause, params with the queries added, and an ORDER BY ranking the best matches first.
         """
+        if isinstance(match, str):
+            if len(self._text) != 1:
+                raise InvalidQueryError(
+                    "match must be a dict of {field: query} unless there is one Text field"
+                )
+            match = {self._text[0]: match}
+        if not match:
+            raise InvalidQueryError("match must name at least one Text field")
+        named = isinstance(params, dict)
+        from_sql = self.table_name
+        queries = dict()
+        ranks = []
+        for i, (field, query) in enumerate(match.items()):
+            if field not in self._text:
+                raise InvalidQueryError(f"{field} is not a Text field")
+            fts = f"{FTS_TABLE_PREFIX}{field}__"
+            name = f"{MATCH_PARAM}{i}__"
+            mark = f":{name}" if named else "?"
+            # bm25() is lower for better matches.
+            from_sql += (
+                f" JOIN (SELECT rowid AS {name}, bm25({fts}) AS rank{i}__ FROM {fts}"
+                f" WHERE {fts} MATCH {mark}) ON {name} = {PYOBJ_ID_COL}"
+            )
+            queries[name] = query
+            ranks.append(f"rank{i}__")
+        if named:
+            params = dict(params, **queries)
+        else:
+            # The FROM clause's placeholders come before the WHERE clause's.
+            params = tuple(queries.values()) + tuple(params or ())
+        return from_sql, params, " + ".join(ranks)
 
-        limit_int = int(len(self.obj_map) ** 0.6)
-        query = f"SELECT {PYOBJ_ID_COL} FROM {self.table_name} WHERE {where} LIMIT {limit_int}"
-        cur = self.conn.cursor()
-        cur.execute(query)
-        ptrs = [r[0] for r in cur]
-        if len(ptrs) < limit_int:
-            objs = list(self.obj_map[ptr] for ptr in ptrs)
-            return objs
+    def _projection(self, columns: Sequence[str]) -> Tuple[str, ...]:
+        """Check the columns asked of find(), and return them as a tuple."""
+        if isinstance(columns, str):
+            columns = [columns]
+        columns = tuple(columns)
+        if not columns:
+            raise InvalidQueryError("columns must name at least one field")
+        for col in columns:
+            if col not in self._field_names:
+                raise InvalidQueryError(f"Unknown field in columns: {col}")
+        return columns
+
+    def _decode_rows(self, select: Tuple[str, ...], rows: List[Tuple]) -> List[Tuple]:
+        """Turn stored values in rows back into Python values, like datetimes and lists."""
+        decoded = [i for i, col in enumerate(select) if col in self._decoders]
+        if not decoded or not rows:
+            return rows
+        cols = list(zip(*rows))
+        for i in decoded:
+            cols[i] = list(map(self._decoders[select[i]], cols[i]))
+        return list(zip(*cols))
+
+    def _select_sql(
+        self, select: Optional[Tuple[str, ...]], within: Optional[ResultSet] = None
+    ) -> str:
+        """The SELECT list for finding objects, row ids, or rows of select's columns."""
+        if not select:
+            return PYOBJ_ID_COL
+        if self._eviction is not None or within is not None:
+            # The row ids are needed too, to mark the rows as used or check them against within.
+            return ",".join((PYOBJ_ID_COL,) + select)
+        return ",".join(select)
+
+    def _rows(
+        self,
+        cur: sqlite3.Cursor,
+        select: Optional[Tuple[str, ...]],
+        within: Optional[ResultSet] = None,
+    ) -> List[Any]:
+        """
+        Read the results of a query whose SELECT list is _select_sql(select, within), keeping
+        only the rows in within if given.
+        """
+        if not select:
+            ptrs = map(itemgetter(0), cur)
+            if within is not None:
+                ptrs = filter(within.ids.__contains__, ptrs)
+            if select is None:
+                return self._objs(ptrs)
+            ptrs = list(ptrs)
+            if self._eviction is not None:
+                self._eviction.touch(ptrs)
+            return ptrs
+        if within is None:
+            rows = cur.fetchall()
+        else:
+            keep = within.ids
+            rows = [row for row in cur if row[0] in keep]
+        if self._eviction is not None or within is not None:
+            if self._eviction is not None:
+                self._eviction.touch(map(itemgetter(0), rows))
+            rows = [row[1:] for row in rows]
+        return rows
+
+    def _results(self, ptrs: List[int], select: Optional[Tuple[str, ...]]) -> List[Any]:
+        """Objects, row ids, or rows of select's columns for the ptrs found by columnar."""
+        if select is None:
+            return self._objs(ptrs)
+        if self._eviction is not None:
+            self._eviction.touch(ptrs)
+        if not select:
+            return list(ptrs)
+        return self._columnar.rows(ptrs, select)
+
+    def _objs(self, ptrs: Iterable[int]) -> List[Any]:
+        """The objects at ptrs. If weak, skips any that died since the last sync."""
+        if self._eviction is not None:
+            ptrs = list(ptrs)
+            self._eviction.touch(ptrs)
+        if self.weak:
+            return self.obj_map.lookup(ptrs)
+        return list(map(self.obj_map.__getitem__, ptrs))
+
+    @reads
+    def explain(
+        self,
+        where: Union[str, Node],
+        params: Optional[Union[Sequence, Dict[str, Any]]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Describe how find(where, params) would run, without running it: the SQL, SQLite's plan,
+        and the planner's choice, with its estimate, threshold and history for the query shape.
+        """
+        if self._columnar is not None:
+            raise InvalidEngineError(
+                "explain() is only available for the sqlite engine"
+            )
+        where, params, node = self._prepare_where(where, params)
+        plan, index_sql, scan_sql = self._plan(where, params, node)
+        sql, args = (index_sql if plan.use_index else scan_sql), params
+        routed = plan.use_index and self._rtree_select(where, params, node)
+        if routed:
+            sql, args = routed
+        cur = self._reader().execute("EXPLAIN QUERY PLAN " + sql, args or ())
+        history = self._planner.stats.get(index_sql)
+        return {
+            "sql": sql,
+            "plan": [row[-1] for row in cur],
+            "use_index": plan.use_index,
+            "rows": len(self.obj_map),
+            "estimated_rows": plan.estimate,
+            "threshold": plan.threshold,
+            "estimate_source": plan.source,
+            "history": None if history is None else history.to_dict(),
+        }
+
+    def _plan(
+        self,
+        where: str,
+        params: Optional[Union[Sequence, Dict[str, Any]]],
+        node: Optional[Node] = None,
+        select_sql: str = PYOBJ_ID_COL,
+    ) -> Tuple[Plan, str, str]:
+        """Compile where, and decide whether to run it with an index or a full scan."""
+        index_sql, scan_sql, sample_sql = self._compile_query(
+            where, isinstance(params, dict), node, select_sql
+        )
+        plan = self._planner.plan(
+            index_sql,
+            sample_sql,
+            params,
+            len(self.obj_map),
+            bool(self.indices or self.rtrees),
+            self._reader(),
+        )
+        return plan, index_sql, scan_sql
+
+    def _rtree_select(
+        self,
+        where: str,
+        params: Optional[Union[Sequence, Dict[str, Any]]],
+        node: Optional[Node] = None,
+        select_sql: str = PYOBJ_ID_COL,
+    ) -> Optional[Tuple[str, Union[Tuple, Dict]]]:
+        """
+        If an R*Tree index fits the ranges in where, get SQL and args that search it first, so
+        that SQLite reads only the rows in the box. Otherwise None.
+        """
+        if not self.rtrees:
+            return None
+        if node is None:
+            # Parse the where string once per query shape; its Params are bound below.
+            cache_key = ("rtree", normalize_where(where))
+            route = self._query_cache.get(cache_key, False)
+            if route is False:
+                try:
+                    route = best_rtree(
+                        self.rtrees, parse_where(cache_key[1], self._field_names)
+                    )
+                except InvalidQueryError:
+                    # It uses SQL that LiteBox doesn't parse; leave it to SQLite.
+                    route = None
+            self._cache_query(cache_key, route)
+        else:
+            route = best_rtree(self.rtrees, node)
+        if route is None:
+            return None
+        name, terms = route
+        values = [encode_value(resolve(value, params)) for _, value in terms]
+        if not all(isinstance(v, (int, float)) for v in values):
+            return None
+        if isinstance(params, dict):
+            marks = [f":{RTREE_PARAM}{i}__" for i in range(len(values))]
+            args = dict(params, **{m[1:]: v for m, v in zip(marks, values)})
+        else:
+            marks = ["?"] * len(values)
+            args = tuple(values) + tuple(params or ())
+        box = " AND ".join(f"{col} {mark}" for (col, _), mark in zip(terms, marks))
+        search = f"SELECT id FROM {rtree_table(name)} WHERE {box}"
+        # Rows are looked up by row id; keep SQLite from scanning a B-tree index instead.
+        return self._select(
+            f"{PYOBJ_ID_COL} IN ({search}) AND ({where})",
+            args,
+            None,
+            select_sql=select_sql,
+            from_sql=f"{self.table_name} NOT INDEXED",
+        )
+
+    @reads
+    def find_nearest(
+        self,
+        point: Dict[str, float],
+        k: int = 1,
+        where: Optional[Union[str, Node]] = None,
+        params: Optional[Union[Sequence, Dict[str, Any]]] = None,
+    ) -> List[Any]:
+        """
+        Find the k objects nearest to point, a {field: value} dict over the fields of an RTree
+        index, nearest first. Only objects matching where, with a value in each field, are found.
+        """
+        names = [name for name, cols in self.rtrees.items() if set(cols) == set(point)]
+        if not names:
+            raise InvalidQueryError(
+                f"No RTree index on exactly the fields {list(point)}"
+            )
+        where, params, _ = self._prepare_where(where, params)
+        if k <= 0 or not self.obj_map:
+            return []
+        name = names[0]
+        point = {c: encode_value(v) for c, v in point.items()}
+        radius = self._nearest_radius(self.rtrees[name], point, k)
+        for _ in range(NEAREST_MAX_ROUNDS):
+            if radius is None:
+                break
+            rows = self._nearest(name, point, k, where, params, radius)
+            if len(rows) == k:
+                if rows[-1][1] > radius * radius:
+                    # Nothing outside a box of the k-th nearest distance can be nearer.
+                    radius = rows[-1][1] ** 0.5
+                    rows = self._nearest(name, point, k, where, params, radius)
+                return self._objs(ptr for ptr, _ in rows)
+            radius *= NEAREST_GROWTH
+        rows = self._nearest(name, point, k, where, params, None)
+        return self._objs(ptr for ptr, _ in rows)
+
+    def _nearest(
+        self,
+        name: str,
+        point: Dict[str, float],
+        k: int,
+        where: Optional[str],
+        params: Optional[Union[Sequence, Dict[str, Any]]],
+        radius: Optional[float],
+    ) -> List[Tuple[int, float]]:
+        """
+        Row ids and squared distances of the k rows nearest to point that match where, looking
+        only within radius of point on each field if radius is given.
+        """
+        cols = self.rtrees[name]
+        named = isinstance(params, dict)
+        values = []
+
+        def mark(value: float) -> str:
+            values.append(value)
+            return f":{RTREE_PARAM}{len(values)}__" if named else "?"
+
+        # Placeholders are numbered in order: the distance, the box, where, then the limit.
+        dist = " + ".join(
+            f"({c} - {mark(point[c])}) * ({c} - {mark(point[c])})" for c in cols
+        )
+        if radius is None:
+            conds = [f"{c} IS NOT NULL" for c in cols]
+        else:
+            box = " AND ".join(
+                f"max_{c} >= {mark(point[c] - radius)} "
+                f"AND min_{c} <= {mark(point[c] + radius)}"
+                for c in cols
+            )
+            conds = [
+                f"{PYOBJ_ID_COL} IN (SELECT id FROM {rtree_table(name)} WHERE {box})"
+            ]
+        if where:
+            conds.append(f"({where})")
+        if named:
+            args = dict(params)
+            args.update((f"{RTREE_PARAM}{i}__", v) for i, v in enumerate(values, 1))
+            args[LIMIT_PARAM] = k
+            limit = f":{LIMIT_PARAM}"
+        else:
+            args = tuple(values) + tuple(params or ()) + (k,)
+            limit = "?"
+        sql = (
+            f"SELECT {PYOBJ_ID_COL}, {dist} AS d__ FROM {self.table_name} NOT INDEXED "
+            f"WHERE {' AND '.join(conds)} ORDER BY d__ LIMIT {limit}"
+        )
+        return self._reader().execute(sql, args).fetchall()
+
+    def _nearest_radius(
+        self, cols: Tuple[str, ...], point: Dict[str, float], k: int
+    ) -> Optional[float]:
+        """
+        Guess the distance from point to its k-th nearest object from the planner's sample.
+        None if the sample can't tell.
+        """
+        sample_rows = self._planner.sample_rows
+        if not sample_rows:
+            return None
+        n = -(-k * sample_rows // len(self.obj_map))  # rounded up
+        dist = " + ".join(f"({c} - ?) * ({c} - ?)" for c in cols)
+        cur = self._reader().execute(
+            f"SELECT {dist} AS d__ FROM {self._planner.sample_table} WHERE d__ > 0 "
+            f"ORDER BY d__ LIMIT ?",
+            [point[c] for c in cols for _ in range(2)] + [n],
+        )
+        rows = cur.fetchall()
+        return rows[-1][0] ** 0.5 if rows else None
+
+    def find_iter(
+        self,
+        where: Optional[Union[str, Node]] = None,
+        params: Optional[Union[Sequence, Dict[str, Any]]] = None,
+        batch_size: int = 1000,
+        order_by: Optional[str] = None,
+    ) -> Iterator[Any]:
+        """
+        Like find(), but yields the matching objects lazily, reading batch_size rows at a time.
+        Objects removed meanwhile are skipped. Concurrent boxes run a query per batch.
+        """
+        if self._rwlock is not None and self._columnar is None:
+            # Order by row id too, so that the pages don't overlap.
+            order = PYOBJ_ID_COL if not order_by else f"{order_by}, {PYOBJ_ID_COL}"
+            offset = 0
+            while True:
+                ptrs = self.find_ids(where, params, batch_size, offset, order)
+                for ptr in ptrs:
+                    obj = self.obj_map.get(ptr)
+                    if obj is not None:
+                        yield obj
+                if len(ptrs) < batch_size:
+                    return
+                offset += batch_size
+        if self._rwlock is not None:
+            # Columnar queries take the write lock, so find the matches up front.
+            for obj in self.find(where, params, order_by=order_by):
+                if self.obj_map.get(self._ptr(obj)) is obj:
+                    yield obj
+            return
+
+        self._sync()
+        where, params, _ = self._prepare_where(where, params)
+
+        if self._columnar is not None:
+            for ptr in self._columnar_ptrs(where, params, order_by):
+                obj = self.obj_map.get(ptr)
+                if obj is not None:
+                    yield obj
+            return
+
+        sql, args = self._select(where, params, order_by)
+        cur = self._reader().cursor()
+        cur.execute(sql, args)
+        # The next query refills the isin() temp tables, so read those matches all at once.
+        read_all = f"temp.{IN_TABLE_PREFIX}" in sql
+        while True:
+            rows = cur.fetchall() if read_all else cur.fetchmany(batch_size)
+            if not rows:
+                break
+            for (ptr,) in rows:
+                obj = self.obj_map.get(ptr)
+                if obj is not None:
+                    yield obj
+
+    @reads
+    def count(
+        self,
+        where: Optional[Union[str, Node]] = None,
+        params: Optional[Union[Sequence, Dict[str, Any]]] = None,
+    ) -> int:
+        """Count the objects matching where. Runs entirely in SQLite."""
+        if not where:
+            return len(self.obj_map)
+        where, params, node = self._prepare_where(where, params)
+        if self._columnar is not None:
+            return len(self._columnar_ptrs(where, params, None))
+        # Planned like find(), which also gives the planner the actual count to learn from.
+        plan, index_sql, scan_sql = self._plan(where, params, node, "count(*)")
+        routed = plan.use_index and self._rtree_select(where, params, node, "count(*)")
+        if routed:
+            cur = self._reader().execute(*routed)
+        else:
+            cur = self._reader().execute(
+                index_sql if plan.use_index else scan_sql, params or ()
+            )
+        n = cur.fetchone()[0]
+        self._planner.record(plan, n)
+        return n
+
+    @reads
+    def exists(
+        self,
+        where: Optional[Union[str, Node]] = None,
+        params: Optional[Union[Sequence, Dict[str, Any]]] = None,
+    ) -> bool:
+        """Check whether any object matches where. Stops at the first match."""
+        if not where:
+            return len(self.obj_map) > 0
+        where, params, node = self._prepare_where(where, params)
+        if self._columnar is not None:
+            return len(self._columnar_ptrs(where, params, None)) > 0
+        plan, index_sql, scan_sql = self._plan(where, params, node, "1")
+        sql = (index_sql if plan.use_index else scan_sql) + " LIMIT 1"
+        return self._reader().execute(sql, params or ()).fetchone() is not None
+
+    @reads
+    def aggregate(
+        self,
+        where: Optional[Union[str, Node]],
+        aggregates: Dict[str, str],
+        params: Optional[Union[Sequence, Dict[str, Any]]] = None,
+        group_by: Optional[Union[str, Sequence[str]]] = None,
+    ) -> Dict[Any, Any]:
+        """
+        Compute aggregates, {name: SQL expression}, over the objects matching where. Returns
+        {name: value}, or with group_by, {group value, or tuple of them: {name: value}}.
+        """
+        where, params, _ = self._prepare_where(where, params)
+        names = list(aggregates)
+        exprs = [aggregates[name] for name in names]
+        if isinstance(group_by, str):
+            group_cols = [group_by]
+        else:
+            group_cols = list(group_by or [])
+
+        if self._columnar is not None:
+            ptrs = self._columnar_ptrs(where, params, None)
+            groups = self._columnar.aggregate(ptrs, exprs, group_cols)
+        else:
+            select_str = ",".join(group_cols + exprs)
+            group_str = ",".join(group_cols)
+            sql = f"SELECT {select_str} FROM {self.table_name}"
+            if where:
+                sql += f" WHERE {where}"
+            if group_cols:
+                sql += f" GROUP BY {group_str}"
+            cur = self._reader().execute(sql, params or ())
+            n = len(group_cols)
+            groups = [(row[:n], row[n:]) for row in cur]
+            if self._encode_params:
+                groups = self._decode_groups(group_cols, exprs, groups)
 
-        # If we're here, we got too many rows. So this query would be best run
-        # without an index.
-        query = (
-            f"SELECT {PYOBJ_ID_COL} FROM {self.table_name} NOT INDEXED WHERE {where}"
+        if not group_cols:
+            return dict(zip(names, groups[0][1]))
+        return {
+            (key[0] if len(key) == 1 else key): dict(zip(names, values))
+            for key, values in groups
+        }
+
+    def _decode_groups(
+        self, group_cols: List[str], exprs: List[str], groups: List[Tuple[Tuple, Tuple]]
+    ) -> List[Tuple[Tuple, Tuple]]:
+        """Decode the group keys, and min() or max() of a field, of stored datetimes and such."""
+        key_cols = tuple(c if c not in self._multi else None for c in group_cols)
+        value_cols = []
+        for expr in exprs:
+            m = re.fullmatch(r"\s*(?:min|max)\s*\(\s*(\w+)\s*\)\s*", expr, re.I)
+            value_cols.append(
+                m.group(1) if m and m.group(1) not in self._multi else None
+            )
+        keys = self._decode_rows(key_cols, [key for key, _ in groups])
+        values = self._decode_rows(tuple(value_cols), [vals for _, vals in groups])
+        return list(zip(keys, values))
+
+    def _prepare_where(
+        self,
+        where: Optional[Union[str, Node]],
+        params: Optional[Union[Sequence, Dict[str, Any]]],
+    ) -> Tuple[Any, Any, Optional[Node]]:
+        """
+        Compile a Q expression to a where clause and args. Returns (where, params, Q expression
+        or None). Strings pass through, and the columnar engine takes Q expressions as they are.
+        """
+        if not isinstance(where, Node):
+            if params and self._encode_params:
+                if isinstance(params, dict):
+                    params = {k: encode_value(v) for k, v in params.items()}
+                else:
+                    params = list(map(encode_value, params))
+            return where, params, None
+        if params is not None:
+            raise InvalidQueryError(
+                "Q expressions hold their own values; pass no params"
+            )
+        for field in where.fields():
+            if field not in self._field_names:
+                raise InvalidQueryError(f"Unknown field in query: {field}")
+        for leaf in where.leaves():
+            if isinstance(leaf, Contains) and leaf.field not in self._multi:
+                raise InvalidQueryError(f"{leaf.field} is not a multi-valued field")
+            if isinstance(leaf, Match) and leaf.field not in self._text:
+                raise InvalidQueryError(f"{leaf.field} is not a Text field")
+        if self._columnar is not None:
+            return where, None, None
+        sql, args, in_lists = to_sql(where)
+        if self._encode_params:
+            args = list(map(encode_value, args))
+            in_lists = [list(map(encode_value, values)) for values in in_lists]
+        for i, values in enumerate(in_lists):
+            self._fill_in_table(i, values)
+        return sql, args, where
+
+    def _fill_in_table(self, i: int, values: List[Any]):
+        """Load the values of a long isin() into a temp table, for SQLite to join against."""
+        # Temp tables belong to a connection, so in concurrent mode each thread has its own.
+        conn = self._reader()
+        table = f"temp.{IN_TABLE_PREFIX}{i}__"
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (v PRIMARY KEY)")
+        conn.execute(f"DELETE FROM {table}")
+        self._execute_many(
+            f"INSERT OR IGNORE INTO {table} VALUES (?)", zip(values), conn.cursor()
         )
-        cur.execute(query)
-        return list(self.obj_map[r[0]] for r in cur)
 
+    def _within_where(self, within: ResultSet, where: Optional[str]) -> str:
+        """
+        Load the row ids of within into a temp table, and add a join against it to where.
+        SQLite then reads only the rows in within.
+        """
+        conn = self._reader()
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {WITHIN_TABLE} (v INTEGER PRIMARY KEY)"
+        )
+        conn.execute(f"DELETE FROM {WITHIN_TABLE}")
+        # Sorted ids append to the end of the temp table's b-tree, which is fastest.
+        self._execute_many(
+            f"INSERT INTO {WITHIN_TABLE} VALUES (?)",
+            zip(sorted(within.ids)),
+            conn.cursor(),
+        )
+        within_sql = f"{PYOBJ_ID_COL} IN {WITHIN_TABLE}"
+        return within_sql if not where else f"{within_sql} AND ({where})"
+
+    def _best_index(self, node: Node) -> Optional[str]:
+        """
+        Name the index that serves the most leading terms of node: equality terms, then a range
+        term. None if no index serves any, or if several tie; SQLite chooses in those cases.
+        """
+        candidate = candidate_index(node)
+        if candidate is None:
+            return None
+        eq_cols, range_col = candidate
+        scores = dict()
+        for name, cols in self.indices.items():
+            n = 0
+            while n < len(cols) and cols[n] in eq_cols:
+                n += 1
+            if n < len(cols) and cols[n] == range_col:
+                n += 1
+            scores[name] = n
+        best = max(scores.values(), default=0)
+        winners = [name for name, score in scores.items() if score == best]
+        return winners[0] if best > 0 and len(winners) == 1 else None
+
+    def _reader(self) -> sqlite3.Connection:
+        """The connection to run queries on. In concurrent mode, each thread has its own."""
+        if self._pool is None:
+            return self.conn
+        return self._pool.get()
+
+    def _select(
+        self,
+        where: Optional[str],
+        params: Optional[Union[Sequence, Dict[str, Any]]],
+        order_by: Optional[str],
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        select_sql: str = PYOBJ_ID_COL,
+        from_sql: Optional[str] = None,
+    ) -> Tuple[str, Union[Tuple, Dict]]:
+        """
+        Get SQL and args for a single-statement select, with optional ordering and paging.
+        The SQL is cached by query shape, like in find(). from_sql replaces the table name.
+        """
+        named = isinstance(params, dict)
+        paged = limit is not None or offset is not None
+        cache_key = (
+            "select",
+            normalize_where(where or ""),
+            named,
+            order_by,
+            paged,
+            select_sql,
+            from_sql,
+        )
+        sql = self._query_cache.get(cache_key)
+        if sql is None:
+            sql = f"SELECT {select_sql} FROM {from_sql or self.table_name}"
+            if cache_key[1]:
+                sql += f" WHERE {cache_key[1]}"
+            if order_by:
+                sql += f" ORDER BY {order_by}"
+            if paged:
+                if named:
+                    sql += f" LIMIT :{LIMIT_PARAM} OFFSET :{OFFSET_PARAM}"
+                else:
+                    sql += " LIMIT ? OFFSET ?"
+        self._cache_query(cache_key, sql)
+
+        # SQLite reads a negative LIMIT as no limit.
+        limit = -1 if limit is None else limit
+        offset = offset or 0
+        if named:
+            args = dict(params)
+            if paged:
+                args[LIMIT_PARAM] = limit
+                args[OFFSET_PARAM] = offset
+        else:
+            args = tuple(params or ())
+            if paged:
+                args += (limit, offset)
+        return sql, args
+
+    def _columnar_ptrs(
+        self,
+        where: Optional[str],
+        params: Optional[Union[Sequence, Dict[str, Any]]],
+        order_by: Optional[str],
+    ) -> List[int]:
+        """Get ptrs matching where, ordered by order_by, from the columnar engine."""
+        if where:
+            node = self._compile_query(where, False)
+            ptrs = self._columnar.query(node, params)
+        else:
+            ptrs = list(self.obj_map)
+        if order_by:
+            ptrs = self._columnar.sort(
+                ptrs, parse_order_by(order_by, self._columnar.columns)
+            )
+        return ptrs
+
+    def _compile_query(
+        self,
+        where: Union[str, Node],
+        named: bool,
+        node: Optional[Node] = None,
+        select_sql: str = PYOBJ_ID_COL,
+    ):
+        """
+        Compile a where clause, or get it from the LRU cache of query shapes: for SQLite,
+        (index_sql, scan_sql, sample_sql) selecting select_sql; for columnar, a parse tree.
+        """
+        if isinstance(where, Node):
+            return where  # already parsed
+        # SQL compiled from Q expressions is already in canonical form.
+        template = where if node is not None else normalize_where(where)
+        cache_key = (template, named, node is not None, select_sql)
+        try:
+            self._query_cache.move_to_end(cache_key)
+            return self._query_cache[cache_key]
+        except KeyError:
+            pass
+        if self._columnar is not None:
+            compiled = parse_where(template, self._columnar.columns)
+            self._cache_query(cache_key, compiled)
+            return compiled
+        hint = None if node is None else self._best_index(node)
+        indexed_by = "" if hint is None else f" INDEXED BY idx_{hint}"
+        compiled = (
+            f"SELECT {select_sql} FROM {self.table_name}{indexed_by} WHERE {template}",
+            f"SELECT {select_sql} FROM {self.table_name} NOT INDEXED WHERE {template}",
+            f"SELECT count(*) FROM {self._planner.sample_table} WHERE {template}",
+        )
+        self._cache_query(cache_key, compiled)
+        return compiled
+
+    def _cache_query(self, cache_key: Tuple, compiled: Any):
+        # Re-insert to mark as most recently used; safe if another thread evicts it meanwhile.
+        self._query_cache.pop(cache_key, None)
+        self._query_cache[cache_key] = compiled
+        if len(self._query_cache) > QUERY_CACHE_SIZE:
+            self._query_cache.popitem(last=False)
+
+    @writes
     def add(self, obj: Any):
         """Add a single object to the table. Use add_many instead where possible."""
-        ptr = id(obj)
-        if ptr in self.obj_map:
+        if self._dead:
+            self._flush_dead()
+        if self._ptr(obj) is not None:
             return  # already got it
 
-        col_str = ",".join([get_field_name(f) for f in self.fields]) + f",{PYOBJ_ID_COL}"
-        value_str = ",".join(["?"] * (len(self.fields) + 1))
-        q = f"INSERT INTO {self.table_name} ({col_str}) VALUES({value_str})"
-
+        ptr = self._new_ptr(obj)
         self.obj_map[ptr] = obj
-        values = [get_field(obj, c) for c in self.fields] + [ptr]
-        cur = self.conn.cursor()
-        cur.execute(q, values)
+        if self.track and is_tracked(obj):
+            watch(obj, self)
+        try:
+            row = self._extractor.row(obj)
+            if self._columnar is not None:
+                self._columnar.insert(ptr, row)
+                return
+            ids = (ptr,) if self.key is None else (get_field(obj, self.key), ptr)
+            if self._extra_cols:
+                ids = self._stamp_row() + ids
+            self.conn.execute(self._insert_sql, row + ids)
+        except Exception:
+            self._forget(ptr, obj)  # as if it was never added
+            raise
+        self._planner.changes += 1
+        self._enforce_max_size()
 
-    def add_many(self, objs: Iterable[any]):
-        """Add a collection of objects to the table."""
-        obj_ids = [id(obj) for obj in objs]
+    @writes
+    def add_many(
+        self,
+        objs: Iterable[Any],
+        columns: Optional[Dict[Union[str, Callable], Sequence]] = None,
+    ):
+        """Add a collection of objects, reading the fields in columns from there if given."""
+        if self._dead:
+            self._flush_dead()
+        objs = list(objs)  # read more than once below; may be a generator
+        # Identify objs by id, or by key. With a key, the first of several objs with the same
+        # key wins, as if they were added one by one.
+        if self.key is None:
+            idents = list(map(id, objs))
+            new_objs = dict(zip(idents, objs))
+            present = self.obj_map
+        else:
+            idents = self._key_extractor.values(objs)
+            new_objs = dict()
+            for ident, obj in zip(idents, objs):
+                new_objs.setdefault(ident, obj)
+            present = self._key_ptrs
 
-        # Build a dict first to eliminate repeats in objs. Also skip objs already in the table.
-        new_objs = {
-            obj_ids[i]: objs[i]
-            for i in range(len(obj_ids))
-            if obj_ids[i] not in self.obj_map
-        }
+        # Skip objs already in the table.
+        if present:
+            for ident in present.keys() & new_objs.keys():
+                del new_objs[ident]
+
+        if columns is None:
+            rows = self._extractor.rows(new_objs.values())
+        else:
+            values = self._column_values(objs, idents, new_objs, columns)
+
+        id_cols = self._stamps(len(new_objs))
+        if self.key is None:
+            id_cols.append(new_objs)
+        else:
+            # Hand out row ids in order, and store each key next to its row id.
+            keys = list(new_objs)
+            ptrs = range(self._next_ptr, self._next_ptr + len(keys))
+            self._next_ptr += len(keys)
+            self._key_ptrs.update(zip(keys, ptrs))
+            new_objs = dict(zip(ptrs, new_objs.values()))
+            id_cols += [keys, ptrs]
+        if columns is None:
+            params = map(tuple.__add__, rows, zip(*id_cols))
+        else:
+            # Bind straight from the columns, without building a row per object first.
+            params = zip(*values, *id_cols)
+            rows = zip(*values)
+
+        if self.track:
+            for obj in new_objs.values():
+                if is_tracked(obj):
+                    watch(obj, self)
+
+        if self._columnar is not None:
+            self._columnar.insert_many(list(new_objs), rows)
+            self.obj_map.update(new_objs)
+            return
 
         # do inserts
-        value_str = ",".join(["?"] * (len(self.fields) + 1))
-        col_str = ",".join([get_field_name(f) for f in self.fields]) + f",{PYOBJ_ID_COL}"
-        q = f"INSERT INTO {self.table_name} ({col_str}) VALUES ({value_str})"
+        deferred = []
+        if self.defer_indices and len(new_objs) >= max(
+            DEFER_INDICES_MIN_ROWS, len(self.obj_map)
+        ):
+            deferred = list(self.indices)
+            for name in deferred:
+                self.conn.execute(f"DROP INDEX idx_{name}")
+        try:
+            self._execute_chunked(self._insert_sql, params)
+        finally:
+            for name in deferred:
+                cols = ",".join(self.indices[name])
+                self.conn.execute(
+                    f"CREATE INDEX idx_{name} ON {self.table_name}({cols})"
+                )
+        self.obj_map.update(new_objs)
+        self._planner.changes += len(new_objs)
+        self._enforce_max_size()
+
+    def _column_values(
+        self,
+        objs: Sequence[Any],
+        idents: List[Any],
+        new_objs: Dict[Any, Any],
+        columns: Dict[Union[str, Callable], Sequence],
+    ) -> List[Sequence]:
+        """
+        Get the values of each field for new_objs, reading from columns where available.
+        idents are the ids or keys of objs, which new_objs is keyed by.
+        """
+        positions = None  # positions in objs of new_objs, if not all objs are new
+        if len(new_objs) < len(idents):
+            positions = dict()
+            for i, ident in enumerate(idents):
+                if ident in new_objs and ident not in positions:
+                    positions[ident] = i
+            positions = list(positions.values())
+
+        values = []
+        for field in self.fields:
+            col = columns.get(field, columns.get(get_field_name(field)))
+            encode = self._encoders.get(get_field_name(field))
+            if col is None:
+                col = [get_field(obj, field) for obj in new_objs.values()]
+                if encode is not None:
+                    col = list(map(encode, col))
+                values.append(col)
+                continue
+            if len(col) != len(idents):
+                raise InvalidFields(
+                    f"Column {get_field_name(field)} has {len(col)} values, "
+                    f"expected {len(idents)}"
+                )
+            if hasattr(col, "tolist"):
+                # NumPy / pandas values -> Python ints, floats, and strs
+                col = col.tolist()
+            if positions is not None:
+                col = [col[i] for i in positions]
+            if encode is not None:
+                col = list(map(encode, col))
+            values.append(col)
+        return values
+
+    @classmethod
+    def from_columns(
+        cls,
+        objs: Sequence[Any],
+        columns: Dict[Union[str, Callable], Sequence],
+        on: Optional[Dict[Union[str, Callable], type]] = None,
+        index: Optional[List[Union[Tuple, str, RTree]]] = None,
+        engine: str = SQLITE_ENGINE,
+    ) -> "LiteBox":
+        """
+        Make a LiteBox from objects plus precomputed column values aligned with them.
+        If on is not given, each column's type is taken from its first non-null value.
+        """
+        if on is None:
+            on = {field: infer_type(col) for field, col in columns.items()}
+        lb = cls(on=on, index=[], engine=engine)
+        lb.add_many(objs, columns=columns)
+        lb._create_indices(index)
+        return lb
+
+    def save(self, path: str):
+        """
+        Save the table and its indices to a SQLite file at path, for LiteBox.load().
+        Requires key=, since loading matches objects to their saved rows by key.
+        """
+        if self._columnar is not None:
+            raise InvalidEngineError("save() is only available for the sqlite engine")
+        self._require_key("save()")
+        self.wait_for_indices()
+        if self._eviction is not None:
+            self._flush_touches()
+        self._save(path)
+
+    @reads
+    def _save(self, path: str):
+        meta = {
+            "version": SNAPSHOT_VERSION,
+            "table": self.table_name,
+            "fields": [
+                [get_field_name(f), type_name(t)] for f, t in self.fields.items()
+            ],
+            "key": get_field_name(self.key),
+            "indices": {name: list(cols) for name, cols in self.indices.items()},
+            "rtrees": {name: list(cols) for name, cols in self.rtrees.items()},
+            "extra_columns": self._extra_cols,
+            "strict": self.strict,
+            "without_rowid": self.without_rowid,
+        }
+        if self._path == os.path.abspath(path):
+            return  # loaded with mmap from this file, and not changed since
+        # Write to a temporary file and move it into place, so path is never half-written.
+        tmp_path = path + ".tmp"
+        dest = sqlite3.connect(tmp_path)
+        try:
+            self._reader().backup(dest)
+            write_meta(dest, meta)
+        finally:
+            dest.close()
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(
+        cls,
+        path: str,
+        objs: Iterable[Any],
+        on: Optional[Dict[Union[str, Callable], type]] = None,
+        key: Optional[Union[str, Callable]] = None,
+        mmap: bool = True,
+        **kwargs,
+    ) -> "LiteBox":
+        """
+        Load a LiteBox saved by save(), matching objs to the saved rows by key. With mmap, the
+        file is read in place until the first change. See the README for the details.
+        """
+        meta = read_meta(path)
+        if on is None:
+            on = {name: type_from_name(t) for name, t in meta["fields"]}
+        elif {get_field_name(f): type_name(t) for f, t in on.items()} != dict(
+            meta["fields"]
+        ):
+            raise InvalidFields(
+                f"Fields {on} don't match the saved fields {dict(meta['fields'])}"
+            )
+        if key is None:
+            key = meta["key"]
+        elif get_field_name(key) != meta["key"]:
+            raise InvalidFields(f"Key {key} doesn't match the saved key {meta['key']}")
+        if kwargs.get("engine", SQLITE_ENGINE) != SQLITE_ENGINE:
+            raise InvalidEngineError("load() is only available for the sqlite engine")
+
+        lb = cls(on=on, index=[], key=key, **kwargs)
+        saved_cols = meta.get("extra_columns", [])
+        if lb._extra_cols != saved_cols:
+            raise InvalidSnapshotError(
+                f"{path} was saved with eviction columns {saved_cols}, "
+                f"but max_size, ttl and eviction call for {lb._extra_cols}"
+            )
+        lb._attach(path, meta, mmap)
+        lb._attach_objs(objs)
+        return lb
+
+    def _attach(self, path: str, meta: Dict[str, Any], mmap: bool):
+        """Swap the empty table for the one saved at path."""
+        self._close_conns()
+        concurrent = self._rwlock is not None
+        self.table_name = meta["table"]
+        if mmap:
+            self._path = os.path.abspath(path)
+            uri = "file:" + pathname2url(self._path) + "?mode=ro"
+            pragmas = [f"PRAGMA mmap_size={MMAP_SIZE}"]
+            self._connect(concurrent, uri, pragmas, read_only=True)
+        else:
+            src = sqlite3.connect(path)
+            try:
+                self._copy_into_memory(src)
+            finally:
+                src.close()
+        self._planner = Planner(
+            self.conn,
+            self.table_name,
+            self._column_defs() + [f"{PYOBJ_ID_COL} INTEGER"],
+        )
+        self.indices = {name: tuple(cols) for name, cols in meta["indices"].items()}
+        self.rtrees = {
+            name: tuple(cols) for name, cols in meta.get("rtrees", {}).items()
+        }
+        last = self.conn.execute(
+            f"SELECT max({PYOBJ_ID_COL}) FROM {self.table_name}"
+        ).fetchone()[0]
+        self._next_ptr = (last or 0) + 1
+        self.strict = meta.get("strict", False)
+        self.without_rowid = meta.get("without_rowid", False)
+        self._query_cache.clear()
+        self._init_sql()
+        if self._eviction is not None:
+            col = self._eviction.column
+            last = self.conn.execute(
+                f"SELECT max({col}) FROM {self.table_name}"
+            ).fetchone()[0]
+            self._eviction.resume(last)
+        if self.ttl is not None:
+            oldest = self.conn.execute(
+                f"SELECT min({ADDED_COL}) FROM {self.table_name}"
+            ).fetchone()[0]
+            if oldest is not None:
+                self._next_expiry = oldest + self.ttl
+
+    def _copy_into_memory(self, src: sqlite3.Connection):
+        """Copy the database of src into a new in-memory database, and use that from now on."""
+        uri = None
+        if self._rwlock is not None:
+            # The table name may be in use by another concurrent LiteBox.
+            uri = shared_memory_uri("ri_" + str(get_next_table_id()))
+        self._connect(self._rwlock is not None, uri)
+        src.backup(self.conn)
+
+    def _copy_on_write(self):
+        """Before the first change to a table loaded with mmap, move it off the file."""
+        if self._path is not None:
+            self._path = None
+            conn, pool = self.conn, self._pool
+            self._copy_into_memory(conn)
+            conn.close()
+            if pool is not None:
+                pool.close()
+            self._planner.conn = self.conn
 
-        rows = []
-        for ptr, obj in new_objs.items():
-            values = [get_field(obj, c) for c in self.fields] + [ptr]
-            rows.append(values)
+    def _close_conns(self):
+        """Close the connection, and the per-thread read connections if any."""
+        self.conn.close()
+        if self._pool is not None:
+            self._pool.close()
 
+    def _attach_objs(self, objs: Iterable[Any]):
+        """Match objs to the rows of a loaded table by key. Add new ones, and remove stale rows."""
+        cur = self.conn.execute(
+            f"SELECT {KEY_COL}, {PYOBJ_ID_COL} FROM {self.table_name}"
+        )
+        self._key_ptrs = dict(cur)
+        objs = list(objs)
+        ptrs = list(map(self._key_ptrs.get, self._key_extractor.values(objs)))
+        self.obj_map.update(
+            {ptr: obj for ptr, obj in zip(ptrs, objs) if ptr is not None}
+        )
+        new_objs = [obj for ptr, obj in zip(ptrs, objs) if ptr is None]
+        if self.track:
+            for obj in self.obj_map.values():
+                if is_tracked(obj):
+                    watch(obj, self)
+        if len(self.obj_map) < len(self._key_ptrs):
+            self._copy_on_write()
+            stale = [k for k, ptr in self._key_ptrs.items() if ptr not in self.obj_map]
+            self._execute_many(
+                self._delete_sql, [(self._key_ptrs.pop(k),) for k in stale]
+            )
+        self._planner.resume(len(self.obj_map))
+        if new_objs:
+            self.add_many(new_objs)
+
+    def _execute_chunked(self, query: str, rows: Iterable[Sequence[Any]]):
+        """Run query for each row, committing every BULK_CHUNK_SIZE rows."""
+        rows = iter(rows)
         cur = self.conn.cursor()
-        cur.executemany(q, rows)
-        self.obj_map.update(new_objs)
+        for first in rows:
+            self._execute_many(
+                query, chain((first,), islice(rows, BULK_CHUNK_SIZE - 1)), cur
+            )
+
+    def _execute_many(
+        self, query: str, rows: Iterable[Sequence[Any]], cur: sqlite3.Cursor = None
+    ):
+        """Run query for each row in a single transaction."""
+        cur = cur or self.conn.cursor()
+        cur.execute("BEGIN")
+        cur.executemany(query, rows)
+        cur.execute("COMMIT")
 
+    @writes
     def remove(self, obj: Any):
         """Remove a single object from the table. Fast operation (<1ms usually)."""
-        ptr = id(obj)
+        ptr = self._ptr(obj)
+        if ptr is None:
+            raise NotInIndexError(f"Could not find object with id: {id(obj)}")
+        self._remove_ptr(ptr, obj)
+
+    @writes
+    def remove_key(self, key: Any):
+        """Remove the object with the given key. Requires key=."""
+        self._require_key("remove_key()")
+        ptr = self._key_ptrs.get(key)
         if ptr not in self.obj_map:
-            raise NotInIndexError(f"Could not find object with id: {ptr}")
-        del self.obj_map[ptr]
-        q = f"DELETE FROM {self.table_name} WHERE {PYOBJ_ID_COL}=?"
+            raise NotInIndexError(f"Could not find object with key: {key!r}")
+        self._remove_ptr(ptr, self.obj_map[ptr])
+
+    def _remove_ptr(self, ptr: int, obj: Any):
+        self._forget(ptr, obj)
+        if self._columnar is not None:
+            self._columnar.delete(ptr)
+            return
         cur = self.conn.cursor()
-        cur.execute(q, (ptr,))
+        cur.execute(self._delete_sql, (ptr,))
+        self._planner.changes += 1
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        """Get the object with the given key, or default if there isn't one. Requires key=."""
+        self._require_key("get()")
+        ptr = self._key_ptrs.get(key)
+        return self.obj_map.get(ptr, default)
+
+    def upsert(self, obj: Any):
+        """Add obj, replacing the object with the same key if there is one. Requires key=."""
+        self.upsert_many([obj])
+
+    @writes
+    def upsert_many(self, objs: Iterable[Any]):
+        """
+        Add objs, replacing the stored objects with the same keys, in one transaction.
+        When several objs share a key, the last one wins. Requires key=.
+        """
+        self._require_key("upsert_many()")
+        if self._dead:
+            self._flush_dead()
+        objs = list(objs)
+        latest = dict(zip(self._key_extractor.values(objs), objs))
+        ptrs = []
+        existing = []  # the ptrs in ptrs that were already in the table
+        for key, obj in latest.items():
+            ptr = self._key_ptrs.get(key)
+            if ptr is None:
+                ptr = self._key_ptrs[key] = self._next_ptr
+                self._next_ptr += 1
+                self.obj_map[ptr] = obj
+                if self.track and is_tracked(obj):
+                    watch(obj, self)
+            else:
+                self._dirty.pop(ptr, None)
+                self._replace(ptr, obj)
+                existing.append(ptr)
+            ptrs.append(ptr)
+        rows = self._extractor.rows(latest.values())
+        if self._columnar is not None:
+            for ptr in existing:
+                self._columnar.delete(ptr)
+            self._columnar.insert_many(ptrs, rows)
+            return
+        # One statement inserts new rows and overwrites existing ones in place.
+        stamps = self._stamps(len(ptrs))
+        self._execute_chunked(
+            self._upsert_sql, map(tuple.__add__, rows, zip(*stamps, latest, ptrs))
+        )
+        self._planner.changes += len(ptrs)
+        self._enforce_max_size()
 
+    def _require_key(self, method: str):
+        if self.key is None:
+            raise KeyNotSetError(f"{method} needs a LiteBox made with key=")
+
+    @writes
     def update(self, obj: Any):
         """Update a single object in the table. Fast operation (<1ms usually)."""
-        ptr = id(obj)
-        if ptr not in self.obj_map:
-            raise NotInIndexError(f"Could not find object with id: {ptr}")
-        self.remove(obj)
-        self.add(obj)
+        ptr = self._ptr(obj)
+        if ptr is None:
+            raise NotInIndexError(f"Could not find object with id: {id(obj)}")
+        self._dirty.pop(ptr, None)
+        if self.key is not None:
+            self._replace(ptr, obj)
+        row = self._extractor.row(obj)
+        if self._columnar is not None:
+            self._columnar.delete(ptr)
+            self._columnar.insert(ptr, row)
+            return
+        cur = self.conn.cursor()
+        cur.execute(self._update_sql, row + (ptr,))
+        self._planner.changes += 1
+
+    @writes
+    def update_many(self, objs: Iterable[Any]) -> List[Any]:
+        """
+        Update a collection of objects in one transaction.
+        Returns the objects that were not in the table; those are skipped.
+        """
+        return self._update_many(objs)
+
+    def _update_many(self, objs: Iterable[Any]) -> List[Any]:
+        present, missing = self._split_present(objs)
+        if self._dirty:
+            for ptr in present:
+                self._dirty.pop(ptr, None)
+        if self.key is not None:
+            for ptr, obj in present.items():
+                self._replace(ptr, obj)
+        rows = self._extractor.rows(present.values())
+        if self._columnar is not None:
+            for ptr, row in zip(present, rows):
+                self._columnar.delete(ptr)
+                self._columnar.insert(ptr, row)
+            return missing
+        self._execute_many(self._update_sql, map(tuple.__add__, rows, zip(present)))
+        self._note_changed(present)
+        self._planner.changes += len(present)
+        return missing
+
+    @writes
+    def remove_many(self, objs: Iterable[Any]) -> List[Any]:
+        """
+        Remove a collection of objects in one transaction.
+        Returns the objects that were not in the table; those are skipped.
+        """
+        present, missing = self._split_present(objs)
+        for ptr, obj in present.items():
+            self._forget(ptr, obj)
+        if self._columnar is not None:
+            for ptr in present:
+                self._columnar.delete(ptr)
+            return missing
+        self._execute_many(self._delete_sql, zip(present))
+        self._planner.changes += len(present)
+        return missing
+
+    def _mark_dirty(self, obj: Any, name: str):
+        """Called by tracked objects when an attribute is set."""
+        if self._tracked_names is not None and name not in self._tracked_names:
+            return
+        ptr = self._ptr(obj)
+        if ptr is not None and self.obj_map.get(ptr) is obj:
+            with self._dirty_lock:
+                self._dirty[ptr] = obj
+
+    def _ptr(self, obj: Any) -> Optional[int]:
+        """The row id of obj, or None if it isn't in the table. With a key, goes by obj's key."""
+        if self.key is None:
+            ptr = id(obj)
+            return ptr if ptr in self.obj_map else None
+        ptr = self._key_ptrs.get(get_field(obj, self.key))
+        return ptr if ptr in self.obj_map else None  # if weak, the object may have died
+
+    def _new_ptr(self, obj: Any) -> int:
+        """Make a row id for an object being added."""
+        if self.key is None:
+            return id(obj)
+        ptr = self._next_ptr
+        self._next_ptr += 1
+        self._key_ptrs[get_field(obj, self.key)] = ptr
+        return ptr
+
+    def _forget(self, ptr: int, obj: Any):
+        """Drop the object at ptr, which is obj or has obj's key, from everything but the table."""
+        stored = self.obj_map.pop(ptr)
+        if self.key is not None:
+            del self._key_ptrs[get_field(obj, self.key)]
+        if self.track:
+            self._dirty.pop(ptr, None)
+            unwatch(stored, self)
+
+    def _replace(self, ptr: int, obj: Any):
+        """Put obj in place of the object with the same key."""
+        stored = self.obj_map[ptr]
+        if stored is obj:
+            return
+        self.obj_map[ptr] = obj
+        if self.track:
+            unwatch(stored, self)
+            if is_tracked(obj):
+                watch(obj, self)
+
+    def _sync(self):
+        """Apply pending changes to the table, and refresh planner statistics if they're stale."""
+        if self._index_builder is not None and not self._index_builder.is_alive():
+            self._use_built_indices(self._index_builder)
+        if self._dead:
+            self._flush_dead()
+        if self.ttl is not None and time.time() >= self._next_expiry:
+            self._expire()
+        if self._dirty:
+            self._flush_dirty()
+        if self._planner is not None and self._index_builder is None:
+            self._refresh_planner()
+
+    def _refresh_planner(self):
+        """Re-sample the table for the planner if enough has changed since the last time."""
+        if self._planner.needs_refresh(len(self.obj_map)):
+            self._resample()
+
+    @writes
+    def _resample(self):
+        # Check again; another thread may have done it while we waited for the lock.
+        if self._planner.needs_refresh(len(self.obj_map)):
+            self._planner.refresh(list(self.obj_map))
+
+    @flushes
+    def _flush_dead(self):
+        """Delete the rows of weakly-held objects that have died, in one batch."""
+        ptrs = []
+        while self._dead:
+            ptr, key = self._dead.popleft()
+            if ptr in self.obj_map:
+                continue  # the id now belongs to a new object, which replaced the row
+            if self.key is not None and self._key_ptrs.get(key) == ptr:
+                del self._key_ptrs[key]
+            self._dirty.pop(ptr, None)
+            ptrs.append(ptr)
+        if self._columnar is not None:
+            for ptr in ptrs:
+                self._columnar.delete(ptr)
+            return
+        self._execute_many(self._delete_sql, zip(ptrs))
+        self._note_changed(ptrs)
+        self._planner.changes += len(ptrs)
+
+    def _stamps(self, n: int) -> List[Iterable[Any]]:
+        """Values of each eviction column for n rows being added now."""
+        stamps = []
+        if self._eviction is not None:
+            stamps.append(self._eviction.stamps(n))
+        if self.ttl is not None:
+            now = time.time()
+            self._next_expiry = min(self._next_expiry, now + self.ttl)
+            stamps.append(repeat(now, n))
+        return stamps
+
+    def _stamp_row(self) -> Tuple:
+        """Values of each eviction column for one row being added now."""
+        stamps = ()
+        if self._eviction is not None:
+            stamps = (self._eviction.stamp(),)
+        if self.ttl is not None:
+            now = time.time()
+            self._next_expiry = min(self._next_expiry, now + self.ttl)
+            stamps += (now,)
+        return stamps
+
+    def _enforce_max_size(self):
+        """Evict objects if there are more than max_size. Overshoots, to batch evictions."""
+        if self.max_size is None or len(self.obj_map) <= self.max_size:
+            return
+        n = len(self.obj_map) - self.max_size + int(self.max_size * EVICT_FRACTION)
+        col = self._eviction.column
+        self._write_touches()
+        # Find the last row to evict by walking the policy's index. Rows up to it, in the
+        # order (column, row id), are then one range of that index.
+        last = self.conn.execute(
+            f"SELECT {col}, {PYOBJ_ID_COL} FROM {self.table_name} "
+            f"ORDER BY {col}, {PYOBJ_ID_COL} LIMIT 1 OFFSET ?",
+            (n - 1,),
+        ).fetchone()
+        self._drop_rows(
+            f"{col} <= ? AND ({col} < ? OR {PYOBJ_ID_COL} <= ?)", last[:1] + last
+        )
+
+    @writes
+    def _flush_touches(self):
+        self._write_touches()
+
+    def _write_touches(self):
+        """Write the eviction policy's pending column values to the table."""
+        pending = self._eviction.pending()
+        if pending:
+            self._execute_many(
+                f"UPDATE {self.table_name} SET {self._eviction.column}=? "
+                f"WHERE {PYOBJ_ID_COL}=?",
+                zip(pending.values(), pending),
+            )
+
+    @flushes
+    def _expire(self):
+        """Remove the objects that were added more than ttl seconds ago."""
+        now = time.time()
+        self._drop_rows(f"{ADDED_COL} <= ?", (now - self.ttl,))
+        oldest = self.conn.execute(
+            f"SELECT min({ADDED_COL}) FROM {self.table_name}"
+        ).fetchone()[0]
+        self._next_expiry = float("inf") if oldest is None else oldest + self.ttl
+
+    def _drop_rows(self, where: str, params: Sequence[Any]):
+        """Remove the objects whose rows match where, with a single DELETE."""
+        key_col = PYOBJ_ID_COL if self.key is None else KEY_COL
+        cur = self.conn.execute(
+            f"SELECT {PYOBJ_ID_COL}, {key_col} FROM {self.table_name} WHERE {where}",
+            params,
+        )
+        rows = cur.fetchall()
+        for ptr, key in rows:
+            obj = self.obj_map.get(ptr)
+            if ptr in self.obj_map:
+                del self.obj_map[ptr]
+            if self.key is not None:
+                self._key_ptrs.pop(key, None)
+            if self.track:
+                self._dirty.pop(ptr, None)
+                if obj is not None:
+                    unwatch(obj, self)
+        self.conn.execute(f"DELETE FROM {self.table_name} WHERE {where}", params)
+        self._note_changed(ptr for ptr, _ in rows)
+        self._planner.changes += len(rows)
+
+    @flushes
+    def _flush_dirty(self):
+        """Re-index all tracked objects that changed since the last flush, in one batch."""
+        # Swap in a new dict rather than clearing, so changes made meanwhile aren't lost.
+        with self._dirty_lock:
+            dirty, self._dirty = self._dirty, dict()
+        self._update_many(dirty.values())
+
+    def _note_changed(self, ptrs: Iterable[int]):
+        """Note rows changed during a background index build, to rewrite in the indexed copy."""
+        if self._index_builder is not None:
+            self._index_builder.changed.update(ptrs)
+
+    def _rewrite_rows(self, ptrs: Iterable[int]):
+        """Bring the rows of ptrs up to date with obj_map, after restoring an older copy."""
+        present = dict()
+        gone = []
+        for ptr in ptrs:
+            obj = self.obj_map.get(ptr)
+            if obj is None:
+                gone.append(ptr)
+            else:
+                present[ptr] = obj
+        self._execute_many(self._delete_sql, zip(gone))
+        rows = self._extractor.rows(present.values())
+        self._execute_many(self._update_sql, map(tuple.__add__, rows, zip(present)))
 
-    def _create_indices(self, index: Optional[List[Union[Tuple, str]]] = None):
+    def _split_present(self, objs: Iterable[Any]) -> Tuple[Dict[int, Any], List[Any]]:
+        """Split objs into a dict of those in the table, {row id: obj}, and a list of the rest."""
+        present = dict()
+        missing = []
+        for obj in objs:
+            ptr = self._ptr(obj)
+            if ptr is not None:
+                present[ptr] = obj
+            else:
+                missing.append(obj)
+        return present, missing
+
+    def _create_indices(self, index: Optional[List[Union[Tuple, str, RTree]]] = None):
         """Create indices for the SQLite table"""
-        cur = self.conn.cursor()
+        for idx in self._index_list(index):
+            self._add_index(idx)
 
-        if index is None:
-            # By default, create a single-column index on each field.
-            # If you really want no indices whatsoever, specify indices=[].
-            index = [get_field_name(f) for f in self.fields]
+        if self._planner is not None:
+            # SQLite's own statistics help it choose between indices, so redo them now, while
+            # we're paying for a bulk load anyway.
+            self._planner.changes = max(self._planner.changes, len(self.obj_map))
+            self._refresh_planner()
 
+    def _index_list(
+        self, index: Optional[List[Union[Tuple, str, RTree]]]
+    ) -> List[Union[Tuple, str, RTree]]:
+        if index is not None:
+            return index
+        # By default, create a single-column index on each field.
+        # If you really want no indices whatsoever, specify indices=[].
+        # Multi-valued and Text fields have their own indices.
+        return [
+            name
+            for name in map(get_field_name, self.fields)
+            if name not in self._multi and name not in self._text
+        ]
+
+    def _start_index_builder(self, index: List[Union[Tuple, str, RTree]]):
+        """
+        Create the RTree indices, and start a thread that creates the others. Until it's done,
+        queries scan the table, and writes wait for it.
+        """
+        indices = dict()
         for idx in index:
-            if isinstance(idx, str):
-                index_name = idx
-                index_cols = idx
+            if isinstance(idx, RTree):
+                self._add_rtree(idx)
+                continue
+            index_name, _ = self._index_def(idx)
+            indices[index_name] = (idx,) if isinstance(idx, str) else tuple(idx)
+        if indices:
+            self._index_builder = IndexBuilder(self.conn, self.table_name, indices)
+            self._index_builder.start()
+
+    def wait_for_indices(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait up to timeout seconds (forever if None) for the indices being built in the
+        background, with background_indices=True. Returns True once they're all in use.
+        """
+        builder = self._index_builder
+        if builder is None:
+            return True
+        builder.join(timeout)
+        if builder.is_alive():
+            return False
+        self._use_built_indices(builder)
+        return True
+
+    def _use_built_indices(self, builder: IndexBuilder):
+        """Swap in the database the builder indexed, now that it's done."""
+        with nullcontext() if self._rwlock is None else self._rwlock.write():
+            if self._index_builder is not builder:
+                return  # another thread got here first
+            self._index_builder = None
+            builder.finish(self.conn)
+            if builder.error is not None:
+                raise builder.error
+            self._rewrite_rows(builder.changed)
+            for index_name, cols in builder.indices.items():
+                self._planner.create_index(index_name, ",".join(cols))
+                self.indices[index_name] = cols
+            self._query_cache.clear()
+
+    @writes
+    def create_index(self, index: Union[Tuple, str, RTree]):
+        """
+        Create an index on a field, a multi-column index on a tuple of fields, or an RTree index,
+        at any time. Does nothing if the index already exists.
+        """
+        self._add_index(index, analyze=True)
+
+    @writes
+    def drop_index(self, index: Union[Tuple, str, RTree]):
+        """Drop an index made by create_index() or the index argument."""
+        if isinstance(index, RTree):
+            if index.name not in self.rtrees:
+                raise IndexNotFoundError(f"No index {index}")
+            table = rtree_table(index.name)
+            self.conn.executescript(f"""
+                DROP TRIGGER {table}_insert;
+                DROP TRIGGER {table}_update;
+                DROP TRIGGER {table}_delete;
+                DROP TABLE {table};
+                """)
+            del self.rtrees[index.name]
+            self._query_cache.clear()
+            return
+        index_name = index if isinstance(index, str) else "_".join(index)
+        if self._columnar is not None:
+            # Columnar indices are per column; drop each one named.
+            cols = [index] if isinstance(index, str) else index
+        elif index_name in self.indices:
+            cols = [index_name]
+        else:
+            cols = []
+        if not cols or any(c not in self.indices for c in cols):
+            raise IndexNotFoundError(f"No index on {index}")
+        for name in cols:
+            del self.indices[name]
+            self._auto_indices.discard(name)
+            if self._columnar is not None:
+                self._columnar.drop_index(name)
             else:
-                index_name = "_".join(idx)
-                index_cols = ",".join(idx)
-            idx_str = (
-                f"CREATE INDEX idx_{index_name} ON {self.table_name}({index_cols})"
-            )
-            cur.execute(idx_str)
-            # Note that the PYOBJ_ID_COL is indexed by virtue of being the primary key.
+                self.conn.execute(f"DROP INDEX idx_{name}")
+                self._planner.drop_index(name)
+                self._query_cache.clear()
+
+    def suggest_indices(self) -> List[Tuple[str, ...]]:
+        """
+        Suggest indices for the queries logged by find(), best first, as tuples of field names.
+        Requires log_queries=True or auto_index=True.
+        """
+        if self._query_log is None:
+            return []
+        return self._query_log.suggest(self.indices.values(), len(self.obj_map))
+
+    def _add_index(
+        self, index: Union[Tuple, str, RTree], analyze: bool = False
+    ) -> List[str]:
+        """
+        Create an index unless it exists, and have SQLite analyze it if analyze is set.
+        Returns the names of the indices created.
+        """
+        if isinstance(index, RTree):
+            return self._add_rtree(index)
+        if self._columnar is not None:
+            # Columnar indices are single-column; multi-column predicates intersect them.
+            created = []
+            for col in [index] if isinstance(index, str) else index:
+                if col not in self.indices:
+                    self._columnar.create_index(col)
+                    self.indices[col] = (col,)
+                    created.append(col)
+            return created
+
+        index_name, index_cols = self._index_def(index)
+        if index_name in self.indices:
+            return []
+        idx_str = f"CREATE INDEX idx_{index_name} ON {self.table_name}({index_cols})"
+        self.conn.execute(idx_str)
+        self._planner.create_index(index_name, index_cols)
+        self._query_cache.clear()  # cached SQL may name the wrong index now
+        self.indices[index_name] = (index,) if isinstance(index, str) else tuple(index)
+        # Note that the PYOBJ_ID_COL is indexed by virtue of being the primary key.
+        if analyze:
+            self.conn.execute(f"ANALYZE idx_{index_name}")
+        return [index_name]
+
+    def _index_def(self, index: Union[Tuple, str]) -> Tuple[str, str]:
+        """The name of a B-tree index, and its columns as SQL."""
+        for col in [index] if isinstance(index, str) else index:
+            if col in self._multi:
+                raise InvalidFields(
+                    f"{col} is multi-valued, so it has its own index and can't be in another"
+                )
+        if isinstance(index, str):
+            return index, index
+        return "_".join(index), ",".join(index)
+
+    def _add_rtree(self, index: RTree) -> List[str]:
+        """
+        Create an R*Tree index unless it exists, with triggers that keep it in step with the table.
+        Rows with no value in one of the fields are left out; no range query can match them.
+        """
+        if self._columnar is not None:
+            raise InvalidEngineError("RTree indices need the sqlite engine")
+        types = {get_field_name(f): t for f, t in self.fields.items()}
+        for col in index.fields:
+            if types.get(col) not in RTREE_TYPES:
+                raise InvalidFields(
+                    f"RTree fields must be numbers, dates or times; got {col}"
+                )
+        if index.name in self.rtrees:
+            return []
+        cols = index.fields
+        table = rtree_table(index.name)
+        points = ", ".join(f"NEW.{c}, NEW.{c}" for c in cols)
+        not_null = " AND ".join(f"NEW.{c} IS NOT NULL" for c in cols)
+        put = (
+            f"INSERT INTO {table} SELECT NEW.{PYOBJ_ID_COL}, {points} WHERE {not_null};"
+        )
+        clear = f"DELETE FROM {table} WHERE id = OLD.{PYOBJ_ID_COL};"
+        # INSERT OR REPLACE doesn't fire delete triggers on the rows it replaces.
+        replace = ""
+        if self.weak and self.key is None:
+            replace = f"DELETE FROM {table} WHERE id = NEW.{PYOBJ_ID_COL};"
+        changed = " OR ".join(f"OLD.{c} IS NOT NEW.{c}" for c in cols)
+        self.conn.executescript(f"""
+            CREATE VIRTUAL TABLE {table} USING rtree(id, {", ".join(column_defs(cols))});
+            INSERT INTO {table} SELECT {PYOBJ_ID_COL}, {points.replace("NEW.", "")}
+            FROM {self.table_name} WHERE {not_null.replace("NEW.", "")};
+            CREATE TRIGGER {table}_insert AFTER INSERT ON {self.table_name}
+            BEGIN {replace} {put} END;
+            CREATE TRIGGER {table}_update AFTER UPDATE OF {", ".join(cols)}
+            ON {self.table_name} WHEN {changed}
+            BEGIN {clear} {put} END;
+            CREATE TRIGGER {table}_delete AFTER DELETE ON {self.table_name}
+            BEGIN {clear} END;
+            """)
+        self.rtrees[index.name] = cols
+        self._query_cache.clear()
+        return [index.name]
+
+    def _log_query(self, where: Union[str, Node], seconds: float, n_found: int):
+        if isinstance(where, Node):
+            self._query_log.record(to_sql(where)[0], seconds, n_found, where)
+        else:
+            self._query_log.record(normalize_where(where), seconds, n_found)
+        if self.auto_index and self._query_log.n_logged % AUTO_INDEX_INTERVAL == 0:
+            if self._index_builder is None:  # rather than wait for it
+                self._auto_index()
+
+    @writes
+    def _auto_index(self):
+        """Create indices for frequent, slow query shapes, and drop ones no longer used."""
+        log = self._query_log
+        for name in list(self._auto_indices):
+            if log.uses(self.indices[name]) < 1:
+                self.drop_index(self.indices[name])
+        suggested = log.suggest(
+            self.indices.values(),
+            len(self.obj_map),
+            min_runs=AUTO_INDEX_MIN_RUNS,
+            min_seconds=AUTO_INDEX_MIN_SECONDS,
+        )
+        for cols in suggested[: MAX_AUTO_INDICES - len(self._auto_indices)]:
+            self._auto_indices.update(self._add_index(cols, analyze=True))
+        log.decay()
 
     def __len__(self) -> int:
         return len(self.obj_map)
 
     def __contains__(self, obj) -> bool:
-        return id(obj) in self.obj_map
+        return self._ptr(obj) is not None
 
     def __iter__(self):
+        if self._rwlock is not None:
+            with self._rwlock.read():
+                return iter(list(self.obj_map.values()))
         return iter(self.obj_map.values())
+
+
+def _to_arrays(columns: Tuple[str, ...], rows: List[Tuple]) -> Dict[str, Any]:
+    """Convert rows of columns to {column: NumPy array}."""
+    import numpy as np  # only needed here, so it isn't a dependency
+
+    if not rows:
+        return {col: np.array([]) for col in columns}
+    return {col: np.array(values) for col, values in zip(columns, zip(*rows))}
@@ -0,0 +1,197 @@
+"""
+Chooses between an index search and a full table scan for each find(), before running it.
+
+SQLite tends to use an index whenever one applies, which is slow for queries that return a
+large fraction of the table. The planner estimates how many rows a query will return by running
+it on a small random sample of the table, then picks the index if the estimate is below
+n_rows ** INDEX_MAX_EXPONENT. After each query, it records the actual row count for that query
+shape, and uses the history to correct future estimates or skip sampling altogether.
+"""
+
+import random
+import sqlite3
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+from litebox.constants import PYOBJ_ID_COL, QUERY_CACHE_SIZE
+
+# Benchmarking says n_objects^(0.6) is a good max for using the index.
+INDEX_MAX_EXPONENT = 0.6
+SAMPLE_SIZE = 2000  # rows in the sample table
+MIN_PLANNED_ROWS = 2 * SAMPLE_SIZE  # tables smaller than this aren't worth planning for
+REFRESH_FRACTION = 0.1  # re-sample after this fraction of rows have changed
+HISTORY_MARGIN = 4  # trust history alone when this many times off the threshold
+RESAMPLE_EVERY = 16  # but check it against the sample every this many runs
+MIN_CORRECTION_HITS = 20  # sample hits needed before learning a correction from them
+SMOOTHING = 0.5  # weight of the newest observation in running averages
+
+
+class QueryStats:
+    """What the planner has seen of one query shape."""
+
+    def __init__(self):
+        self.runs = 0
+        self.index_runs = 0
+        self.avg_rows = None  # running average of actual row counts
+        self.correction = 1.0  # running average of actual / sampled row counts
+        self.last_estimate = None
+        self.last_rows = None
+        self.mispredicted = False  # did the last decision turn out wrong
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "index_runs": self.index_runs,
+            "avg_rows": self.avg_rows,
+            "correction": self.correction,
+            "last_estimate": self.last_estimate,
+            "last_rows": self.last_rows,
+        }
+
+
+class Plan:
+    """The planner's decision for one query, and the numbers behind it."""
+
+    def __init__(
+        self,
+        query_sql: str,
+        stats: Optional[QueryStats],
+        use_index: bool,
+        threshold: float,
+        estimate: Optional[float] = None,
+        source: str = "sample",
+        sampled: Optional[float] = None,
+    ):
+        self.query_sql = query_sql
+        self.stats = stats  # None if the query isn't worth planning for
+        self.use_index = use_index
+        self.threshold = threshold
+        self.estimate = estimate
+        self.source = source  # how the decision was made
+        self.sampled = sampled  # the estimate from the sample alone, before correction
+
+
+class Planner:
+    def __init__(self, conn, table_name: str, column_defs: List[str]):
+        self.conn = conn
+        self.sample_table = f"{table_name}_sample__"
+        self.table_name = table_name
+        # LRU like the query cache; maps {query sql: QueryStats}
+        self.stats = OrderedDict()
+        self.sample_rows = 0
+        self.rows_at_refresh = 0
+        self.changes = 0  # rows added, removed or updated since the last refresh
+        cols = ",".join(column_defs)
+        # The sample table already exists if the LiteBox was loaded from a file.
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {self.sample_table} ({cols})")
+
+    def resume(self, n_rows: int):
+        """Carry on with the sample and statistics saved with the table, which has n_rows rows."""
+        cur = self.conn.execute(f"SELECT count(*) FROM {self.sample_table}")
+        self.sample_rows = cur.fetchone()[0]
+        self.rows_at_refresh = n_rows
+        self.changes = 0
+
+    def create_index(self, index_name: str, index_cols: str):
+        """Mirror an index of the main table, so sample counts are fast too."""
+        self.conn.execute(
+            f"CREATE INDEX idx_{index_name}_sample__ ON {self.sample_table}({index_cols})"
+        )
+
+    def drop_index(self, index_name: str):
+        self.conn.execute(f"DROP INDEX idx_{index_name}_sample__")
+
+    def needs_refresh(self, n_rows: int) -> bool:
+        if n_rows < MIN_PLANNED_ROWS:
+            return False
+        return self.changes > REFRESH_FRACTION * max(
+            self.rows_at_refresh, MIN_PLANNED_ROWS
+        )
+
+    def refresh(self, ptrs: List[int]):
+        """Re-draw the sample from the given rows, and update SQLite's own statistics."""
+        picked = random.sample(ptrs, min(SAMPLE_SIZE, len(ptrs)))
+        cur = self.conn.cursor()
+        cur.execute("BEGIN")
+        cur.execute(f"DELETE FROM {self.sample_table}")
+        cur.executemany(
+            f"INSERT INTO {self.sample_table} SELECT * FROM {self.table_name} "
+            f"WHERE {PYOBJ_ID_COL}=?",
+            ((p,) for p in picked),
+        )
+        cur.execute("COMMIT")
+        cur.execute("ANALYZE")
+        self.sample_rows = len(picked)
+        self.rows_at_refresh = len(ptrs)
+        self.changes = 0
+        # The data changed, so estimates learned from the old sample no longer apply.
+        for stats in self.stats.values():
+            stats.correction = 1.0
+
+    def plan(
+        self,
+        query_sql: str,
+        sample_sql: str,
+        params: Optional[Union[Sequence, Dict[str, Any]]],
+        n_rows: int,
+        has_index: bool,
+        conn: Optional[sqlite3.Connection] = None,
+    ) -> Plan:
+        """
+        Decide whether to run query_sql with an index. sample_sql counts its sample hits, and
+        runs on conn if given.
+        """
+        threshold = n_rows**INDEX_MAX_EXPONENT
+        if not has_index:
+            return Plan(query_sql, None, False, threshold, source="no index")
+        if n_rows < MIN_PLANNED_ROWS or not self.sample_rows:
+            return Plan(query_sql, None, True, threshold, source="small table")
+
+        stats = self.stats.get(query_sql)
+        if stats is None:
+            stats = QueryStats()
+
+        # If this shape reliably lands far from the threshold, skip the sample.
+        if (
+            stats.avg_rows is not None
+            and not stats.mispredicted
+            and stats.runs % RESAMPLE_EVERY != 0
+            and not threshold / HISTORY_MARGIN
+            <= stats.avg_rows
+            <= threshold * HISTORY_MARGIN
+        ):
+            use_index = stats.avg_rows < threshold
+            return Plan(
+                query_sql, stats, use_index, threshold, stats.avg_rows, "history"
+            )
+
+        hits = (conn or self.conn).execute(sample_sql, params or ()).fetchone()[0]
+        sampled = hits / self.sample_rows * n_rows
+        estimate = sampled * stats.correction
+        use_index = estimate < threshold
+        if hits < MIN_CORRECTION_HITS:
+            sampled = None  # too few hits to learn from
+        return Plan(query_sql, stats, use_index, threshold, estimate, "sample", sampled)
+
+    def record(self, plan: Plan, n_found: int):
+        """Learn from the actual number of rows a planned query returned."""
+        if plan.stats is None:
+            return
+        # Re-insert to mark as most recently used. Unlike move_to_end, this is safe when
+        # another thread evicts the entry at the same time.
+        stats = self.stats.pop(plan.query_sql, None) or plan.stats
+        self.stats[plan.query_sql] = stats
+        if len(self.stats) > QUERY_CACHE_SIZE:
+            self.stats.popitem(last=False)
+        stats.runs += 1
+        stats.index_runs += plan.use_index
+        stats.last_estimate = plan.estimate
+        stats.last_rows = n_found
+        stats.mispredicted = plan.use_index != (n_found < plan.threshold)
+        if stats.avg_rows is None:
+            stats.avg_rows = float(n_found)
+        else:
+            stats.avg_rows += SMOOTHING * (n_found - stats.avg_rows)
+        if plan.sampled is not None:
+            ratio = n_found / plan.sampled
+            stats.correction += SMOOTHING * (ratio - stats.correction)
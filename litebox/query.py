@@ -0,0 +1,184 @@
+"""
+Query builder: write find() queries as Python expressions instead of SQL strings.
+
+    from litebox import Q
+
+    lb.find((Q.brightness >= 9.0) & (Q.name == 'Tiger'))
+    lb.find(Q.width.between(100, 200) | Q.name.isin(['Luna', 'Elvis']))
+    lb.find(~Q.name.isin(names))
+    lb.find(Q.tags.contains_any(['cat', 'dog']))    # for multi-valued fields, like List[str]
+    lb.find(Q.description.match('quick fox'))       # for Text fields
+
+Expressions build the same parse trees that where.py makes from strings. For SQLite they compile
+to SQL with a ? placeholder for every value, and with AND / OR terms in a canonical order, so
+equivalent queries share one cached statement regardless of their values or the order they were
+written in.
+
+Python's & and | bind tighter than comparisons, so each comparison needs its own parentheses:
+(Q.a > 1) & (Q.b < 2). Use ~ for NOT; Python's and / or / not don't work on expressions.
+"""
+
+import re
+from typing import Any, Iterable, List, Tuple
+
+from litebox.constants import FTS_TABLE_PREFIX, PYOBJ_ID_COL, VALUES_TABLE_PREFIX
+from litebox.where import (
+    And,
+    Between,
+    Compare,
+    Contains,
+    In,
+    IsNull,
+    Match,
+    Node,
+    Or,
+)
+
+ISIN_MAX_PARAMS = 32  # isin() lists longer than this are read from a temp table
+IN_TABLE_PREFIX = "in_values"  # temp tables are named in_values0__, in_values1__, ...
+IN_TABLE_REF = f"temp.{IN_TABLE_PREFIX}__"
+IN_TABLE_REF_RE = re.compile(re.escape(IN_TABLE_REF))
+
+
+class Field:
+    """A field in a query expression. Comparing it to a value makes a query node."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __eq__(self, value: Any) -> Node:
+        if value is None:
+            return IsNull(self.name)
+        return Compare(self.name, "=", value)
+
+    def __ne__(self, value: Any) -> Node:
+        if value is None:
+            return IsNull(self.name, negated=True)
+        return Compare(self.name, "!=", value)
+
+    def __lt__(self, value: Any) -> Node:
+        return Compare(self.name, "<", value)
+
+    def __le__(self, value: Any) -> Node:
+        return Compare(self.name, "<=", value)
+
+    def __gt__(self, value: Any) -> Node:
+        return Compare(self.name, ">", value)
+
+    def __ge__(self, value: Any) -> Node:
+        return Compare(self.name, ">=", value)
+
+    def between(self, lo: Any, hi: Any) -> Node:
+        return Between(self.name, lo, hi)
+
+    def isin(self, values: Iterable[Any]) -> Node:
+        return In(self.name, list(values))
+
+    def notin(self, values: Iterable[Any]) -> Node:
+        return In(self.name, list(values), negated=True)
+
+    def is_null(self) -> Node:
+        return IsNull(self.name)
+
+    def not_null(self) -> Node:
+        return IsNull(self.name, negated=True)
+
+    # For multi-valued fields.
+    def contains(self, value: Any) -> Node:
+        return Contains(self.name, [value])
+
+    def contains_any(self, values: Iterable[Any]) -> Node:
+        return Contains(self.name, list(values))
+
+    def contains_all(self, values: Iterable[Any]) -> Node:
+        return Contains(self.name, list(values), match_all=True)
+
+    # For Text fields.
+    def match(self, query: str) -> Node:
+        return Match(self.name, query)
+
+    __hash__ = None
+
+
+class _QueryBuilder:
+    """Makes Fields: Q.size is the field 'size'. Q('size') works too."""
+
+    def __getattr__(self, name: str) -> Field:
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return Field(name)
+
+    def __call__(self, name: str) -> Field:
+        return Field(name)
+
+
+Q = _QueryBuilder()
+
+
+def to_sql(node: Node) -> Tuple[str, List[Any], List[List[Any]]]:
+    """
+    Compile a query node to (sql, args, in_lists). Long isin() lists aren't in args; the SQL reads
+    each one from the temp table in_values<i>__, where i is its position in in_lists.
+    """
+    sql, args, in_lists = _compile(node)
+    if in_lists:
+        counter = iter(range(len(in_lists)))
+        sql = IN_TABLE_REF_RE.sub(
+            lambda m: f"temp.{IN_TABLE_PREFIX}{next(counter)}__", sql
+        )
+    return sql, args, in_lists
+
+
+def _compile(node: Node) -> Tuple[str, List[Any], List[List[Any]]]:
+    if isinstance(node, (And, Or)):
+        parts = sorted((_compile(c) for c in node.children), key=lambda p: p[0])
+        joiner = " AND " if isinstance(node, And) else " OR "
+        sql = joiner.join(f"({p[0]})" for p in parts)
+        args = [a for p in parts for a in p[1]]
+        in_lists = [v for p in parts for v in p[2]]
+        return sql, args, in_lists
+    if isinstance(node, IsNull):
+        return f"{node.field} IS {'NOT ' if node.negated else ''}NULL", [], []
+    if isinstance(node, Between):
+        return f"{node.field} BETWEEN ? AND ?", [node.lo, node.hi], []
+    if isinstance(node, In):
+        op = "NOT IN" if node.negated else "IN"
+        if len(node.values) > ISIN_MAX_PARAMS:
+            return (
+                f"{node.field} {op} (SELECT v FROM {IN_TABLE_REF})",
+                [],
+                [node.values],
+            )
+        marks = ",".join("?" * len(node.values))
+        return f"{node.field} {op} ({marks})", list(node.values), []
+    if isinstance(node, Contains):
+        return _compile_contains(node)
+    if isinstance(node, Match):
+        table = f"{FTS_TABLE_PREFIX}{node.field}__"
+        op = "NOT IN" if node.negated else "IN"
+        sql = f"SELECT rowid FROM {table} WHERE {table} MATCH ?"
+        return f"{PYOBJ_ID_COL} {op} ({sql})", [node.query], []
+    return f"{node.field} {node.op} ?", [node.value], []
+
+
+def _compile_contains(node: Contains) -> Tuple[str, List[Any], List[List[Any]]]:
+    """
+    Find the objects holding the values in the field's table of (row id, value) pairs, which is
+    indexed by value, and match the main table's row ids against them.
+    """
+    values = list(dict.fromkeys(node.values))  # distinct, so they can be counted
+    op = "NOT IN" if node.negated else "IN"
+    if node.match_all and not values:
+        # Every object that has the field holds all of no values; those with None don't.
+        return f"{node.field} IS {'' if node.negated else 'NOT '}NULL", [], []
+    table = f"{VALUES_TABLE_PREFIX}{node.field}__"
+    args, in_lists = values, []
+    if len(values) > ISIN_MAX_PARAMS:
+        value_sql = f"SELECT v FROM {IN_TABLE_REF}"
+        args, in_lists = [], [values]
+    else:
+        value_sql = ",".join("?" * len(values))
+    sql = f"SELECT {PYOBJ_ID_COL} FROM {table} WHERE v IN ({value_sql})"
+    if node.match_all and len(values) > 1:
+        sql += f" GROUP BY {PYOBJ_ID_COL} HAVING count(*) = {len(values)}"
+    return f"{PYOBJ_ID_COL} {op} ({sql})", args, in_lists
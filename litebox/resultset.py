@@ -0,0 +1,61 @@
+"""
+ResultSet: the matches of a find(), held as a set of row ids instead of a list of objects.
+
+ResultSets from the same LiteBox combine with &, | and - without touching the objects or the
+table. They can restrict another query with find(where, within=result_set), and are turned into
+objects only when iterated.
+
+The row ids are kept in a frozenset rather than a sorted array. Without a key, row ids are
+object addresses in no useful order, and sorting them costs more than the set operations do.
+"""
+
+from typing import Any, Callable, Iterable, Iterator, List
+
+from litebox.exceptions import InvalidQueryError
+
+
+class ResultSet:
+    """
+    An unordered set of objects in a LiteBox, stored as their row ids. Objects removed from the
+    LiteBox after the ResultSet was made are skipped when iterating.
+    """
+
+    def __init__(self, box: Any, ids: Iterable[int]):
+        self.box = box
+        self.ids = frozenset(ids)
+
+    def __and__(self, other: "ResultSet") -> "ResultSet":
+        return self._combine(other, frozenset.intersection)
+
+    def __or__(self, other: "ResultSet") -> "ResultSet":
+        return self._combine(other, frozenset.union)
+
+    def __sub__(self, other: "ResultSet") -> "ResultSet":
+        return self._combine(other, frozenset.difference)
+
+    def _combine(self, other: "ResultSet", op: Callable) -> "ResultSet":
+        if not isinstance(other, ResultSet):
+            return NotImplemented
+        if other.box is not self.box:
+            raise InvalidQueryError("Can't combine ResultSets from different LiteBoxes")
+        return ResultSet(self.box, op(self.ids, other.ids))
+
+    def objs(self) -> List[Any]:
+        """The objects, in no particular order."""
+        return list(self)
+
+    def __iter__(self) -> Iterator[Any]:
+        get = self.box.obj_map.get
+        for ptr in self.ids:
+            obj = get(ptr)
+            if obj is not None:
+                yield obj
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, obj: Any) -> bool:
+        return self.box._ptr(obj) in self.ids
+
+    def __repr__(self) -> str:
+        return f"ResultSet({len(self.ids)} ids)"
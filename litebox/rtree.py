@@ -0,0 +1,105 @@
+"""
+R*Tree indices: SQLite's spatial index, over several numeric fields at once.
+
+A multi-column B-tree index on (width, height) narrows a query by its width range, then reads
+every entry in that range to check the heights. An R*Tree narrows by both ranges at once, so
+queries over boxes like width in [a, b] and height in [c, d] read far fewer rows. It also
+supports nearest-neighbor searches.
+
+Each object is stored as a point: a box whose min and max are the object's values. SQLite keeps
+the coordinates as 32-bit floats, rounded outward, so a search of the R*Tree finds a few objects
+too many but never too few; the query's own where clause then removes the extras.
+"""
+
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Collection, Dict, List, Optional, Tuple
+
+from litebox.exceptions import InvalidFields
+from litebox.where import And, Between, Compare, Node
+
+MAX_DIMENSIONS = 5  # SQLite's limit on R*Tree dimensions
+RTREE_TABLE_PREFIX = "rtree_"  # rtree_<fields>__ is the R*Tree virtual table
+# find_nearest() widens its search box this many times, by this factor, before scanning.
+NEAREST_MAX_ROUNDS = 4
+NEAREST_GROWTH = 4
+# Field types stored as numbers.
+RTREE_TYPES = (int, float, bool, datetime, date, Decimal)
+
+
+class RTree:
+    """
+    An R*Tree index on 1 to 5 numeric fields, for LiteBox(index=[RTree('x', 'y')]) or
+    create_index(RTree('x', 'y')).
+    """
+
+    def __init__(self, *fields: str):
+        if not 1 <= len(fields) <= MAX_DIMENSIONS:
+            raise InvalidFields(
+                f"An RTree needs 1 to {MAX_DIMENSIONS} fields, got {len(fields)}"
+            )
+        self.fields = tuple(fields)
+
+    @property
+    def name(self) -> str:
+        return "_".join(self.fields)
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, RTree) and other.fields == self.fields
+
+    def __hash__(self) -> int:
+        return hash((RTree, self.fields))
+
+    def __repr__(self) -> str:
+        return f"RTree{self.fields!r}"
+
+
+def table_name(name: str) -> str:
+    return f"{RTREE_TABLE_PREFIX}{name}__"
+
+
+def column_defs(fields: Collection[str]) -> List[str]:
+    """The R*Tree's columns after its id: a min and a max for each field."""
+    return [c for f in fields for c in (f"min_{f}", f"max_{f}")]
+
+
+def bounds(node: Node) -> Dict[str, List[Tuple[str, Any]]]:
+    """
+    The ranges that node's top-level AND terms put on fields, as {field: [(column, value)]}.
+    A lower bound v on field f becomes ("max_f >=", v): the point's box must reach up to v.
+    Values may be Params, to be bound at query time.
+    """
+    out = dict()
+    for child in node.children if isinstance(node, And) else [node]:
+        if isinstance(child, Between):
+            lo, hi = child.lo, child.hi
+        elif isinstance(child, Compare) and child.op in ("<", "<=", ">", ">=", "="):
+            lo = child.value if child.op in (">", ">=", "=") else None
+            hi = child.value if child.op in ("<", "<=", "=") else None
+        else:
+            continue
+        terms = out.setdefault(child.field, [])
+        if lo is not None:
+            terms.append((f"max_{child.field} >=", lo))
+        if hi is not None:
+            terms.append((f"min_{child.field} <=", hi))
+    return out
+
+
+def best_rtree(
+    rtrees: Dict[str, Tuple[str, ...]], node: Node
+) -> Optional[Tuple[str, List[Tuple[str, Any]]]]:
+    """
+    Pick the R*Tree that bounds the most fields of node, if it bounds at least two, or all of
+    its own. Returns (R*Tree name, [(column, value)] to search it by), or None.
+    """
+    ranges = bounds(node)
+    best = None
+    best_n = 0
+    for name, fields in rtrees.items():
+        n = sum(f in ranges for f in fields)
+        if n > best_n and (n >= 2 or n == len(fields)):
+            best, best_n = name, n
+    if best is None:
+        return None
+    return best, [t for f in rtrees[best] for t in ranges.get(f, [])]
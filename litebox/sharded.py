@@ -0,0 +1,321 @@
+"""
+ShardedLiteBox: a LiteBox split over several independent SQLite databases.
+
+Each shard is a concurrent LiteBox with its own in-memory database, so shards are built and
+queried in parallel threads; SQLite releases the GIL while it works.
+
+Objects are assigned to shards by hashing their id, by hashing a field, or by ranges of a field.
+With range sharding (and with hash sharding, for equality lookups), queries constrained on the
+shard field only visit the shards that could hold matches.
+"""
+
+import bisect
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Union
+
+from litebox.constants import SQLITE_ENGINE
+from litebox.exceptions import InvalidFields, InvalidQueryError, NotInIndexError
+from litebox.main import LiteBox
+from litebox.utils import get_field, get_field_name
+from litebox.where import (
+    And,
+    Between,
+    Compare,
+    In,
+    IsNull,
+    Node,
+    Or,
+    parse_order_by,
+    parse_where,
+    resolve,
+)
+
+NUMERIC_TYPES = (int, float, bool)
+
+
+class ShardedLiteBox:
+    def __init__(
+        self,
+        objs: Optional[Iterable[Any]] = None,
+        on: Dict[Union[str, Callable], type] = None,
+        index: Optional[List[Union[tuple, str]]] = None,
+        n_shards: Optional[int] = None,
+        shard_on: Optional[Union[str, Callable]] = None,
+        boundaries: Optional[Sequence[Any]] = None,
+        engine: str = SQLITE_ENGINE,
+    ):
+        """
+        Objects are hashed to one of n_shards shards (default: one per CPU), by shard_on if given,
+        else by identity. Passing sorted boundaries instead makes range shards on shard_on:
+        shard i holds values from boundaries[i-1] up to but not including boundaries[i], so there
+        are len(boundaries) + 1 shards. Objects with a null shard_on value go in shard 0.
+        """
+        if boundaries is not None:
+            if shard_on is None:
+                raise InvalidFields("Range sharding needs a shard_on field.")
+            boundaries = list(boundaries)
+            if boundaries != sorted(boundaries):
+                raise InvalidFields("Shard boundaries must be sorted.")
+            n_shards = len(boundaries) + 1
+        elif n_shards is None:
+            n_shards = os.cpu_count() or 1
+        if n_shards < 1:
+            raise InvalidFields("A ShardedLiteBox needs at least one shard.")
+        self.fields = on
+        self.n_shards = n_shards
+        self.boundaries = boundaries
+        self._shard_field = None
+        self._shard_field_name = None
+        self._shard_type = None
+        if shard_on is not None:
+            for field, pytype in (on or {}).items():
+                if shard_on == field or shard_on == get_field_name(field):
+                    self._shard_field = field
+                    self._shard_field_name = get_field_name(field)
+                    self._shard_type = pytype
+            if self._shard_field is None:
+                raise InvalidFields(f"shard_on field {shard_on!r} is not in 'on'.")
+        self._executor = ThreadPoolExecutor(
+            max_workers=n_shards, thread_name_prefix="litebox-shard"
+        )
+
+        parts = self._partition(objs or [])
+        self.shards = self._map(
+            lambda part: LiteBox(part, on, index, engine, concurrent=True), parts
+        )
+
+    def find(
+        self,
+        where: Optional[Union[str, Node]] = None,
+        params: Optional[Union[Sequence, Dict[str, Any]]] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        order_by: Optional[str] = None,
+    ) -> List[Any]:
+        """
+        Run find() on every shard that could have matches, at the same time, and merge the
+        results. With order_by, the merged results are sorted; limit and offset apply to them.
+        """
+        shards = self._prune(where, params)
+        per_shard = None
+        if limit is not None:
+            per_shard = limit + (offset or 0)
+        found = self._map(
+            lambda s: s.find(where, params, per_shard, None, order_by), shards
+        )
+        objs = [obj for objs in found for obj in objs]
+        if order_by is not None and len(shards) > 1:
+            self._sort(objs, order_by)
+        if offset:
+            objs = objs[offset:]
+        if limit is not None:
+            objs = objs[:limit]
+        return objs
+
+    def count(
+        self,
+        where: Optional[Union[str, Node]] = None,
+        params: Optional[Union[Sequence, Dict[str, Any]]] = None,
+    ) -> int:
+        """Count the objects matching where, over all shards in parallel."""
+        shards = self._prune(where, params)
+        return sum(self._map(lambda s: s.count(where, params), shards))
+
+    def exists(
+        self,
+        where: Optional[Union[str, Node]] = None,
+        params: Optional[Union[Sequence, Dict[str, Any]]] = None,
+    ) -> bool:
+        shards = self._prune(where, params)
+        return any(self._map(lambda s: s.exists(where, params), shards))
+
+    def add(self, obj: Any):
+        if obj not in self:
+            self.shards[self._shard_for(obj)].add(obj)
+
+    def add_many(self, objs: Iterable[Any]):
+        parts = self._partition(obj for obj in objs if obj not in self)
+        self._map(lambda sp: sp[0].add_many(sp[1]), list(zip(self.shards, parts)))
+
+    def update(self, obj: Any):
+        """Update an object's values, moving it to a different shard if need be."""
+        self.update_many([obj])
+
+    def update_many(self, objs: Iterable[Any]) -> List[Any]:
+        """Update many objects. Returns a list of the objects that weren't in the box."""
+        updates = [[] for _ in self.shards]
+        moves = []
+        missing = []
+        for obj in objs:
+            shard = self._shard_of(obj)
+            if shard is None:
+                missing.append(obj)
+                continue
+            target = self._shard_for(obj)
+            if target == shard:
+                updates[shard].append(obj)
+            else:
+                moves.append((obj, shard, target))
+        for obj, shard, target in moves:
+            self.shards[shard].remove(obj)
+            self.shards[target].add(obj)
+        self._map(lambda su: su[0].update_many(su[1]), list(zip(self.shards, updates)))
+        return missing
+
+    def remove(self, obj: Any):
+        shard = self._shard_of(obj)
+        if shard is None:
+            raise NotInIndexError(f"Could not find object with id: {id(obj)}")
+        self.shards[shard].remove(obj)
+
+    def remove_many(self, objs: Iterable[Any]) -> List[Any]:
+        """Remove many objects. Returns a list of the objects that weren't in the box."""
+        removals = [[] for _ in self.shards]
+        missing = []
+        for obj in objs:
+            shard = self._shard_of(obj)
+            if shard is None:
+                missing.append(obj)
+            else:
+                removals[shard].append(obj)
+        self._map(lambda sr: sr[0].remove_many(sr[1]), list(zip(self.shards, removals)))
+        return missing
+
+    def create_index(self, index: Union[tuple, str]):
+        self._map(lambda s: s.create_index(index), self.shards)
+
+    def drop_index(self, index: Union[tuple, str]):
+        self._map(lambda s: s.drop_index(index), self.shards)
+
+    def close(self):
+        """Stop the shard worker threads."""
+        self._executor.shutdown(wait=True)
+
+    def _map(self, fn: Callable, items: List[Any]) -> List[Any]:
+        """Apply fn to each item, in parallel when there's more than one."""
+        if len(items) == 1:
+            return [fn(items[0])]
+        return list(self._executor.map(fn, items))
+
+    def _shard_of(self, obj: Any) -> Optional[int]:
+        """The shard holding obj, or None."""
+        for i, shard in enumerate(self.shards):
+            if obj in shard:
+                return i
+        return None
+
+    def _shard_for(self, obj: Any) -> int:
+        """The shard that obj belongs in, given its current values."""
+        if self._shard_field is None:
+            return (id(obj) >> 4) % self.n_shards  # ids are multiples of 16
+        return self._shard_for_value(get_field(obj, self._shard_field))
+
+    def _shard_for_value(self, value: Any) -> int:
+        if value is None:
+            return 0
+        if self.boundaries is not None:
+            return bisect.bisect_right(self.boundaries, value)
+        return hash(value) % self.n_shards
+
+    def _partition(self, objs: Iterable[Any]) -> List[List[Any]]:
+        parts = [[] for _ in range(self.n_shards)]
+        for obj in objs:
+            parts[self._shard_for(obj)].append(obj)
+        return parts
+
+    def _sort(self, objs: List[Any], order_by: str):
+        """Sort objs in place the way SQLite orders rows: nulls first, ascending."""
+        by_name = {get_field_name(f): f for f in self.fields}
+        # Stable sorts, from the last key to the first.
+        for name, desc in reversed(parse_order_by(order_by, by_name)):
+            field = by_name[name]
+            objs.sort(key=lambda obj: _null_first(get_field(obj, field)), reverse=desc)
+
+    def _prune(
+        self,
+        where: Optional[Union[str, Node]],
+        params: Optional[Union[Sequence, Dict[str, Any]]],
+    ) -> List[LiteBox]:
+        """The shards that could hold objects matching where."""
+        if not where or self._shard_field is None:
+            return self.shards
+        node = where
+        if isinstance(where, str):
+            try:
+                node = parse_where(where, {get_field_name(f) for f in self.fields})
+            except InvalidQueryError:
+                return self.shards  # let the shards run it, or report the error
+        try:
+            keep = self._matching_shards(node, params)
+        except (TypeError, InvalidQueryError):
+            return self.shards  # values that can't be placed, or missing params
+        return [self.shards[i] for i in sorted(keep)]
+
+    def _matching_shards(self, node: Node, params) -> Set[int]:
+        everything = set(range(self.n_shards))
+        if isinstance(node, And):
+            keep = everything
+            for child in node.children:
+                keep = keep & self._matching_shards(child, params)
+            return keep
+        if isinstance(node, Or):
+            keep = set()
+            for child in node.children:
+                keep |= self._matching_shards(child, params)
+            return keep
+        if getattr(node, "field", None) != self._shard_field_name:
+            return everything
+        if isinstance(node, IsNull):
+            return everything if node.negated else {0}
+        if isinstance(node, In):
+            if node.negated:
+                return everything
+            return {self._place(v) for v in resolve(list(node.values), params)}
+        if isinstance(node, Between):
+            return self._range(">=", resolve(node.lo, params)) & self._range(
+                "<=", resolve(node.hi, params)
+            )
+        if isinstance(node, Compare):
+            if node.op == "=":
+                return {self._place(resolve(node.value, params))}
+            if node.op != "!=" and self.boundaries is not None:
+                return self._range(node.op, resolve(node.value, params))
+        return everything
+
+    def _place(self, value: Any) -> int:
+        """The shard where a stored value would be. Raises TypeError if it can't be known."""
+        if value is None:
+            return 0
+        numeric = isinstance(value, NUMERIC_TYPES)
+        if numeric != (self._shard_type in NUMERIC_TYPES):
+            # SQLite converts values between numbers and text in comparisons, so the value
+            # might match rows in any shard.
+            raise TypeError
+        return self._shard_for_value(value)
+
+    def _range(self, op: str, value: Any) -> Set[int]:
+        """Range shards that may hold values satisfying (field op value)."""
+        if value is None:
+            return set()  # comparisons with null never match
+        self._place(value)
+        b = self.boundaries
+        if op == "<":
+            return set(range(bisect.bisect_left(b, value) + 1))
+        if op == "<=":
+            return set(range(bisect.bisect_right(b, value) + 1))
+        return set(range(bisect.bisect_right(b, value), self.n_shards))
+
+    def __len__(self) -> int:
+        return sum(len(s) for s in self.shards)
+
+    def __contains__(self, obj: Any) -> bool:
+        return any(obj in s for s in self.shards)
+
+    def __iter__(self):
+        for shard in self.shards:
+            yield from shard
+
+
+def _null_first(value: Any) -> tuple:
+    return (value is not None, value)
@@ -0,0 +1,86 @@
+"""
+Saving and loading LiteBox tables, for LiteBox.save() and LiteBox.load().
+
+A snapshot is a SQLite database file holding the table, its indices, the planner's sample and
+statistics, and a small table of metadata describing the LiteBox.
+"""
+
+import json
+import os
+import sqlite3
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List
+from urllib.request import pathname2url
+
+from litebox.exceptions import InvalidFields, InvalidSnapshotError
+from litebox.fieldtypes import is_enum
+from litebox.utils import Text, multi_value_type
+
+META_TABLE = "litebox_meta__"
+SNAPSHOT_VERSION = 1
+# Map as much of the file as SQLite allows; it caps this at its compile-time maximum.
+MMAP_SIZE = 2**40
+TYPE_NAMES = {
+    int: "int",
+    float: "float",
+    bool: "bool",
+    str: "str",
+    Text: "text",
+    bytes: "bytes",
+    datetime: "datetime",
+    date: "date",
+    Decimal: "decimal",
+}
+TYPES_BY_NAME = {name: t for t, name in TYPE_NAMES.items()}
+
+
+def type_name(pytype: Any) -> str:
+    """
+    Name a field type for the metadata, like "int", or "list[str]" for multi-valued fields.
+    Enums are named with their members, like "enum:Color(RED,GREEN)", since rows store positions.
+    """
+    value_type = multi_value_type(pytype)
+    if value_type is not None:
+        # Lists and sets of values are stored alike.
+        return f"list[{TYPE_NAMES[value_type]}]"
+    if is_enum(pytype):
+        return f"enum:{pytype.__name__}({','.join(m.name for m in pytype)})"
+    return TYPE_NAMES[pytype]
+
+
+def type_from_name(name: str) -> Any:
+    if name.startswith("list["):
+        return List[TYPES_BY_NAME[name[5:-1]]]
+    if name.startswith("enum:"):
+        raise InvalidFields(
+            f"Enum field types can't be read from a file; pass on= ({name})"
+        )
+    return TYPES_BY_NAME[name]
+
+
+def write_meta(conn: sqlite3.Connection, meta: Dict[str, Any]):
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {META_TABLE} (meta TEXT)")
+    conn.execute(f"DELETE FROM {META_TABLE}")
+    conn.execute(f"INSERT INTO {META_TABLE} VALUES (?)", (json.dumps(meta),))
+    conn.commit()
+
+
+def read_meta(path: str) -> Dict[str, Any]:
+    uri = "file:" + pathname2url(os.path.abspath(path)) + "?mode=ro"
+    try:
+        conn = sqlite3.connect(uri, uri=True)
+        try:
+            row = conn.execute(f"SELECT meta FROM {META_TABLE}").fetchone()
+        finally:
+            conn.close()
+    except sqlite3.DatabaseError:
+        row = None
+    if row is None:
+        raise InvalidSnapshotError(f"{path} is not a saved LiteBox")
+    meta = json.loads(row[0])
+    if meta.get("version") != SNAPSHOT_VERSION:
+        raise InvalidSnapshotError(
+            f"{path} was saved by an incompatible version of LiteBox"
+        )
+    return meta
@@ -0,0 +1,85 @@
+"""
+Opt-in change tracking, for use with LiteBox(track=True).
+
+Objects of a tracked class tell the LiteBoxes holding them when one of their attributes is set.
+Those LiteBoxes re-index the changed objects in one batch, just before their next query.
+
+Make a class tracked by inheriting from Tracked, or by decorating it with @tracked:
+
+    @tracked
+    @dataclass
+    class Photo:
+        width: int
+        height: int
+"""
+
+import weakref
+from typing import Any
+
+WATCHERS_ATTR = "_litebox_watchers__"  # stored in each tracked object's __dict__
+TRACKED_ATTR = "_litebox_tracked__"  # class attribute marking tracked classes
+
+
+def is_tracked(obj: Any) -> bool:
+    return getattr(type(obj), TRACKED_ATTR, False)
+
+
+def watch(obj: Any, box: Any):
+    """Register box to be told about changes to obj."""
+    try:
+        d = vars(obj)
+    except TypeError:
+        raise TypeError(
+            f"Cannot track changes to {type(obj).__name__} objects, they have no __dict__"
+        )
+    watchers = d.get(WATCHERS_ATTR)
+    if watchers is None:
+        watchers = d[WATCHERS_ATTR] = weakref.WeakSet()
+    watchers.add(box)
+
+
+def unwatch(obj: Any, box: Any):
+    watchers = getattr(obj, "__dict__", {}).get(WATCHERS_ATTR)
+    if watchers is not None:
+        watchers.discard(box)
+
+
+def _notify(obj: Any, name: str):
+    watchers = obj.__dict__.get(WATCHERS_ATTR)
+    if watchers:
+        for box in list(watchers):
+            box._mark_dirty(obj, name)
+
+
+def _getstate_without_watchers(self):
+    # The watchers are boxes in this process; they don't belong in a pickle or a copy.
+    state = self.__dict__.copy()
+    state.pop(WATCHERS_ATTR, None)
+    return state
+
+
+class Tracked:
+    """Mixin that makes a class tracked."""
+
+    _litebox_tracked__ = True
+
+    def __setattr__(self, name: str, value: Any):
+        super().__setattr__(name, value)
+        _notify(self, name)
+
+    __getstate__ = _getstate_without_watchers
+
+
+def tracked(cls: type) -> type:
+    """Class decorator that makes a class tracked. Works with dataclasses and regular classes."""
+    original_setattr = cls.__setattr__
+
+    def __setattr__(self, name, value):
+        original_setattr(self, name, value)
+        _notify(self, name)
+
+    cls.__setattr__ = __setattr__
+    if "__getstate__" not in cls.__dict__:
+        cls.__getstate__ = _getstate_without_watchers
+    setattr(cls, TRACKED_ATTR, True)
+    return cls
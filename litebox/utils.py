@@ -1,5 +1,19 @@
-from typing import Union, Dict, Callable
-from litebox.exceptions import InvalidFields
+import json
+import re
+from operator import attrgetter, itemgetter
+from typing import Union, Dict, Callable, Sequence, Iterable, Tuple, Any, List, Optional
+from litebox.exceptions import InvalidFields, FieldsTypeError
+from litebox.fieldtypes import SQLITE_TYPES, is_enum
+
+SCALAR_TYPES = (int, float, bool, str)
+MULTI_VALUE_ORIGINS = (list, set, frozenset)
+
+
+class Text(str):
+    """
+    Field type for text searched by its words, like {'description': Text}. Values are stored as
+    str, and also in a full-text index that Q.description.match() and find(match=...) search.
+    """
 
 
 def get_field_name(field: Union[str, Callable]):
@@ -20,16 +34,156 @@ def get_field(obj, field):
     return val
 
 
+def compile_getter(fields: List[Union[str, Callable]], use_items: bool) -> Callable:
+    """
+    Make a function obj -> tuple of field values. Reads str fields with itemgetter if use_items,
+    else attrgetter. Unlike get_field, the result raises if a field is missing.
+    """
+    make = itemgetter if use_items else attrgetter
+    if all(isinstance(f, str) for f in fields):
+        getter = make(*fields)
+        if len(fields) == 1:
+            return lambda obj: (getter(obj),)
+        return getter
+    getters = [f if callable(f) else make(f) for f in fields]
+    return lambda obj: tuple(g(obj) for g in getters)
+
+
+class RowExtractor:
+    """
+    Reads the values of a fixed list of fields from objects. Compiled once per LiteBox, so
+    the per-object work is a single attrgetter or itemgetter call in the common case.
+    encoders optionally maps field positions to functions that convert those fields' values
+    for storage.
+    """
+
+    def __init__(
+        self,
+        fields: Iterable[Union[str, Callable]],
+        encoders: Optional[Dict[int, Callable]] = None,
+    ):
+        self.fields = list(fields)
+        self.encoders = encoders or {}
+        self.attr_getter = compile_getter(self.fields, False)
+        self.item_getter = compile_getter(self.fields, True)
+
+    def _getter(self, obj: Any) -> Callable:
+        # dict subclasses go through get_field, so e.g. a defaultdict doesn't grow keys on read
+        return self.item_getter if type(obj) is dict else self.attr_getter
+
+    def row(self, obj: Any) -> Tuple:
+        try:
+            row = self._getter(obj)(obj)
+        except (AttributeError, KeyError, TypeError):
+            # Missing attributes get None, same as get_field
+            row = tuple(get_field(obj, f) for f in self.fields)
+        if self.encoders:
+            return self._encode([row])[0]
+        return row
+
+    def values(self, objs: Iterable[Any]) -> List[Any]:
+        """Get the value of the first field of each obj, as a plain list."""
+        objs = list(objs)
+        if not objs:
+            return []
+        field = self.fields[0]
+        if isinstance(field, str):
+            getter = itemgetter(field) if type(objs[0]) is dict else attrgetter(field)
+            try:
+                return list(map(getter, objs))
+            except (AttributeError, KeyError, TypeError):
+                pass
+        return [get_field(obj, field) for obj in objs]
+
+    def rows(self, objs: Iterable[Any]) -> List[Tuple]:
+        """Get the row of each obj. Assumes objs are alike, and falls back if they aren't."""
+        objs = list(objs)
+        if not objs:
+            return []
+        try:
+            rows = list(map(self._getter(objs[0]), objs))
+        except (AttributeError, KeyError, TypeError):
+            rows = [self.row(obj) for obj in objs]
+            return rows  # already encoded
+        return self._encode(rows) if self.encoders else rows
+
+    def _encode(self, rows: List[Tuple]) -> List[Tuple]:
+        cols = list(zip(*rows))
+        for i, encode in self.encoders.items():
+            cols[i] = map(encode, cols[i])
+        return list(zip(*cols))
+
+
+QUOTED_RE = re.compile(r"""('[^']*'|"[^"]*")""")
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_where(where: str) -> str:
+    """
+    Collapse runs of whitespace outside of quoted literals, so that queries differing only in
+    formatting share one cache entry. Quoted text is left untouched.
+    """
+    parts = QUOTED_RE.split(where.strip())
+    # split() puts the quoted literals at odd positions
+    for i in range(0, len(parts), 2):
+        parts[i] = WHITESPACE_RE.sub(" ", parts[i])
+    return "".join(parts)
+
+
+def infer_type(values: Sequence) -> type:
+    """Guess the field type of a column from its first non-null value. Defaults to str."""
+    if hasattr(values, "tolist"):
+        values = values.tolist()
+    for v in values:
+        if v is None:
+            continue
+        for t in (bool, int, float, str):
+            if isinstance(v, t):
+                return t
+        raise FieldsTypeError(f"Cannot infer a field type from value {v!r}")
+    return str
+
+
+def multi_value_type(pytype: Any) -> Optional[type]:
+    """
+    The type of the values in a multi-valued field type, like str for List[str] or set[str].
+    None if pytype isn't one.
+    """
+    origin = getattr(pytype, "__origin__", None)
+    args = getattr(pytype, "__args__", None)
+    if origin in MULTI_VALUE_ORIGINS and args and len(args) == 1:
+        return args[0]
+    return None
+
+
+def encode_values(values: Any) -> Optional[str]:
+    """Store the values of a multi-valued field as JSON. A lone str or number is one value."""
+    if values is None:
+        return None
+    if isinstance(values, (str, bytes)) or not isinstance(values, Iterable):
+        values = [values]
+    return json.dumps(list(values))
+
+
+def decode_values(stored: Optional[str]) -> Optional[List[Any]]:
+    """The values of a multi-valued field, from their JSON."""
+    return None if stored is None else json.loads(stored)
+
+
 def validate_fields(fields: Dict[Union[str, Callable], type]):
     """Check that fields are correct. Raise exception if not."""
     if not fields or not isinstance(fields, dict):
         raise InvalidFields("Need a nonempty dict of fields, such as {'x': float}")
     for i, f in enumerate(fields):
-        if fields[f] not in [int, float, bool, str]:
+        pytype = fields[f]
+        scalar = isinstance(pytype, type) and (
+            pytype in SQLITE_TYPES or pytype is Text or is_enum(pytype)
+        )
+        if not scalar and multi_value_type(pytype) not in SCALAR_TYPES:
             raise InvalidFields(
-                "Expected int, float, bool, or str field type at position {}, but got {}".format(
-                    i, fields[f]
-                )
+                "Expected int, float, bool, str, bytes, datetime, date, Decimal, Enum "
+                "or Text field type, or a list of int, float, bool or str, "
+                "at position {}, but got {}".format(i, fields[f])
             )
         if not isinstance(f, str) and not callable(f):
             raise InvalidFields(
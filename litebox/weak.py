@@ -0,0 +1,89 @@
+"""
+Weakly-held objects, for LiteBox(weak=True).
+
+A weak LiteBox doesn't keep its objects alive. When one is garbage collected, it drops out of the
+object map right away, and its row is deleted from the table in a batch before the next query.
+"""
+
+import weakref
+from typing import Any, Callable, Iterable, List, Optional
+
+
+class WeakObjectMap:
+    """
+    Maps {row id: object} like the dict in LiteBox.obj_map, but holds the objects weakly.
+    When an object dies, its entry goes away and on_death(ptr, tag) is called, where tag is
+    tag_of(obj) as of when the object was stored, or None.
+    """
+
+    def __init__(
+        self,
+        on_death: Callable[[int, Any], None],
+        tag_of: Optional[Callable[[Any], Any]] = None,
+    ):
+        self._refs = dict()  # maps {ptr: KeyedRef to the object}
+        self._tag_of = tag_of
+        map_ref = weakref.ref(self)
+
+        def remove(ref: weakref.KeyedRef):
+            # Runs in whatever thread drops the last reference to the object.
+            obj_map = map_ref()
+            if obj_map is None:
+                return
+            ptr, tag = ref.key
+            if obj_map._refs.get(ptr) is ref:
+                del obj_map._refs[ptr]
+                on_death(ptr, tag)
+
+        self._remove = remove
+
+    def __setitem__(self, ptr: int, obj: Any):
+        tag = None if self._tag_of is None else self._tag_of(obj)
+        self._refs[ptr] = weakref.KeyedRef(obj, self._remove, (ptr, tag))
+
+    def __getitem__(self, ptr: int) -> Any:
+        obj = self._refs[ptr]()
+        if obj is None:
+            raise KeyError(ptr)
+        return obj
+
+    def __delitem__(self, ptr: int):
+        del self._refs[ptr]
+
+    def __contains__(self, ptr: int) -> bool:
+        return ptr in self._refs
+
+    def __len__(self) -> int:
+        return len(self._refs)
+
+    def __iter__(self):
+        return iter(list(self._refs))
+
+    def get(self, ptr: int, default: Any = None) -> Any:
+        ref = self._refs.get(ptr)
+        obj = None if ref is None else ref()
+        return default if obj is None else obj
+
+    def pop(self, ptr: int) -> Any:
+        obj = self._refs.pop(ptr)()
+        if obj is None:
+            raise KeyError(ptr)
+        return obj
+
+    def keys(self):
+        return self._refs.keys()
+
+    def values(self) -> List[Any]:
+        """The live objects."""
+        objs = [ref() for ref in list(self._refs.values())]
+        return [obj for obj in objs if obj is not None]
+
+    def update(self, objs: dict):
+        for ptr, obj in objs.items():
+            self[ptr] = obj
+
+    def lookup(self, ptrs: Iterable[int]) -> List[Any]:
+        """The objects at ptrs, skipping any that have died."""
+        refs = self._refs
+        objs = [ref() for ref in map(refs.get, ptrs) if ref is not None]
+        return [obj for obj in objs if obj is not None]
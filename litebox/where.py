@@ -0,0 +1,437 @@
+"""
+Parser for the subset of SQL where-clause syntax that LiteBox can evaluate without SQLite.
+
+Supported: comparisons (=, ==, !=, <>, <, <=, >, >=), BETWEEN, IN (...), IS [NOT] NULL,
+AND / OR / NOT, parentheses, TRUE / FALSE / NULL, and ? or :name placeholders. A number or
+TRUE / FALSE on its own is a condition that is always or never true, as in "x > 5 AND 1".
+"""
+
+import operator
+import re
+from typing import Any, Collection, List, Optional, Tuple
+
+from litebox.exceptions import InvalidQueryError
+
+
+class Param:
+    """A placeholder in a where clause, bound at query time by position or by name."""
+
+    def __init__(self, key):
+        self.key = key
+
+    def resolve(self, params):
+        try:
+            return params[self.key]
+        except (KeyError, IndexError, TypeError):
+            raise InvalidQueryError(f"No value supplied for query parameter {self.key}")
+
+
+def resolve(value, params):
+    """Get the value of a literal, a Param, or a list of them."""
+    if isinstance(value, Param):
+        return value.resolve(params)
+    if isinstance(value, list):
+        return [resolve(v, params) for v in value]
+    return value
+
+
+class Node:
+    def negate(self) -> "Node":
+        raise NotImplementedError
+
+    def fields(self) -> List[str]:
+        """Names of the fields referenced by this node, in order of appearance."""
+        raise NotImplementedError
+
+    def leaves(self) -> List["Node"]:
+        """The comparisons this node is made of."""
+        return [self]
+
+    # Combine nodes with &, |, and ~, as in the Q query builder.
+    def __and__(self, other: "Node") -> "Node":
+        return And(_flatten(And, [self, other]))
+
+    def __or__(self, other: "Node") -> "Node":
+        return Or(_flatten(Or, [self, other]))
+
+    def __invert__(self) -> "Node":
+        return self.negate()
+
+
+def _flatten(kind: type, nodes: List[Node]) -> List[Node]:
+    """Merge nested nodes of the same kind, so (a & b) & c has three children."""
+    out = []
+    for node in nodes:
+        if not isinstance(node, Node):
+            raise InvalidQueryError(f"Cannot combine a query with {node!r}")
+        out.extend(node.children if isinstance(node, kind) else [node])
+    return out
+
+
+OPS = {
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+NEGATED_OPS = {"=": "!=", "!=": "=", "<": ">=", "<=": ">", ">": "<=", ">=": "<"}
+FLIPPED_OPS = {"=": "=", "!=": "!=", "<": ">", "<=": ">=", ">": "<", ">=": "<="}
+
+
+class Compare(Node):
+    def __init__(self, field: str, op: str, value: Any):
+        self.field = field
+        self.op = op
+        self.value = value
+
+    def negate(self):
+        # Comparisons with NULL are never true, so NOT (x < 5) is x >= 5, which excludes nulls.
+        return Compare(self.field, NEGATED_OPS[self.op], self.value)
+
+    def fields(self):
+        return [self.field]
+
+
+class Between(Node):
+    def __init__(self, field: str, lo: Any, hi: Any):
+        self.field = field
+        self.lo = lo
+        self.hi = hi
+
+    def negate(self):
+        return Or(
+            [Compare(self.field, "<", self.lo), Compare(self.field, ">", self.hi)]
+        )
+
+    def fields(self):
+        return [self.field]
+
+
+class In(Node):
+    def __init__(self, field: str, values: Collection, negated: bool = False):
+        self.field = field
+        self.values = values
+        self.negated = negated
+
+    def negate(self):
+        return In(self.field, self.values, not self.negated)
+
+    def fields(self):
+        return [self.field]
+
+
+class IsNull(Node):
+    def __init__(self, field: str, negated: bool = False):
+        self.field = field
+        self.negated = negated
+
+    def negate(self):
+        return IsNull(self.field, not self.negated)
+
+    def fields(self):
+        return [self.field]
+
+
+class Contains(Node):
+    """
+    Matches objects whose multi-valued field holds any of values, or all of them if match_all.
+    Only made by Q expressions; SQL strings have no syntax for it.
+    """
+
+    def __init__(
+        self,
+        field: str,
+        values: Collection,
+        match_all: bool = False,
+        negated: bool = False,
+    ):
+        self.field = field
+        self.values = values
+        self.match_all = match_all
+        self.negated = negated
+
+    def negate(self):
+        return Contains(self.field, self.values, self.match_all, not self.negated)
+
+    def fields(self):
+        return [self.field]
+
+
+class Match(Node):
+    """
+    Matches objects whose Text field matches a full-text query, like 'quick fox' or 'qu*'.
+    Only made by Q expressions; SQL strings have no syntax for it.
+    """
+
+    def __init__(self, field: str, query: str, negated: bool = False):
+        self.field = field
+        self.query = query
+        self.negated = negated
+
+    def negate(self):
+        return Match(self.field, self.query, not self.negated)
+
+    def fields(self):
+        return [self.field]
+
+
+class And(Node):
+    def __init__(self, children: List[Node]):
+        self.children = children
+
+    def negate(self):
+        return Or([c.negate() for c in self.children])
+
+    def fields(self):
+        return [f for c in self.children for f in c.fields()]
+
+    def leaves(self):
+        return [leaf for c in self.children for leaf in c.leaves()]
+
+
+class Or(Node):
+    def __init__(self, children: List[Node]):
+        self.children = children
+
+    def negate(self):
+        return And([c.negate() for c in self.children])
+
+    def fields(self):
+        return [f for c in self.children for f in c.fields()]
+
+    def leaves(self):
+        return [leaf for c in self.children for leaf in c.leaves()]
+
+
+TOKEN_RE = re.compile(
+    r"""\s*(?:
+    (?P<num>(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+    |(?P<str>'(?:[^']|'')*')
+    |(?P<qident>"(?:[^"]|"")*")
+    |(?P<ident>[A-Za-z_][A-Za-z0-9_]*)
+    |(?P<named>:[A-Za-z_][A-Za-z0-9_]*)
+    |(?P<op>==|!=|<>|<=|>=|=|<|>|\(|\)|,|\?|-)
+    )""",
+    re.VERBOSE,
+)
+KEYWORDS = {"and", "or", "not", "is", "null", "between", "in", "true", "false"}
+# SQL keywords outside the supported subset, reported as such rather than as unknown fields.
+UNSUPPORTED_KEYWORDS = {
+    "like",
+    "glob",
+    "regexp",
+    "match",
+    "escape",
+    "collate",
+    "isnull",
+    "notnull",
+    "exists",
+    "case",
+    "cast",
+    "select",
+}
+
+
+class _Token:
+    def __init__(self, kind: str, text: str):
+        self.kind = kind
+        self.text = text
+
+    def is_kw(self, word: str) -> bool:
+        return self.kind == "kw" and self.text == word
+
+
+def tokenize(where: str, fields: Collection[str]) -> List[_Token]:
+    tokens = []
+    pos = 0
+    where = where.rstrip()
+    while pos < len(where):
+        m = TOKEN_RE.match(where, pos)
+        if m is None or m.end() == pos:
+            raise InvalidQueryError(f"Could not parse query at: {where[pos:]!r}")
+        pos = m.end()
+        kind = m.lastgroup
+        text = m.group(kind)
+        if kind == "ident":
+            if text.lower() in KEYWORDS:
+                kind, text = "kw", text.lower()
+            elif text not in fields:
+                if text.lower() in UNSUPPORTED_KEYWORDS:
+                    raise InvalidQueryError(f"Unsupported SQL in query: {text.upper()}")
+                if where[pos:].lstrip().startswith("("):
+                    raise InvalidQueryError(f"Unsupported function in query: {text}")
+                raise InvalidQueryError(f"Unknown field in query: {text}")
+        elif kind == "qident":
+            # SQLite reads "x" as a column name if there is one, and as a string otherwise.
+            text = text[1:-1].replace('""', '"')
+            kind = "ident" if text in fields else "str"
+        elif kind == "str":
+            text = text[1:-1].replace("''", "'")
+        tokens.append(_Token(kind, text))
+    return tokens
+
+
+class _Parser:
+    def __init__(self, tokens: List[_Token]):
+        self.tokens = tokens
+        self.pos = 0
+        self.n_positional = 0
+
+    def peek(self) -> Optional[_Token]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def next(self) -> _Token:
+        tok = self.peek()
+        if tok is None:
+            raise InvalidQueryError("Unexpected end of query")
+        self.pos += 1
+        return tok
+
+    def accept_kw(self, word: str) -> bool:
+        tok = self.peek()
+        if tok is not None and tok.is_kw(word):
+            self.pos += 1
+            return True
+        return False
+
+    def expect_op(self, op: str):
+        tok = self.next()
+        if tok.kind != "op" or tok.text != op:
+            raise InvalidQueryError(f"Expected {op!r} but got {tok.text!r}")
+
+    def parse(self) -> Node:
+        node = self.parse_or()
+        if self.peek() is not None:
+            raise InvalidQueryError(f"Unexpected {self.peek().text!r} in query")
+        return node
+
+    def parse_or(self) -> Node:
+        children = [self.parse_and()]
+        while self.accept_kw("or"):
+            children.append(self.parse_and())
+        return children[0] if len(children) == 1 else Or(children)
+
+    def parse_and(self) -> Node:
+        children = [self.parse_not()]
+        while self.accept_kw("and"):
+            children.append(self.parse_not())
+        return children[0] if len(children) == 1 else And(children)
+
+    def parse_not(self) -> Node:
+        if self.accept_kw("not"):
+            return self.parse_not().negate()
+        return self.parse_predicate()
+
+    def parse_predicate(self) -> Node:
+        tok = self.peek()
+        if tok is not None and tok.kind == "op" and tok.text == "(":
+            self.pos += 1
+            node = self.parse_or()
+            self.expect_op(")")
+            return node
+        if tok is not None and tok.kind == "ident":
+            self.pos += 1
+            return self.parse_field_predicate(tok.text)
+        # value op field, e.g. 5 < x, or a value on its own, e.g. TRUE
+        value = self.parse_value()
+        tok = self.peek()
+        if tok is None or tok.kind == "kw" or tok.text == ")":
+            return _constant(value)
+        op = self.parse_comparison_op()
+        field = self.next()
+        if field.kind != "ident":
+            raise InvalidQueryError("Comparisons must involve a field")
+        return Compare(field.text, FLIPPED_OPS[op], value)
+
+    def parse_field_predicate(self, field: str) -> Node:
+        if self.accept_kw("is"):
+            negated = self.accept_kw("not")
+            if not self.accept_kw("null"):
+                raise InvalidQueryError("Only IS NULL and IS NOT NULL are supported")
+            return IsNull(field, negated)
+        negated = self.accept_kw("not")
+        if self.accept_kw("between"):
+            lo = self.parse_value()
+            if not self.accept_kw("and"):
+                raise InvalidQueryError("Expected AND in BETWEEN")
+            node = Between(field, lo, self.parse_value())
+            return node.negate() if negated else node
+        if self.accept_kw("in"):
+            self.expect_op("(")
+            values = [self.parse_value()]
+            while self.peek() is not None and self.peek().text == ",":
+                self.pos += 1
+                values.append(self.parse_value())
+            self.expect_op(")")
+            return In(field, values, negated)
+        if negated:
+            raise InvalidQueryError("Expected BETWEEN or IN after NOT")
+        op = self.parse_comparison_op()
+        tok = self.peek()
+        if tok is not None and tok.kind == "ident":
+            raise InvalidQueryError("Comparing two fields is not supported")
+        return Compare(field, op, self.parse_value())
+
+    def parse_comparison_op(self) -> str:
+        tok = self.next()
+        if tok.kind != "op" or tok.text not in (
+            "==",
+            "=",
+            "!=",
+            "<>",
+            "<",
+            "<=",
+            ">",
+            ">=",
+        ):
+            raise InvalidQueryError(f"Expected a comparison but got {tok.text!r}")
+        return {"==": "=", "<>": "!="}.get(tok.text, tok.text)
+
+    def parse_value(self) -> Any:
+        tok = self.next()
+        if tok.kind == "num":
+            return (
+                float(tok.text) if any(c in tok.text for c in ".eE") else int(tok.text)
+            )
+        if tok.kind == "str":
+            return tok.text
+        if tok.kind == "named":
+            return Param(tok.text[1:])
+        if tok.kind == "op" and tok.text == "?":
+            self.n_positional += 1
+            return Param(self.n_positional - 1)
+        if tok.kind == "op" and tok.text == "-":
+            value = self.parse_value()
+            if isinstance(value, (int, float)):
+                return -value
+        if tok.kind == "kw" and tok.text in ("true", "false", "null"):
+            return {"true": 1, "false": 0, "null": None}[tok.text]
+        raise InvalidQueryError(f"Expected a value but got {tok.text!r}")
+
+
+def _constant(value: Any) -> Node:
+    """A condition that is always true (an empty And) or never true (an empty Or)."""
+    if isinstance(value, (int, float)):
+        return And([]) if value else Or([])
+    raise InvalidQueryError(f"Expected a comparison after {value!r}")
+
+
+def parse_where(where: str, fields: Collection[str]) -> Node:
+    """Parse a where clause over the given field names into a tree of Nodes."""
+    return _Parser(tokenize(where, fields)).parse()
+
+
+def parse_order_by(order_by: str, fields: Collection[str]) -> List[Tuple[str, bool]]:
+    """Parse an ORDER BY clause like "a desc, b" into [(field, descending), ...]."""
+    keys = []
+    for term in order_by.split(","):
+        words = term.split()
+        if not 1 <= len(words) <= 2 or words[0] not in fields:
+            raise InvalidQueryError(f"Could not parse order_by term: {term.strip()!r}")
+        direction = words[1].lower() if len(words) == 2 else "asc"
+        if direction not in ("asc", "desc"):
+            raise InvalidQueryError(f"Expected ASC or DESC, got {words[1]!r}")
+        keys.append((words[0], direction == "desc"))
+    return keys
@@ -2,7 +2,7 @@ import math
 import random
 import string
 import time
-from litebox import LiteBox
+from litebox import LiteBox, Q
 
 
 class Thing:
@@ -42,7 +42,7 @@ def query_floats(ri, n_items, n_runs):
     for _ in range(n_runs):
         lo, hi = generate_float_range(n_items, 2, len(ri))
         t0 = time.time()
-        matches = ri.find(f"f0 > {lo} and f0 <= {hi} and f1 > {lo} and f1 <= {hi}")
+        matches = ri.find((Q.f0 > lo) & (Q.f0 <= hi) & (Q.f1 > lo) & (Q.f1 <= hi))
         t1 = time.time()
         t_tot += (t1 - t0) / n_runs
         tot_matches += len(matches) / n_runs
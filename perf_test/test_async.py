@@ -0,0 +1,68 @@
+import asyncio
+import random
+import time
+
+from litebox import LiteBox
+from litebox.aio import AsyncLiteBox
+
+
+async def max_stall(coro):
+    """Run coro while ticking the event loop; return its result and the longest tick gap."""
+    gaps = []
+    done = False
+
+    async def ticker():
+        last = time.perf_counter()
+        while not done:
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            gaps.append(now - last)
+            last = now
+
+    t = asyncio.ensure_future(ticker())
+    await asyncio.sleep(0.01)
+    result = await coro
+    await asyncio.sleep(0.01)
+    done = True
+    await t
+    return result, max(gaps)
+
+
+def test_async_find():
+    random.seed(42)
+    data = [{"size": random.randint(0, 10**6)} for _ in range(10**6)]
+    lb = LiteBox(data, {"size": int})
+    abox = AsyncLiteBox(data, {"size": int})
+    abox.box  # wait for it to build
+
+    async def blocking_find():
+        return lb.find("size > ?", (10**5,))
+
+    async def main():
+        blocked, sync_stall = await max_stall(blocking_find())
+        found, async_stall = await max_stall(abox.find("size > ?", (10**5,)))
+        assert len(found) == len(blocked)
+
+        # 20 identical finds arriving together run once.
+        t0 = time.perf_counter()
+        await asyncio.gather(*[abox.find("size > ?", (10**5,)) for _ in range(20)])
+        t_coalesced = time.perf_counter() - t0
+
+        # Small adds from many tasks go in as one batch.
+        objs = [{"size": i} for i in range(10**4)]
+        t0 = time.perf_counter()
+        await asyncio.gather(*[abox.add(o) for o in objs])
+        t_adds = time.perf_counter() - t0
+        return sync_stall, async_stall, t_coalesced, t_adds
+
+    sync_stall, async_stall, t_coalesced, t_adds = asyncio.run(main())
+    abox.close()
+    print(f"Longest event loop stall, sync find: {round(sync_stall, 4)} seconds.")
+    print(f"Longest event loop stall, async find: {round(async_stall, 4)} seconds.")
+    print(f"20 concurrent identical finds: {round(t_coalesced, 4)} seconds.")
+    print(f"10k concurrent adds: {round(t_adds, 4)} seconds.")
+    assert async_stall < sync_stall / 2
+
+
+if __name__ == "__main__":
+    test_async_find()
@@ -0,0 +1,46 @@
+import random
+import time
+from litebox import LiteBox
+
+
+class Particle:
+    def __init__(self):
+        self.x = random.random()
+        self.y = random.random()
+        self.energy = random.choice(range(100))
+
+
+def test_batch_update():
+    random.seed(42)
+    particles = [Particle() for _ in range(10**6)]
+    lb = LiteBox(particles, on={"x": float, "y": float, "energy": int})
+
+    for batch_size in [1, 10, 100, 1000, 10**4, 10**5]:
+        batch = random.sample(particles, batch_size)
+        for p in batch:
+            p.x = random.random()
+
+        t0 = time.time()
+        for p in batch:
+            lb.update(p)
+        t_loop = time.time() - t0
+
+        t0 = time.time()
+        missing = lb.update_many(batch)
+        t_batch = time.time() - t0
+
+        assert missing == []
+        print(
+            f"{batch_size} updates: update() loop {round(t_loop, 6)}s, "
+            f"update_many() {round(t_batch, 6)}s"
+        )
+    assert t_batch < t_loop  # at the largest batch size
+
+    p = batch[0]
+    p.x = 2.0
+    lb.update_many(batch)
+    assert lb.find("x > 1.5") == [p]
+
+
+if __name__ == "__main__":
+    test_batch_update()
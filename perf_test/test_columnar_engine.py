@@ -0,0 +1,48 @@
+import random
+import time
+from litebox import LiteBox
+
+
+class CatPhoto:
+    def __init__(self):
+        self.name = random.choice(["Luna", "Willow", "Elvis", "Nacho", "Tiger"])
+        self.width = random.choice(range(200, 2000))
+        self.height = random.choice(range(200, 2000))
+        self.brightness = random.random() * 10
+        self.image_data = "Y2Ugbidlc3QgcGFzIHVuZSBjaGF0dGU="
+
+
+def build_and_query(photos, engine):
+    t0 = time.time()
+    lb = LiteBox(
+        photos,
+        on={"height": int, "width": int, "brightness": float, "name": str},
+        engine=engine,
+    )
+    t_build = time.time() - t0
+
+    # Mid-selectivity: around 1% of objects match.
+    t0 = time.time()
+    n_found = 0
+    for lo in range(200, 1900, 100):
+        n_found += len(
+            lb.find("width >= ? and width < ? and brightness >= ?", (lo, lo + 100, 8.0))
+        )
+    t_query = time.time() - t0
+    return t_build, t_query, n_found
+
+
+def test_columnar_engine():
+    random.seed(42)
+    photos = [CatPhoto() for _ in range(10**6)]
+    sql_build, sql_query, sql_found = build_and_query(photos, "sqlite")
+    col_build, col_query, col_found = build_and_query(photos, "columnar")
+    print(f"sqlite build: {round(sql_build, 3)}s, queries: {round(sql_query, 3)}s")
+    print(f"columnar build: {round(col_build, 3)}s, queries: {round(col_query, 3)}s")
+    assert sql_found == col_found
+    assert col_build < sql_build
+    assert col_query < sql_query
+
+
+if __name__ == "__main__":
+    test_columnar_engine()
@@ -0,0 +1,39 @@
+import random
+import threading
+import time
+from litebox import LiteBox
+
+
+def test_concurrent_find():
+    random.seed(42)
+    data = [
+        {"num": random.random(), "size": random.randint(0, 1000)} for _ in range(10**6)
+    ]
+    lb = LiteBox(data, {"num": float, "size": int}, concurrent=True)
+    n_queries = 400
+
+    def work(n):
+        for _ in range(n):
+            lo = random.random()
+            lb.find("num >= ? and num < ? and size >= ?", (lo, lo + 0.001, 500))
+
+    throughput = dict()
+    for n_threads in [1, 2, 4, 8]:
+        threads = [
+            threading.Thread(target=work, args=(n_queries // n_threads,))
+            for _ in range(n_threads)
+        ]
+        t0 = time.time()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        throughput[n_threads] = n_queries / (time.time() - t0)
+        print(f"{n_threads} threads: {round(throughput[n_threads])} finds per second.")
+
+    # Scaling depends on the number of cores; at least, more threads shouldn't be much slower.
+    assert throughput[8] > throughput[1] * 0.5
+
+
+if __name__ == "__main__":
+    test_concurrent_find()
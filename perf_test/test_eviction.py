@@ -0,0 +1,66 @@
+import random
+import time
+from collections import deque
+
+from litebox import LiteBox
+
+
+def make_stream(n):
+    return [{"id": i, "num": random.random()} for i in range(n)]
+
+
+def test_bounded_stream():
+    random.seed(42)
+    max_size = 10**4
+    stream = make_stream(10**5)
+
+    t_manual = t_bounded = float("inf")
+    for _ in range(3):  # best of 3
+        # Evicting by hand: remove the oldest object on every add.
+        lb = LiteBox(on={"num": float})
+        order = deque()
+        t0 = time.time()
+        for obj in stream:
+            lb.add(obj)
+            order.append(obj)
+            if len(order) > max_size:
+                lb.remove(order.popleft())
+        t_manual = min(t_manual, time.time() - t0)
+
+        # max_size: evicts in batches, each one range DELETE over the insertion-order index.
+        lb = LiteBox(on={"num": float}, max_size=max_size, eviction="fifo")
+        t0 = time.time()
+        for obj in stream:
+            lb.add(obj)
+        t_bounded = min(t_bounded, time.time() - t0)
+    assert len(lb) <= max_size
+    assert lb.count() == len(lb)
+
+    print(
+        f"{len(stream)} adds, removing the oldest by hand: {round(t_manual, 3)} seconds."
+    )
+    print(f"{len(stream)} adds with max_size: {round(t_bounded, 3)} seconds.")
+    assert t_bounded < t_manual
+
+
+def test_lru_find_overhead():
+    random.seed(42)
+    data = make_stream(10**5)
+    queries = [random.random() for _ in range(10**4)]
+    timings = {}
+    for max_size in [None, 10**5]:
+        lb = LiteBox(data, {"num": float}, max_size=max_size)
+        t0 = time.time()
+        for q in queries:
+            lb.find("num >= ? and num < ?", (q, q + 0.001))
+        timings[max_size] = time.time() - t0
+        print(
+            f"{len(queries)} finds, max_size={max_size}: {round(timings[max_size], 3)} seconds."
+        )
+    # LRU touches are kept in memory and written only when evicting.
+    assert timings[10**5] < timings[None] * 1.5
+
+
+if __name__ == "__main__":
+    test_bounded_stream()
+    test_lru_find_overhead()
@@ -0,0 +1,46 @@
+import random
+import time
+from datetime import datetime, timedelta
+
+from litebox import LiteBox
+
+
+def db_bytes(lb):
+    page_count = lb.conn.execute("PRAGMA page_count").fetchone()[0]
+    page_size = lb.conn.execute("PRAGMA page_size").fetchone()[0]
+    return page_count * page_size
+
+
+def test_datetime_vs_iso_str():
+    random.seed(42)
+    n = 10**6
+    start = datetime(2020, 1, 1)
+    times = [start + timedelta(seconds=random.randrange(10**8)) for _ in range(n)]
+    objs = [{"t": t, "iso": t.isoformat()} for t in times]
+    lo, hi = start + timedelta(days=100), start + timedelta(days=110)
+
+    sizes = dict()
+    query_times = dict()
+    for field, pytype, params in [
+        ("t", datetime, (lo, hi)),
+        ("iso", str, (lo.isoformat(), hi.isoformat())),
+    ]:
+        lb = LiteBox(objs, {field: pytype}, index=[field])
+        sizes[field] = db_bytes(lb)
+        t0 = time.time()
+        for _ in range(10):
+            found = lb.find(f"{field} >= ? AND {field} < ?", params)
+        query_times[field] = time.time() - t0
+        assert len(found) == len([t for t in times if lo <= t < hi])
+
+    print(f"{n} datetimes as INTEGER micros: {sizes['t'] // 2**20} MB.")
+    print(f"{n} datetimes as ISO strings: {sizes['iso'] // 2**20} MB.")
+    print(
+        f"10 range queries: {round(query_times['t'], 3)} seconds as INTEGER, "
+        f"{round(query_times['iso'], 3)} seconds as ISO strings."
+    )
+    assert sizes["t"] < sizes["iso"]
+
+
+if __name__ == "__main__":
+    test_datetime_vs_iso_str()
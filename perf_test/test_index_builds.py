@@ -0,0 +1,62 @@
+import random
+import time
+
+from litebox import LiteBox
+
+ON = {"x": float, "y": float, "size": int, "name": str}
+INDEX = ["x", "y", "size", "name"]
+
+
+def make_objs(n, start=0):
+    return [
+        {
+            "x": random.random(),
+            "y": random.random(),
+            "size": random.randrange(10**6),
+            "name": str(random.random()),
+        }
+        for _ in range(start, start + n)
+    ]
+
+
+def test_defer_indices():
+    random.seed(42)
+    n = 5 * 10**5
+    first, second = make_objs(n), make_objs(n)
+    times = dict()
+    for defer in [False, True]:
+        lb = LiteBox(first, ON, index=INDEX, defer_indices=defer)
+        t0 = time.time()
+        lb.add_many(second)
+        times[defer] = time.time() - t0
+        assert len(lb) == 2 * n
+    print(f"add_many of {n} objects into {n}, 4 indices:")
+    print(f"updating the indices: {round(times[False], 3)} seconds.")
+    print(f"defer_indices: {round(times[True], 3)} seconds.")
+    assert times[True] < times[False]
+
+
+def test_background_indices():
+    random.seed(42)
+    n = 10**6
+    objs = make_objs(n)
+    times = dict()
+    for background in [False, True]:
+        t0 = time.time()
+        lb = LiteBox(objs, ON, index=INDEX, background_indices=background)
+        lb.find("size = ?", (5,))
+        times[background] = time.time() - t0
+        lb.wait_for_indices()
+        times[background, "all"] = time.time() - t0
+    print(f"LiteBox of {n} objects, 4 indices, until the first query is answered:")
+    print(f"building indices first: {round(times[False], 3)} seconds.")
+    print(
+        f"background_indices: {round(times[True], 3)} seconds; "
+        f"indices ready after {round(times[True, 'all'], 3)} seconds."
+    )
+    assert times[True] < times[False]
+
+
+if __name__ == "__main__":
+    test_defer_indices()
+    test_background_indices()
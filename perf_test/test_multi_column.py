@@ -1,6 +1,10 @@
+import os
 import random
 import time
-from litebox import LiteBox
+
+import pytest
+
+from litebox import LiteBox, RTree
 
 
 class CatPhoto:
@@ -59,5 +63,49 @@ def test_multi_column():
     assert t_build < 10  # normally builds in ~1s
 
 
+def compare_btree_rtree(n):
+    """Time box queries on width, height and brightness with each kind of index."""
+    random.seed(42)
+    photos = [CatPhoto() for _ in range(n)]
+    on = {"height": int, "width": int, "brightness": float, "name": str}
+    where = "width between ? and ? and height between ? and ? and brightness between ? and ?"
+    boxes = []
+    for _ in range(100):
+        w, h = random.randrange(200, 1900), random.randrange(200, 1900)
+        b = random.random() * 9
+        boxes.append((w, w + 100, h, h + 100, b, b + 1))
+
+    timings = {}
+    counts = {}
+    fields = ("width", "height", "brightness")
+    for index in [fields, RTree(*fields)]:
+        t0 = time.time()
+        lb = LiteBox(photos, on, index=[index])
+        t_build = time.time() - t0
+        t0 = time.time()
+        counts[type(index)] = [len(lb.find(where, box)) for box in boxes]
+        timings[type(index)] = time.time() - t0
+        print(f"{index} index on {n} objects: ", end="")
+        print(f"built in {round(t_build, 3)} seconds, ", end="")
+        print(f"{len(boxes)} box queries in {round(timings[type(index)], 3)} seconds.")
+        del lb
+    assert counts[tuple] == counts[RTree]
+    assert timings[RTree] < timings[tuple]
+
+
+def test_btree_vs_rtree():
+    compare_btree_rtree(10**6)
+
+
+@pytest.mark.skipif(
+    not os.environ.get("LITEBOX_PERF_10M"), reason="set LITEBOX_PERF_10M=1; needs ~16GB"
+)
+def test_btree_vs_rtree_10m():
+    compare_btree_rtree(10**7)
+
+
 if __name__ == '__main__':
     test_multi_column()
+    test_btree_vs_rtree()
+    if os.environ.get("LITEBOX_PERF_10M"):
+        test_btree_vs_rtree_10m()
@@ -0,0 +1,32 @@
+import random
+import time
+from typing import List
+
+from litebox import LiteBox, Q
+
+
+def test_contains_any():
+    random.seed(42)
+    n = 10**6
+    tags = [f"tag{i}" for i in range(1000)]
+    objs = [{"tags": random.sample(tags, 5)} for _ in range(n)]
+    lb = LiteBox(objs, {"tags": List[str]})
+    wanted = ["tag1", "tag2", "tag3"]
+
+    t0 = time.time()
+    wanted_set = set(wanted)
+    scanned = [o for o in objs if not wanted_set.isdisjoint(o["tags"])]
+    t_scan = time.time() - t0
+
+    t0 = time.time()
+    found = lb.find(Q.tags.contains_any(wanted))
+    t_find = time.time() - t0
+
+    assert len(found) == len(scanned)
+    print(f"Python scan for any of {len(wanted)} tags: {round(t_scan, 3)} seconds.")
+    print(f"find(Q.tags.contains_any(...)): {round(t_find, 3)} seconds.")
+    assert t_find < t_scan
+
+
+if __name__ == "__main__":
+    test_contains_any()
@@ -0,0 +1,52 @@
+import random
+import time
+from litebox import LiteBox, Q
+
+
+def test_parameterized_find():
+    random.seed(42)
+    data = [
+        {"item": i, "num": random.random(), "size": random.randint(0, 10**6)}
+        for i in range(10**6)
+    ]
+    lb = LiteBox(data, {"num": float, "size": int})
+    bounds = [(random.random(), random.randint(0, 10**6)) for _ in range(10**4)]
+
+    # Literal values: every query has new SQL text, so SQLite parses and plans each one.
+    t0 = time.time()
+    n_literal = 0
+    for lo, size in bounds:
+        n_literal += len(
+            lb.find(f"num >= {lo} and num < {lo + 0.00001} and size >= {size}")
+        )
+    t_literal = time.time() - t0
+
+    # Placeholders: one query shape, prepared once and reused.
+    t0 = time.time()
+    n_param = 0
+    for lo, size in bounds:
+        n_param += len(
+            lb.find(
+                "num >= ? and num < ? and size >= ?", params=(lo, lo + 0.00001, size)
+            )
+        )
+    t_param = time.time() - t0
+
+    # Q expressions: compiled to the same placeholder query.
+    t0 = time.time()
+    n_q = 0
+    for lo, size in bounds:
+        n_q += len(lb.find((Q.num >= lo) & (Q.num < lo + 0.00001) & (Q.size >= size)))
+    t_q = time.time() - t0
+
+    print(f"Literal finds: {len(bounds)} queries in {round(t_literal, 6)} seconds.")
+    print(f"Parameterized finds: {len(bounds)} queries in {round(t_param, 6)} seconds.")
+    print(f"Q expression finds: {len(bounds)} queries in {round(t_q, 6)} seconds.")
+    print(f"Speedup: {round(t_literal / t_param, 2)}x")
+    assert n_literal == n_param == n_q
+    assert t_param < t_literal
+    assert t_q < t_literal
+
+
+if __name__ == "__main__":
+    test_parameterized_find()
@@ -0,0 +1,40 @@
+import random
+import time
+from litebox import LiteBox
+
+
+def test_planner():
+    random.seed(42)
+    data = [{"item": i, "num": random.random()} for i in range(10**6)]
+    lb = LiteBox(data, {"num": float})
+
+    # A broad query should run as a single full scan, with no index probe first.
+    t0 = time.time()
+    broad = lb.find("num < ?", (0.5,))
+    t_broad = time.time() - t0
+    t0 = time.time()
+    cur = lb.conn.execute(
+        f"SELECT obj_id__ FROM {lb.table_name} NOT INDEXED WHERE num < ?", (0.5,)
+    )
+    scanned = [lb.obj_map[r[0]] for r in cur]
+    t_scan = time.time() - t0
+
+    # A narrow query should use the index, and not pay much for planning.
+    t0 = time.time()
+    n_narrow = 0
+    for _ in range(1000):
+        lo = random.random()
+        n_narrow += len(lb.find("num >= ? and num < ?", (lo, lo + 0.00001)))
+    t_narrow = (time.time() - t0) / 1000
+
+    print(f"Broad find: {len(broad)} matches in {round(t_broad, 6)} seconds.")
+    print(f"Direct full scan: {len(scanned)} matches in {round(t_scan, 6)} seconds.")
+    print(f"Narrow finds: {round(t_narrow, 6)} seconds per query.")
+    print(lb.explain("num < ?", (0.5,)))
+    assert len(broad) == len(scanned)
+    assert t_broad < t_scan * 1.5
+    assert t_narrow < 0.001
+
+
+if __name__ == "__main__":
+    test_planner()
@@ -0,0 +1,41 @@
+import random
+import time
+
+from litebox import LiteBox
+
+
+def test_projection():
+    random.seed(42)
+    n = 10**6
+    objs = [
+        {"width": random.randint(0, 100), "height": random.random()} for _ in range(n)
+    ]
+    lb = LiteBox(objs, {"width": int, "height": float}, index=[("width", "height")])
+    where = "width >= ? and width < ?"
+    params = (10, 30)
+
+    t0 = time.time()
+    found = lb.find(where, params)
+    pairs = [(o["width"], o["height"]) for o in found]
+    t_objs = time.time() - t0
+
+    t0 = time.time()
+    rows = lb.find(where, params, columns=["width", "height"])
+    t_rows = time.time() - t0
+
+    t0 = time.time()
+    ids = lb.find_ids(where, params)
+    t_ids = time.time() - t0
+
+    assert sorted(rows) == sorted(pairs)
+    assert len(ids) == len(found)
+    print(
+        f"find + reading 2 fields of {len(found)} objects: {round(t_objs, 3)} seconds."
+    )
+    print(f"find(columns=...) of {len(rows)} rows: {round(t_rows, 3)} seconds.")
+    print(f"find_ids() of {len(ids)} rows: {round(t_ids, 3)} seconds.")
+    assert t_rows < t_objs
+
+
+if __name__ == "__main__":
+    test_projection()
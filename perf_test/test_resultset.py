@@ -0,0 +1,47 @@
+import random
+import time
+
+from litebox import LiteBox
+
+
+def test_combined_filters():
+    random.seed(42)
+    n = 10**6
+    objs = [
+        {
+            "tag_a": random.random() < 0.2,
+            "tag_b": random.random() < 0.2,
+            "blocked": random.random() < 0.05,
+            "size": random.randint(0, 1000),
+        }
+        for _ in range(n)
+    ]
+    on = {"tag_a": bool, "tag_b": bool, "blocked": bool, "size": int}
+    lb = LiteBox(objs, on)
+
+    # Combining object lists in Python, with id() sets.
+    t0 = time.time()
+    tagged = {id(o): o for o in lb.find("tag_a = 1")}
+    tagged.update((id(o), o) for o in lb.find("tag_b = 1"))
+    for o in lb.find("blocked = 1"):
+        tagged.pop(id(o), None)
+    big = [o for o in tagged.values() if o["size"] > 900]
+    t_lists = time.time() - t0
+
+    # ResultSets, with the last filter run in SQLite within the combined set.
+    t0 = time.time()
+    allowed = lb.find("tag_a = 1", result_set=True) | lb.find(
+        "tag_b = 1", result_set=True
+    )
+    allowed = allowed - lb.find("blocked = 1", result_set=True)
+    found = lb.find("size > 900", within=allowed)
+    t_sets = time.time() - t0
+
+    assert len(found) == len(big)
+    print(f"Combining lists of objects with id() sets: {round(t_lists, 3)} seconds.")
+    print(f"Combining ResultSets, then find(within=...): {round(t_sets, 3)} seconds.")
+    assert t_sets < t_lists
+
+
+if __name__ == "__main__":
+    test_combined_filters()
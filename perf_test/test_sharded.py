@@ -0,0 +1,56 @@
+import os
+import random
+import time
+
+from litebox import LiteBox
+from litebox.sharded import ShardedLiteBox
+
+
+def test_sharded():
+    random.seed(42)
+    n = 10**6
+    data = [{"num": random.random(), "size": random.randint(0, n)} for _ in range(n)]
+    on = {"num": float, "size": int}
+
+    t0 = time.time()
+    lb = LiteBox(data, on, index=["num"])
+    t_build = time.time() - t0
+
+    # Range shards on size, so queries constrained on size skip most shards.
+    boundaries = [n * i // 8 for i in range(1, 8)]
+    t0 = time.time()
+    sb = ShardedLiteBox(data, on, index=["num"], shard_on="size", boundaries=boundaries)
+    t_build_sharded = time.time() - t0
+
+    def time_counts(box, where, bounds):
+        t0 = time.time()
+        total = sum(box.count(where, b) for b in bounds)
+        return total, time.time() - t0
+
+    # Broad queries scan all rows; every shard scans its part at the same time.
+    broad = [(random.random() / 2,) for _ in range(10)]
+    n_lb, t_lb = time_counts(lb, "num >= ? and size % 2 = 0", broad)
+    n_sb, t_sb = time_counts(sb, "num >= ? and size % 2 = 0", broad)
+    assert n_lb == n_sb
+
+    # Queries on the shard field only visit one or two shards.
+    narrow = [(lo, lo + n // 20) for lo in random.sample(range(n), 10)]
+    n_lb, t_lb_pruned = time_counts(lb, "size >= ? and size < ? and num > 0.5", narrow)
+    n_sb, t_sb_pruned = time_counts(sb, "size >= ? and size < ? and num > 0.5", narrow)
+    assert n_lb == n_sb
+    sb.close()
+
+    print(f"{os.cpu_count()} CPUs.")
+    print(
+        f"Build: LiteBox {round(t_build, 3)}s, 8 shards {round(t_build_sharded, 3)}s."
+    )
+    print(f"Broad counts: LiteBox {round(t_lb, 3)}s, 8 shards {round(t_sb, 3)}s.")
+    print(
+        f"Counts on the shard field: LiteBox {round(t_lb_pruned, 3)}s, "
+        f"8 shards {round(t_sb_pruned, 3)}s."
+    )
+    assert t_sb_pruned < t_lb_pruned
+
+
+if __name__ == "__main__":
+    test_sharded()
@@ -0,0 +1,48 @@
+import os
+import random
+import tempfile
+import time
+
+from litebox import LiteBox
+
+
+def test_snapshot():
+    random.seed(42)
+    data = [
+        {"id": i, "num": random.random(), "size": random.randint(0, 1000)}
+        for i in range(10**6)
+    ]
+    on = {"num": float, "size": int}
+
+    t0 = time.time()
+    lb = LiteBox(data, on, key="id")
+    t_build = time.time() - t0
+
+    path = os.path.join(tempfile.mkdtemp(), "box.db")
+    t0 = time.time()
+    lb.save(path)
+    t_save = time.time() - t0
+
+    t0 = time.time()
+    loaded = LiteBox.load(path, data)
+    t_load = time.time() - t0
+
+    t0 = time.time()
+    copied = LiteBox.load(path, data, mmap=False)
+    t_load_copy = time.time() - t0
+
+    where = "num >= ? and num < ? and size >= ?"
+    for box in (lb, loaded, copied):
+        assert len(box.find(where, (0.5, 0.501, 500))) == len(
+            lb.find(where, (0.5, 0.501, 500))
+        )
+
+    print(f"Build: {round(t_build, 3)} seconds.")
+    print(f"Save: {round(t_save, 3)} seconds.")
+    print(f"Load, mmap: {round(t_load, 3)} seconds.")
+    print(f"Load, copied into memory: {round(t_load_copy, 3)} seconds.")
+    assert t_load < t_build / 2
+
+
+if __name__ == "__main__":
+    test_snapshot()
@@ -0,0 +1,36 @@
+import random
+import time
+
+from litebox import LiteBox, Text
+
+
+def test_match():
+    random.seed(42)
+    n = 10**6
+    words = [f"word{i}" for i in range(10000)]
+    objs = [{"desc": " ".join(random.sample(words, 5))} for _ in range(n)]
+
+    t0 = time.time()
+    lb = LiteBox(objs, {"desc": Text})
+    t_build = time.time() - t0
+
+    t0 = time.time()
+    liked = lb.find("desc LIKE ? OR desc LIKE ?", ("% word42 %", "word42 %"))
+    liked += lb.find("desc LIKE ?", ("% word42",))
+    t_like = time.time() - t0
+
+    t0 = time.time()
+    found = lb.find(match="word42")
+    t_match = time.time() - t0
+
+    assert len(found) == len(liked)
+    print(
+        f"Building a LiteBox of {n} objects with a Text field: {round(t_build, 3)} seconds."
+    )
+    print(f"find with LIKE '%word%': {round(t_like, 3)} seconds.")
+    print(f"find(match='word'): {round(t_match, 3)} seconds.")
+    assert t_match < t_like
+
+
+if __name__ == "__main__":
+    test_match()
@@ -0,0 +1,45 @@
+import random
+import time
+
+from litebox import LiteBox
+
+
+def test_upsert():
+    random.seed(42)
+    n = 10**6
+    data = [
+        {"id": i, "num": random.random(), "size": random.randint(0, 1000)}
+        for i in range(n)
+    ]
+    lb = LiteBox(data, {"num": float, "size": int}, key="id")
+
+    # A change feed: new versions of existing objects, plus some new objects.
+    def feed():
+        return [
+            {"id": random.randint(0, n + 10**4), "num": random.random(), "size": 5}
+            for _ in range(10**5)
+        ]
+
+    changes = feed()
+    t0 = time.time()
+    present = [c for c in changes if c in lb]
+    lb.remove_many(present)
+    lb.add_many(changes)
+    t_remove_add = time.time() - t0
+
+    changes = feed()
+    t0 = time.time()
+    lb.upsert_many(changes)
+    t_upsert = time.time() - t0
+
+    latest = {c["id"]: c for c in changes}
+    assert all(lb.get(k) is c for k, c in latest.items())
+    print(
+        f"remove_many + add_many of {len(changes)} changes: {round(t_remove_add, 3)} seconds."
+    )
+    print(f"upsert_many of {len(changes)} changes: {round(t_upsert, 3)} seconds.")
+    assert t_upsert < t_remove_add
+
+
+if __name__ == "__main__":
+    test_upsert()
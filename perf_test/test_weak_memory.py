@@ -0,0 +1,56 @@
+import gc
+import random
+import time
+
+from litebox import LiteBox
+
+
+class Item:
+    def __init__(self, size: int):
+        self.size = size
+        self.payload = "x" * 200
+
+
+def rss_mb() -> float:
+    """Current resident set size in MB. Linux only."""
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * 4096 / 2**20
+
+
+def churn(weak: bool) -> float:
+    """Run 10^6 objects through a 10^4-object cache that a LiteBox indexes. Returns RSS growth."""
+    gc.collect()
+    start = rss_mb()
+    lb = LiteBox(on={"size": int}, weak=weak)
+    cache = []
+    for _ in range(100):
+        batch = [Item(random.randint(0, 1000)) for _ in range(10**4)]
+        lb.add_many(batch)
+        cache = batch  # the old batch is evicted from the cache
+        lb.find("size < ?", (10,))
+    grown = rss_mb() - start
+    if weak:
+        assert len(lb) == len(cache)
+    else:
+        assert len(lb) == 10**6
+    return grown
+
+
+def test_weak_memory():
+    random.seed(42)
+    t0 = time.time()
+    weak_mb = churn(True)
+    t_weak = time.time() - t0
+    t0 = time.time()
+    strong_mb = churn(False)
+    t_strong = time.time() - t0
+    print(f"weak=True: RSS grew {round(weak_mb)} MB in {round(t_weak, 2)} seconds.")
+    print(
+        f"weak=False: RSS grew {round(strong_mb)} MB in {round(t_strong, 2)} seconds."
+    )
+    assert weak_mb < strong_mb / 4
+
+
+if __name__ == "__main__":
+    test_weak_memory()
@@ -1,3 +1,35 @@
+ENGINES = ["sqlite", "columnar"]
+ON = {"x": int, "s": str}  # the fields of make_data()
+
+
+def make_data(lo=0, hi=100):
+    """Dicts keyed by id, with x repeating every 10 and s the id as a str."""
+    return [{"id": i, "x": i % 10, "s": str(i)} for i in range(lo, hi)]
+
+
+def make_abc(n):
+    """n dicts with a repeating every 10, b counting up, and c repeating every 3."""
+    return [{"a": i % 10, "b": i, "c": str(i % 3)} for i in range(n)]
+
+
+def ids(objs):
+    """The sorted ids of dicts or objects."""
+    return sorted(o["id"] if isinstance(o, dict) else o.id for o in objs)
+
+
+def ids_where(objs, test):
+    """The sorted ids of the objs that pass test."""
+    return ids(filter(test, objs))
+
+
+class Item:
+    """An object with an id and x repeating every 10. Unlike a dict, it can be weakly referenced."""
+
+    def __init__(self, i):
+        self.id = i
+        self.x = i % 10
+
+
 class AssertRaises:
     """
     While the unittest package has an assertRaises context manager, it is incompatible with pytest + fixtures.
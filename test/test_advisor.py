@@ -0,0 +1,83 @@
+import pytest
+
+from litebox.advisor import AUTO_INDEX_INTERVAL, candidate_index, covers
+from litebox.exceptions import IndexNotFoundError
+from litebox.main import LiteBox
+from litebox.where import parse_where
+from .conftest import ENGINES, AssertRaises, make_abc
+
+FIELDS = {"a": int, "b": int, "c": str}
+
+
+def make_box(**kwargs):
+    return LiteBox(make_abc(1000), on=FIELDS, **kwargs)
+
+
+@pytest.mark.parametrize(
+    "where, expected",
+    [
+        ("a == 1", (("a",), None)),
+        ("b > 5 and a == 1", (("a",), "b")),
+        ("c == 'x' and a in (1, 2) and b between 1 and 5", (("a", "c"), "b")),
+        ("a == 1 and a > 0", (("a",), None)),
+        ("a != 1", None),
+        ("a == 1 or b == 2", None),
+    ],
+)
+def test_candidate_index(where, expected):
+    assert candidate_index(parse_where(where, FIELDS)) == expected
+
+
+def test_covers():
+    assert covers(("a", "c", "b"), (("c", "a"), "b"))
+    assert covers(("a", "b"), (("a",), None))
+    assert not covers(("b", "a"), (("a",), None))
+    assert not covers(("a", "c"), (("a",), "b"))
+
+
+def test_suggest_indices():
+    lb = make_box(index=["a"], log_queries=True)
+    for i in range(5):
+        lb.find("a == ? and b < ?", (i, 100))
+        lb.find("c == ? and b == ?", (str(i), i))
+    lb.find("c == '1'")  # returns too many rows for an index to help
+    lb.find("a == 1")  # served by the existing index
+    assert set(lb.suggest_indices()) == {("a", "b"), ("b", "c")}
+
+
+def test_suggest_indices_without_log():
+    lb = make_box()
+    lb.find("a == 1")
+    assert lb.suggest_indices() == []
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_create_drop_index(engine):
+    lb = make_box(index=[], engine=engine)
+    lb.create_index(("a", "b"))
+    lb.create_index(("a", "b"))  # already there; no-op
+    assert len(lb.find("a == 1 and b < 100")) == 10
+    lb.drop_index(("a", "b"))
+    assert lb.indices == dict()
+    assert len(lb.find("a == 1 and b < 100")) == 10
+    with AssertRaises(IndexNotFoundError):
+        lb.drop_index("c")
+
+
+@pytest.mark.parametrize(
+    "engine, expected",
+    [("sqlite", {"c_b": ("c", "b")}), ("columnar", {"c": ("c",)})],
+)
+def test_auto_index(engine, expected, monkeypatch):
+    monkeypatch.setattr("litebox.main.AUTO_INDEX_MIN_SECONDS", 0)
+    lb = make_box(index=[], auto_index=True, engine=engine)
+    for i in range(AUTO_INDEX_INTERVAL):
+        lb.find("c == ? and b < ?", (str(i % 3), 10))
+    assert lb.indices == expected
+
+    # The query mix shifts; the unused index goes and a new one comes.
+    for _ in range(8):
+        for i in range(AUTO_INDEX_INTERVAL):
+            lb.find("b == ?", (i,))
+    assert lb.indices == {"b": ("b",)}
+    assert len(lb.find("b == 1")) == 1
@@ -0,0 +1,70 @@
+import pytest
+
+from litebox.exceptions import InvalidQueryError
+from litebox.main import LiteBox
+from .conftest import ENGINES, AssertRaises
+
+
+def make_box(engine):
+    data = [
+        {"name": "Luna", "width": 100, "brightness": 1.0},
+        {"name": "Luna", "width": 200, "brightness": 3.0},
+        {"name": "Tiger", "width": 300, "brightness": None},
+        {"name": "Tiger", "width": 400, "brightness": 5.0},
+        {"name": "Elvis", "width": 500, "brightness": 8.0},
+    ]
+    return LiteBox(
+        data, on={"name": str, "width": int, "brightness": float}, engine=engine
+    )
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_count(engine):
+    lb = make_box(engine)
+    assert lb.count() == 5
+    assert lb.count("width >= 300") == 3
+    assert lb.count("name == ?", ("Luna",)) == 2
+    assert lb.count("width > 1000") == 0
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_exists(engine):
+    lb = make_box(engine)
+    assert lb.exists()
+    assert lb.exists("name == :n", {"n": "Elvis"})
+    assert not lb.exists("width > 1000")
+    assert not LiteBox(on={"x": int}, engine=engine).exists()
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_aggregate(engine):
+    lb = make_box(engine)
+    result = lb.aggregate(
+        "width >= ?",
+        {"n": "count(*)", "n_bright": "count(brightness)", "avg_b": "avg(brightness)"},
+        params=(200,),
+    )
+    assert result == {"n": 4, "n_bright": 3, "avg_b": pytest.approx(16 / 3)}
+    empty = lb.aggregate("width > 1000", {"n": "count(*)", "top": "max(width)"})
+    assert empty == {"n": 0, "top": None}
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_aggregate_group_by(engine):
+    lb = make_box(engine)
+    result = lb.aggregate(
+        None, {"total": "sum(width)", "lo": "min(brightness)"}, group_by="name"
+    )
+    assert result == {
+        "Elvis": {"total": 500, "lo": 8.0},
+        "Luna": {"total": 300, "lo": 1.0},
+        "Tiger": {"total": 700, "lo": 5.0},
+    }
+    by_two = lb.aggregate("width < 300", {"n": "count(*)"}, group_by=["name", "width"])
+    assert by_two == {("Luna", 100): {"n": 1}, ("Luna", 200): {"n": 1}}
+
+
+def test_columnar_unsupported_aggregate():
+    lb = make_box("columnar")
+    with AssertRaises(InvalidQueryError):
+        lb.aggregate(None, {"x": "total(width)"})
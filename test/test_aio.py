@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+
+from litebox import Q
+from litebox.aio import AsyncLiteBox
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def count_calls(box, name):
+    calls = []
+    method = getattr(box, name)
+
+    def wrapper(*args, **kwargs):
+        calls.append(args)
+        return method(*args, **kwargs)
+
+    setattr(box, name, wrapper)
+    return calls
+
+
+def test_find_and_count():
+    data = [{"x": i} for i in range(100)]
+
+    async def main():
+        async with AsyncLiteBox(data, on={"x": int}, index=["x"]) as abox:
+            assert len(await abox.find("x < ?", (10,))) == 10
+            assert len(await abox.find(Q.x >= 90)) == 10
+            assert await abox.count("x >= 50") == 50
+            assert await abox.exists("x = 99")
+            assert await abox.aggregate(None, {"m": "max(x)"}) == {"m": 99}
+            assert len(abox) == 100
+
+    run(main())
+
+
+def test_identical_finds_coalesce():
+    data = [{"x": i} for i in range(1000)]
+
+    async def main():
+        abox = AsyncLiteBox(data, on={"x": int})
+        calls = count_calls(abox.box, "find")
+        results = await asyncio.gather(
+            *[abox.find("x < ?", (5,)) for _ in range(10)],
+            abox.find("x < ?", (6,)),
+        )
+        assert len(calls) == 2
+        assert [len(r) for r in results] == [5] * 10 + [6]
+        assert results[0] is not results[1]  # each caller gets its own list
+        abox.close()
+
+    run(main())
+
+
+def test_find_after_write_does_not_coalesce():
+    async def main():
+        abox = AsyncLiteBox([{"x": 1}], on={"x": int})
+        before = abox.find("x > 0")
+        add = abox.add_many([{"x": 2}])
+        after = abox.find("x > 0")
+        found = await asyncio.gather(before, add, after)
+        assert len(found[0]) == 1
+        assert len(found[2]) == 2
+        abox.close()
+
+    run(main())
+
+
+def test_adds_in_one_tick_are_batched():
+    async def main():
+        abox = AsyncLiteBox(on={"x": int})
+        calls = count_calls(abox.box, "add_many")
+        await asyncio.gather(*[abox.add({"x": i}) for i in range(100)])
+        assert len(calls) == 1
+        await abox.add({"x": 100})
+        assert len(calls) == 2
+        assert await abox.count("x >= 0") == 101
+        abox.close()
+
+    run(main())
+
+
+def test_pending_adds_go_before_later_work():
+    async def main():
+        abox = AsyncLiteBox(on={"x": int})
+        obj = {"x": 1}
+        add = asyncio.ensure_future(abox.add(obj))
+        await asyncio.sleep(0)  # add() has queued obj, but not sent it yet
+        await abox.remove(obj)
+        await add
+        assert await abox.count() == 0
+        abox.close()
+
+    run(main())
+
+
+def test_find_iter():
+    data = [{"x": i} for i in range(25)]
+
+    async def main():
+        abox = AsyncLiteBox(data, on={"x": int})
+        found = [
+            d["x"] async for d in abox.find_iter("x >= 5", batch_size=4, order_by="x")
+        ]
+        assert found == list(range(5, 25))
+        abox.close()
+
+    run(main())
+
+
+def test_errors_propagate():
+    async def main():
+        abox = AsyncLiteBox(on={"x": int})
+        with pytest.raises(Exception):
+            await abox.find("nonexistent > 1")
+        assert await abox.find("x > 1") == []
+        abox.close()
+
+    run(main())
@@ -1,11 +1,13 @@
 import random
 
+from array import array
 from collections import namedtuple
 from dataclasses import dataclass
 
 import pytest
 
 from litebox.main import LiteBox
+from .conftest import ENGINES
 
 
 az = "qwertyuiopasdfghjklzxcvbnm"
@@ -105,6 +107,18 @@ def test_add_many():
     assert len(found) == len(ten_things)
 
 
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("key", [None, "i"])
+def test_add_many_generator(engine, key):
+    data = [{"i": i, "x": i % 3} for i in range(10)]
+    lb = LiteBox((d for d in data), on={"x": int}, engine=engine, key=key)
+    assert len(lb) == 10
+    more = [{"i": i, "x": 5} for i in range(10, 15)]
+    lb.add_many(d for d in more)
+    assert len(lb) == 15
+    assert sorted(d["i"] for d in lb.find("x == 5")) == [10, 11, 12, 13, 14]
+
+
 def test_parens_and_ors():
     things = [make_thing() for _ in range(10)]
     for i, t in enumerate(things):
@@ -181,3 +195,105 @@ def test_index_types(index):
     data = [{'a': 1, 'b': 2}, {'a': 3, 'b': 4}]
     lb = LiteBox(data, {'a': int, 'b': int}, index=index)
     assert lb.find("a == 1 and b == 2") == [data[0]]
+
+
+def test_find_positional_params():
+    things = [make_thing() for _ in range(10)]
+    for i, t in enumerate(things):
+        t.x = i
+    lb = LiteBox(things, on={"x": int, "s": str})
+    found = lb.find("x >= ? and x < ?", params=(3, 5))
+    assert sorted(found, key=lambda t: t.x) == things[3:5]
+    assert lb.find("s == ?", params=[things[7].s])[0].s == things[7].s
+
+
+def test_find_named_params():
+    things = [make_thing() for _ in range(10)]
+    for i, t in enumerate(things):
+        t.x = i
+    lb = LiteBox(things, on={"x": int})
+    found = lb.find("x >= :lo and x < :hi", params={"lo": 8, "hi": 100})
+    assert sorted(t.x for t in found) == [8, 9]
+
+
+def test_query_shape_cache():
+    things = [make_thing() for _ in range(10)]
+    lb = LiteBox(things, on={"x": int, "s": str})
+    for lo in range(10):
+        lb.find("x >=   ?", params=(lo,))
+        lb.find("x >= ?", params=(lo,))
+    assert len(lb._query_cache) == 1
+    # whitespace inside a literal is meaningful, so these are different shapes
+    lb.find("s == 'a  b'")
+    lb.find("s == 'a b'")
+    assert len(lb._query_cache) == 3
+
+
+def test_from_columns():
+    things = [make_thing() for _ in range(10)]
+    # Anything with a tolist() works, like NumPy arrays and pandas Series.
+    xs = array("q", range(10))
+    ys = [t.y for t in things]
+    lb = LiteBox.from_columns(things, columns={"x": xs, "y": ys})
+    assert lb.fields == {"x": int, "y": float}
+    assert lb.find("x >= 8") == things[8:]
+    assert lb.find(f"y == {things[3].y}") == [things[3]]
+
+
+def test_add_many_columns_with_repeats():
+    things = [make_thing() for _ in range(5)]
+    lb = LiteBox(things[:2], on={"x": int, "s": str})
+    batch = things + things[:1]
+    lb.add_many(batch, columns={"x": [10 + i for i in range(len(batch))]})
+    assert len(lb) == 5
+    assert len(lb.find("x >= 10")) == 3
+    assert lb.find("x == 12") == [things[2]]
+    # s is read from the obj.
+    assert lb.find(f"s == '{things[2].s}' and x >= 10") == [things[2]]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_update_many(engine):
+    things = [make_thing() for _ in range(10)]
+    for t in things:
+        t.x = 1
+    lb = LiteBox(things[:8], on={"x": int, "s": str}, engine=engine)
+    for t in things:
+        t.x = 2
+    missing = lb.update_many(things[5:])
+    assert missing == things[8:]
+    assert len(lb.find("x == 2")) == 3
+    assert len(lb.find("x == 1")) == 5
+    assert len(lb) == 8
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_remove_many(engine):
+    things = [make_thing() for _ in range(10)]
+    lb = LiteBox(things[:8], on={"x": int, "s": str}, engine=engine)
+    missing = lb.remove_many(things[4:] + things[4:5])
+    assert missing == things[8:]
+    assert len(lb) == 4
+    assert sorted(lb.find("x >= 0"), key=id) == sorted(things[:4], key=id)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_find_order_limit_offset(engine):
+    data = [{"a": i % 3, "b": i} for i in range(10)]
+    lb = LiteBox(data, on={"a": int, "b": int}, engine=engine)
+    assert [d["b"] for d in lb.find(order_by="b desc", limit=3)] == [9, 8, 7]
+    assert [d["b"] for d in lb.find("a == 1", order_by="b", offset=1)] == [4, 7]
+    found = lb.find("b >= :lo", {"lo": 2}, order_by="a desc, b", limit=4, offset=1)
+    assert [d["b"] for d in found] == [5, 8, 4, 7]
+    assert len(lb.find(limit=4)) == 4
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_find_iter(engine):
+    data = [{"a": i} for i in range(25)]
+    lb = LiteBox(data, on={"a": int}, engine=engine)
+    it = lb.find_iter("a >= ?", (5,), batch_size=7, order_by="a")
+    assert next(it) is data[5]
+    lb.remove(data[6])
+    assert [d["a"] for d in it] == list(range(7, 25))
+    assert len(list(lb.find_iter())) == 24
@@ -0,0 +1,213 @@
+import random
+
+import pytest
+
+from litebox.exceptions import InvalidEngineError, InvalidQueryError
+from litebox.main import LiteBox
+from .conftest import ENGINES, AssertRaises
+
+
+def make_dicts(n):
+    random.seed(0)
+    ds = []
+    for i in range(n):
+        ds.append(
+            {
+                "x": random.choice([None, 0, 1, 2, 3]),
+                "y": random.random(),
+                "s": random.choice(["a", "b", "it's", None]),
+                "b": random.choice([True, False]),
+            }
+        )
+    return ds
+
+
+QUERIES = [
+    ("x == 2", None),
+    ("x = 2 and y < 0.5", None),
+    ("x != 2", None),
+    ("x <> 2 or s == 'a'", None),
+    ("(x == 0 and y >= 0.25) or x == 3", None),
+    ("not (x < 2)", None),
+    ("x is null", None),
+    ("x is not null and s is null", None),
+    ("y between 0.2 and 0.4", None),
+    ("y not between 0.2 and 0.4", None),
+    ("x in (1, 3)", None),
+    ("x not in (1, 3)", None),
+    ("s == 'it''s'", None),
+    ('s == "a"', None),
+    ("b == True", None),
+    ("b == false and -1 < x", None),
+    ("0.5 <= y", None),
+    ("x >= ? and y < ?", (1, 0.5)),
+    ("x in (:a, :b) or s == :c", {"a": 0, "b": 2, "c": "b"}),
+]
+
+
+@pytest.mark.parametrize("where, params", QUERIES)
+@pytest.mark.parametrize("index", [None, [], [("x", "y")]])
+def test_matches_sqlite_engine(where, params, index):
+    ds = make_dicts(300)
+    on = {"x": int, "y": float, "s": str, "b": bool}
+    lb_sql = LiteBox(ds, on, index=index)
+    lb_col = LiteBox(ds, on, index=index, engine="columnar")
+    expected = sorted(id(d) for d in lb_sql.find(where, params))
+    assert sorted(id(d) for d in lb_col.find(where, params)) == expected
+
+
+AFFINITY_QUERIES = [
+    ("s = 1", None),
+    ("s > 5", None),
+    ("x > '5'", None),
+    ("x = ' 5.0 '", None),
+    ("x < 'abc'", None),
+    ("x >= 'abc'", None),
+    ("x between '2' and 4", None),
+    ("x in ('1', 2)", None),
+    ("s in (1, 'abc')", None),
+    ("s not in (1, 2)", None),
+    ("x > 5 and true", None),
+    ("x > 5 or 0", None),
+    ("not 1 or x = 1", None),
+    ("x >= ? and s != ?", ("3", 3)),
+    ("x < :v or s < :v", {"v": "abc"}),
+]
+
+
+@pytest.mark.parametrize("where, params", AFFINITY_QUERIES)
+@pytest.mark.parametrize("index", [None, ["x", "s"]])
+def test_literal_types_match_sqlite_engine(where, params, index):
+    ds = [{"x": i % 10, "s": str(i % 7)} for i in range(50)]
+    ds += [{"x": None, "s": "abc"}, {"x": 3, "s": None}]
+    on = {"x": int, "s": str}
+    lb_sql = LiteBox(ds, on, index=index)
+    lb_col = LiteBox(ds, on, index=index, engine="columnar")
+    expected = sorted(id(d) for d in lb_sql.find(where, params))
+    assert sorted(id(d) for d in lb_col.find(where, params)) == expected
+
+
+MIXED = [
+    {"id": 0, "x": 1, "s": "a"},
+    {"id": 1, "x": 2.5, "s": 1},
+    {"id": 2, "x": "7", "s": "b"},
+    {"id": 3, "x": "abc", "s": 2.0},
+    {"id": 4, "x": b"z", "s": b"y"},
+    {"id": 5, "x": None, "s": None},
+    {"id": 6, "x": 3, "s": "10"},
+]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("index", [None, []])
+@pytest.mark.parametrize("one_by_one", [False, True])
+def test_mixed_type_columns(engine, index, one_by_one):
+    # Values are stored as the field's type where they convert ('7' -> 7, 1 -> '1'), and
+    # the rest sort the way SQLite orders them: numbers, then text, then bytes.
+    objs = MIXED[:3] if one_by_one else MIXED
+    lb = LiteBox(objs, {"x": int, "s": str}, index=index, engine=engine)
+    lb.find("x = 1")  # builds the sorted indices, so the adds below maintain them
+    for d in MIXED[len(objs) :]:
+        lb.add(d)
+
+    def ids(where):
+        return sorted(d["id"] for d in lb.find(where))
+
+    assert ids("x > 2") == [1, 2, 3, 4, 6]
+    assert ids("x = 7") == [2]
+    assert ids("x < 'b'") == [0, 1, 2, 3, 6]
+    assert ids("x between 1 and 'abc'") == [0, 1, 2, 3, 6]
+    assert ids("s = '1'") == [1]
+    assert ids("s > 'a'") == [2, 4]
+    assert ids("s in (1, 2.0)") == [1, 3]
+    assert [d["id"] for d in lb.find(order_by="x")] == [5, 0, 1, 6, 2, 3, 4]
+    assert [d["id"] for d in lb.find(order_by="s DESC")] == [4, 2, 0, 3, 6, 1, 5]
+    assert lb.find("x > 5", columns=["x", "s"], order_by="x") == [
+        (7, "b"),
+        ("abc", "2.0"),
+        (b"z", b"y"),
+    ]
+    assert lb.aggregate(None, {"lo": "min(x)", "hi": "max(s)"}) == {
+        "lo": 1,
+        "hi": b"y",
+    }
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_failed_add_leaves_box_unchanged(engine):
+    def size(obj):
+        return obj["size"]
+
+    lb = LiteBox([{"size": 1}], on={size: int}, engine=engine)
+    bad = {}
+    with pytest.raises(KeyError):
+        lb.add(bad)
+    assert bad not in lb
+    assert len(lb) == 1
+    bad["size"] = 2
+    lb.add(bad)
+    assert lb.find("size = 2") == [bad]
+
+
+def test_columnar_failed_index_insert():
+    # Values that can't be ordered at all, such as dicts, fail to insert into the sorted index.
+    lb = LiteBox([{"x": {}}], on={"x": int}, engine="columnar")
+    lb.find("x = 1")
+    bad = {"x": {"a": 1}}
+    with pytest.raises(TypeError):
+        lb.add(bad)
+    assert bad not in lb
+    assert len(lb) == 1
+    one = {"x": 1}
+    lb.add(one)
+    assert lb.find("x = 1") == [one]
+
+
+def test_columnar_add_remove_update():
+    ds = make_dicts(50)
+    lb = LiteBox(on={"x": int, "y": float}, engine="columnar")
+    lb.add_many(ds[:25])
+    lb.find(
+        "x == 1"
+    )  # builds the sorted indices, so later changes maintain them in place
+    for d in ds[25:]:
+        lb.add(d)
+    for d in ds[:10]:
+        lb.remove(d)
+    ds[20]["x"] = 99
+    lb.update(ds[20])
+    assert lb.find("x == 99") == [ds[20]]
+    assert len(lb) == 40
+    expected = [d for d in ds[10:] if d["x"] == 1]
+    assert sorted(map(id, lb.find("x == 1"))) == sorted(map(id, expected))
+    assert sorted(map(id, lb.find("y >= 0"))) == sorted(map(id, ds[10:]))
+
+
+def test_columnar_callable_field():
+    def get_a1(obj):
+        return obj["a"][1]
+
+    data = [{"a": [1, 2, 3]}, {"a": [4, 5, 6]}]
+    lb = LiteBox(data, on={get_a1: int}, engine="columnar")
+    assert lb.find("get_a1 == 5") == [data[1]]
+
+
+def test_bad_engine():
+    with AssertRaises(InvalidEngineError):
+        LiteBox([], {"x": int}, engine="mysql")
+
+
+def test_columnar_unknown_field():
+    lb = LiteBox([], {"x": int}, engine="columnar")
+    with AssertRaises(InvalidQueryError):
+        lb.find("z == 1")
+
+
+def test_columnar_unsupported_syntax():
+    lb = LiteBox([], {"s": str}, engine="columnar")
+    with pytest.raises(InvalidQueryError, match="Unsupported SQL in query: LIKE"):
+        lb.find("s like 'a%'")
+    with pytest.raises(InvalidQueryError, match="Unsupported function in query: abs"):
+        lb.find("abs(s) > 1")
+    with pytest.raises(InvalidQueryError, match="Expected a comparison after 'a'"):
+        lb.find("s > 'a' and 'a'")
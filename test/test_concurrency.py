@@ -0,0 +1,126 @@
+import sys
+import threading
+
+import pytest
+
+from litebox import LiteBox, Q
+from litebox.concurrency import RWLock
+from litebox.tracking import tracked
+from .conftest import ENGINES
+
+
+def run_threads(target, n_threads):
+    errors = []
+
+    def run(i):
+        try:
+            target(i)
+        except Exception as e:  # surfaced in the main thread below
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n_threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+
+
+def test_rwlock_writer_excludes_readers():
+    lock = RWLock()
+    events = []
+    with lock.write():
+        with lock.write():  # re-entrant
+            with lock.read():  # the writer can read
+                pass
+        t = threading.Thread(target=lambda: lock.read().__enter__() or events.append(1))
+        t.start()
+        t.join(0.05)
+        assert events == []  # the reader is waiting on the writer
+    t.join(1)
+    assert events == [1]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_concurrent_reads_and_writes(engine):
+    data = [{"x": i, "y": i % 7} for i in range(5000)]
+    lb = LiteBox(data, on={"x": int, "y": int}, engine=engine, concurrent=True)
+    added = [{"x": -i - 1, "y": 0} for i in range(500)]
+
+    def work(i):
+        if i == 0:
+            for d in added:
+                lb.add(d)
+            lb.remove_many(data[:100])
+            return
+        for j in range(50):
+            found = lb.find("x >= ? and x < ?", (j * 100, j * 100 + 10))
+            assert all(j * 100 <= d["x"] < j * 100 + 10 for d in found)
+            assert lb.count(Q.y.isin(range(3, 50))) > 0
+
+    run_threads(work, 8)
+    assert len(lb) == 5000 + 500 - 100
+    assert len(lb.find("x < 0")) == 500
+    assert lb.find("x >= 0 and x < 100") == []
+
+
+def test_concurrent_threads_see_writes():
+    lb = LiteBox(on={"x": int}, concurrent=True)
+    seen = []
+    run_threads(lambda i: seen.append(lb.count("x >= 0")), 1)
+    lb.add_many([{"x": 1}, {"x": 2}])
+    run_threads(lambda i: seen.append(lb.count("x >= 0")), 1)
+    assert seen == [0, 2]
+
+
+def test_concurrent_find_iter():
+    data = [{"x": i} for i in range(10)]
+    lb = LiteBox(data, on={"x": int}, concurrent=True)
+    it = lb.find_iter("x < 5", order_by="x")
+    assert next(it)["x"] == 0
+    lb.remove(data[1])  # doesn't deadlock against the open iterator
+    assert [d["x"] for d in it] == [2, 3, 4]
+
+
+def test_concurrent_find_iter_batches():
+    data = [{"id": i, "x": i % 10} for i in range(100)]
+    lb = LiteBox(data, on={"x": int}, key="id", concurrent=True)
+    it = lb.find_iter("x < 5", batch_size=7)
+    assert next(it) is data[0]
+    # Later batches are separate queries, so they see objects added meanwhile.
+    new = {"id": 100, "x": 0}
+    lb.add(new)
+    rest = list(it)
+    assert len(rest) == 50
+    assert rest[-1] is new
+    found = [d["x"] for d in lb.find_iter("x < 5", batch_size=7, order_by="x desc")]
+    assert found == [4] * 10 + [3] * 10 + [2] * 10 + [1] * 10 + [0] * 11
+
+
+@tracked
+class Counter:
+    def __init__(self, n):
+        self.n = n
+
+
+def test_concurrent_tracked_changes():
+    objs = [Counter(0) for _ in range(200)]
+    lb = LiteBox(objs, on={"n": int}, track=True, concurrent=True)
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # switch threads often, to interleave marks and flushes
+
+    def work(i):
+        if i < 4:
+            # Writers change their own quarter of the objects while readers flush.
+            for n in range(1, 51):
+                for obj in objs[i::4]:
+                    obj.n = n
+        else:
+            for _ in range(100):
+                lb.count("n >= 0")
+
+    try:
+        run_threads(work, 8)
+    finally:
+        sys.setswitchinterval(interval)
+    assert lb.count("n == 50") == 200
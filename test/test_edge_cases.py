@@ -105,3 +105,23 @@ def test_empty():
     for _ in lb:
         # tests iterator. Should be empty, won't reach here
         assert False
+
+
+def test_add_many_mixed_object_kinds():
+    def double_x(obj):
+        return obj.get("x", 0) * 2 if isinstance(obj, dict) else obj.x * 2
+
+    objs = [Thing(x=1), {"x": 2, "y": 0.5}, Thing(x=3), {"y": 1.5}]
+    lb = LiteBox(objs, on={"x": int, "y": float, double_x: int})
+    assert lb.find("x == 2") == [objs[1]]
+    assert lb.find("x is null") == [objs[3]]
+    assert lb.find("double_x == 6") == [objs[2]]
+    # Thing has a y attribute, but the dicts might not
+    assert sorted(lb.find("y >= 0.5"), key=id) == sorted([objs[1], objs[3]], key=id)
+
+
+def test_add_many_missing_attributes():
+    things = [Thing(x=1), Thing(x=2)]
+    lb = LiteBox(things, on={"x": int, "z": str})
+    lb.add(Thing(x=3))
+    assert len(lb.find("z is null")) == 3
@@ -0,0 +1,147 @@
+import time
+
+import pytest
+
+from litebox import LiteBox
+from litebox.eviction import FIFO, EvictionPolicy
+from litebox.exceptions import (
+    InvalidEngineError,
+    InvalidEvictionError,
+    InvalidSnapshotError,
+)
+from .conftest import Item, ids
+
+
+@pytest.mark.parametrize("key", [None, "id"])
+def test_fifo(key):
+    items = [Item(i) for i in range(1000)]
+    lb = LiteBox(items[:100], {"x": int}, key=key, max_size=100, eviction="fifo")
+    assert len(lb) == 100
+    lb.add_many(items[100:150])
+    # evicts the 50 extra, plus 5% of max_size
+    assert ids(lb) == list(range(55, 150))
+    assert lb.count() == 95
+    for item in items[150:160]:
+        lb.add(item)
+    assert len(lb) <= 100
+    assert ids(lb)[-1] == 159
+    assert lb.count("x = 3") == len([i for i in ids(lb) if i % 10 == 3])
+
+
+@pytest.mark.parametrize("key", [None, "id"])
+def test_lru(key):
+    items = [Item(i) for i in range(200)]
+    lb = LiteBox(items[:100], {"x": int}, key=key, max_size=100)
+    found = lb.find("x = 0")  # ids 0, 10, 20, ...
+    assert len(found) == 10
+    lb.add_many(items[100:150])
+    kept = ids(lb)
+    assert all(i in kept for i in range(0, 100, 10))
+    assert 1 not in kept and 149 in kept
+    assert len(lb) == 95
+
+
+def test_lru_find_everything():
+    items = [Item(i) for i in range(100)]
+    lb = LiteBox(items, {"x": int}, max_size=100)
+    assert not lb._eviction.touched
+    assert len(lb.find()) == 100
+    # Finding everything uses everything, as any other find() would.
+    assert set(lb._eviction.touched) == set(map(id, items))
+
+
+def test_lru_with_finds_between_adds():
+    items = [Item(i) for i in range(300)]
+    lb = LiteBox(on={"x": int}, max_size=50)
+    for item in items:
+        lb.add(item)
+        lb.find("x = 7")
+    assert len(lb) <= 50
+    assert lb.count("x = 7") == len(lb.find("x = 7"))
+    # objects with x = 7 were found after every add, so they outlive older objects
+    assert len(lb.find("x = 7")) > 5
+
+
+def test_ttl():
+    lb = LiteBox([Item(i) for i in range(10)], {"x": int}, ttl=0.05)
+    assert lb.count() == 10
+    time.sleep(0.06)
+    lb.add_many([Item(i) for i in range(10, 15)])
+    assert lb.count() == 5
+    assert ids(lb) == list(range(10, 15))
+    time.sleep(0.06)
+    assert lb.find() == []
+    assert len(lb) == 0
+
+
+def test_ttl_with_max_size():
+    lb = LiteBox(
+        [Item(i) for i in range(10)], {"x": int}, max_size=5, ttl=60, eviction="fifo"
+    )
+    assert ids(lb) == [5, 6, 7, 8, 9]
+    assert lb._extra_cols == ["order__", "added__"]
+
+
+def test_upsert_restamps():
+    lb = LiteBox([Item(i) for i in range(5)], {"x": int}, key="id", ttl=0.05)
+    time.sleep(0.06)
+    lb.upsert(Item(0))
+    assert [obj.id for obj in lb.find()] == [0]
+
+
+def test_removed_objects():
+    items = [Item(i) for i in range(20)]
+    lb = LiteBox(items[:10], {"x": int}, key="id", max_size=10, eviction="fifo")
+    lb.remove_many(items[:5])
+    lb.add_many(items[10:16])
+    assert ids(lb) == list(range(6, 16))
+    assert lb.get(5) is None
+
+
+def test_custom_policy():
+    class ByScore(EvictionPolicy):
+        column = "score__"
+
+        def __init__(self):
+            self.score = 100
+
+        def stamp(self):
+            self.score -= 1  # newer objects are evicted first
+            return self.score
+
+    items = [Item(i) for i in range(20)]
+    lb = LiteBox(on={"x": int}, max_size=10, eviction=ByScore())
+    for item in items:
+        lb.add(item)
+    assert ids(lb)[:5] == [0, 1, 2, 3, 4]
+
+
+def test_errors():
+    with pytest.raises(InvalidEvictionError):
+        LiteBox(on={"x": int}, max_size=10, eviction="mru")
+    with pytest.raises(InvalidEngineError):
+        LiteBox(on={"x": int}, engine="columnar", ttl=1)
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_save_and_load(tmp_path, mmap):
+    path = str(tmp_path / "box.db")
+    items = [Item(i) for i in range(100)]
+    lb = LiteBox(items, {"x": int}, key="id", max_size=100)
+    lb.find("x = 0")
+    lb.save(path)
+    with pytest.raises(InvalidSnapshotError):
+        LiteBox.load(path, items, mmap=mmap)
+    loaded = LiteBox.load(path, items, mmap=mmap, max_size=100)
+    assert loaded._eviction.tick == lb._eviction.tick
+    loaded.add_many([Item(i) for i in range(100, 150)])
+    kept = ids(loaded)
+    assert len(kept) == 95
+    assert all(i in kept for i in range(0, 100, 10))
+    assert 1 not in kept
+
+
+def test_counter_stamps():
+    policy = FIFO()
+    assert list(policy.stamps(3)) == [1, 2, 3]
+    assert policy.stamp() == 4
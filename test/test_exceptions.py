@@ -1,4 +1,4 @@
-from litebox.exceptions import InvalidFields, NotInIndexError
+from litebox.exceptions import InvalidFields, NotInIndexError, FieldsTypeError
 from .conftest import AssertRaises
 from litebox.main import LiteBox
 
@@ -29,3 +29,13 @@ def test_bad_field_values():
     with AssertRaises(InvalidFields):
         LiteBox([], {'a': dict()})
 
+
+
+def test_misaligned_columns():
+    with AssertRaises(InvalidFields):
+        LiteBox.from_columns([1, 2, 3], columns={'a': [1, 2]})
+
+
+def test_uninferrable_column_type():
+    with AssertRaises(FieldsTypeError):
+        LiteBox.from_columns([1], columns={'a': [[1, 2]]})
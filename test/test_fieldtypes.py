@@ -0,0 +1,195 @@
+import sqlite3
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from enum import Enum
+
+import pytest
+
+from litebox import LiteBox, Q, RTree
+from litebox.exceptions import InvalidEngineError, InvalidFields
+from .conftest import ids, ids_where
+
+
+class Size(Enum):
+    SMALL = "s"
+    MEDIUM = "m"
+    LARGE = "l"
+
+
+RECORD_FIELDS = {
+    "created": datetime,
+    "day": date,
+    "size": Size,
+    "price": Decimal,
+    "blob": bytes,
+    "n": int,
+}
+START = datetime(2024, 1, 1)
+
+
+def make_records(n=100):
+    return [
+        {
+            "id": i,
+            "created": START + timedelta(hours=i),
+            "day": date(2024, 1, 1) + timedelta(days=i // 10),
+            "size": list(Size)[i % 3],
+            "price": Decimal("0.25") * i,
+            "blob": bytes([i]),
+            "n": i,
+        }
+        for i in range(n)
+    ]
+
+
+def test_datetime():
+    objs = make_records()
+    lb = LiteBox(objs, RECORD_FIELDS, index=["created"])
+    cutoff = START + timedelta(hours=50)
+    assert ids(lb.find("created >= ?", (cutoff,))) == list(range(50, 100))
+    assert ids(lb.find("created < :t", {"t": cutoff})) == list(range(50))
+    assert ids(lb.find(Q.created.between(cutoff, cutoff + timedelta(hours=2)))) == [
+        50,
+        51,
+        52,
+    ]
+    assert ids(lb.find(Q.created.isin([START, cutoff]))) == [0, 50]
+    # Aware datetimes are compared in UTC.
+    tz = timezone(timedelta(hours=2))
+    assert ids(lb.find(Q.created < cutoff.replace(tzinfo=tz))) == list(range(48))
+    assert lb.find(order_by="created DESC", limit=1) == [objs[-1]]
+
+
+def test_aware_datetimes_come_back_in_utc():
+    tz = timezone(timedelta(hours=-5))
+    obj = {"t": datetime(2024, 6, 1, 12, 30, 0, 123456, tzinfo=tz)}
+    lb = LiteBox([obj], {"t": datetime})
+    assert lb.find(columns=["t"]) == [(datetime(2024, 6, 1, 17, 30, 0, 123456),)]
+
+
+def test_date_enum_decimal_bytes():
+    objs = make_records()
+    lb = LiteBox(objs, RECORD_FIELDS)
+    assert ids(lb.find(Q.day == date(2024, 1, 3))) == list(range(20, 30))
+    assert ids(lb.find("size = ?", (Size.MEDIUM,))) == ids_where(
+        objs, lambda o: o["size"] is Size.MEDIUM
+    )
+    # Enum members sort in definition order.
+    assert ids(lb.find(Q.size > Size.SMALL)) == ids_where(
+        objs, lambda o: o["size"] is not Size.SMALL
+    )
+    assert ids(lb.find(Q.price >= Decimal("24.5"))) == [98, 99]
+    assert ids(lb.find(Q.blob == b"\x05")) == [5]
+    assert lb.find(order_by="size, n", limit=2) == [objs[0], objs[3]]
+
+
+def test_columns_decoded():
+    objs = make_records(10)
+    lb = LiteBox(objs, RECORD_FIELDS)
+    rows = lb.find(Q.n == 7, columns=["created", "day", "size", "price", "blob"])
+    o = objs[7]
+    assert rows == [(o["created"], o["day"], o["size"], o["price"], o["blob"])]
+
+
+def test_aggregate():
+    objs = make_records()
+    lb = LiteBox(objs, RECORD_FIELDS)
+    out = lb.aggregate(
+        None, {"first": "min(created)", "n": "count(*)"}, group_by="size"
+    )
+    assert set(out) == set(Size)
+    assert out[Size.LARGE] == {"first": objs[2]["created"], "n": 33}
+    out = lb.aggregate("n < 10", {"last": "MAX(day)", "total": "sum(n)"})
+    assert out == {"last": date(2024, 1, 1), "total": 45}
+
+
+def test_nulls():
+    objs = [{"created": None, "size": None, "price": None}, {}]
+    lb = LiteBox(objs, {"created": datetime, "size": Size, "price": Decimal})
+    assert lb.find(columns=["created", "size", "price"]) == [(None, None, None)] * 2
+    assert len(lb.find("created IS NULL")) == 2
+
+
+def test_rtree():
+    objs = make_records()
+    lb = LiteBox(objs, RECORD_FIELDS, index=[RTree("created", "price")])
+    where = Q.created.between(START, START + timedelta(hours=20)) & (
+        Q.price >= Decimal("2")
+    )
+    assert "rtree" in lb.explain(where)["sql"]
+    assert ids(lb.find(where)) == list(range(8, 21))
+    nearest = lb.find_nearest({"created": START, "price": Decimal("0")}, 1)
+    assert nearest == [objs[0]]
+
+
+@pytest.mark.parametrize("key", [None, "id"])
+def test_changes(key):
+    objs = make_records(10)
+    lb = LiteBox(objs, RECORD_FIELDS, key=key)
+    objs[0]["size"] = Size.LARGE
+    objs[0]["created"] = START - timedelta(days=1)
+    lb.update(objs[0])
+    assert lb.find(Q.created < START) == [objs[0]]
+    assert objs[0] in lb.find(Q.size == Size.LARGE)
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        dict(strict=True),
+        dict(without_rowid=True),
+        dict(strict=True, without_rowid=True),
+    ],
+)
+def test_table_options(options):
+    objs = make_records()
+    lb = LiteBox(objs, {**RECORD_FIELDS, "name": str}, index=["n"], key="id", **options)
+    assert ids(lb.find(Q.created >= START + timedelta(hours=90))) == list(
+        range(90, 100)
+    )
+    lb.remove(objs[0])
+    lb.add(objs[0])
+    assert len(lb) == 100
+    sql = lb.conn.execute(
+        "SELECT sql FROM sqlite_master WHERE name = ?", (lb.table_name,)
+    ).fetchone()[0]
+    assert ("STRICT" in sql) == options.get("strict", False)
+    assert ("WITHOUT ROWID" in sql) == options.get("without_rowid", False)
+
+
+def test_strict_rejects_wrong_types():
+    lb = LiteBox(on={"n": int}, strict=True)
+    lb.add({"n": 1})
+    with pytest.raises(sqlite3.IntegrityError):
+        lb.add({"n": "one"})
+    # Without strict, SQLite stores the str as it is.
+    LiteBox([{"n": "one"}], {"n": int})
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / "types.db")
+    objs = make_records()
+    on = {k: v for k, v in RECORD_FIELDS.items() if k != "size"}
+    LiteBox(objs, on, key="id", strict=True).save(path)
+    loaded = LiteBox.load(path, objs)
+    assert loaded.fields == on
+    assert loaded.strict
+    assert ids(loaded.find(Q.day == date(2024, 1, 2))) == list(range(10, 20))
+    # Enums aren't saved by name, so they are passed to load().
+    LiteBox(objs, RECORD_FIELDS, key="id").save(path)
+    with pytest.raises(InvalidFields):
+        LiteBox.load(path, objs)
+    loaded = LiteBox.load(path, objs, on=RECORD_FIELDS)
+    assert ids(loaded.find(Q.size == Size.SMALL)) == list(range(0, 100, 3))
+
+
+def test_errors():
+    with pytest.raises(InvalidEngineError):
+        LiteBox(make_records(), RECORD_FIELDS, engine="columnar")
+    with pytest.raises(InvalidEngineError):
+        LiteBox(make_records(), {"n": int}, engine="columnar", strict=True)
+    with pytest.raises(InvalidFields):
+        LiteBox(on={"t": timedelta})
+    # bytes need no conversion, so the columnar engine takes them.
+    lb = LiteBox(make_records(), {"blob": bytes, "n": int}, engine="columnar")
+    assert len(lb.find(Q.n < 5)) == 5
@@ -0,0 +1,158 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import List
+
+import pytest
+
+from litebox import LiteBox, Q, RTree, tracked
+from litebox.concurrency import IndexBuilder
+from litebox.exceptions import InvalidEngineError, InvalidFields
+from .conftest import ON, ids, make_data
+
+
+def index_names(lb):
+    rows = lb.conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ?",
+        (lb.table_name,),
+    )
+    return sorted(name for name, in rows)
+
+
+def test_defer_indices():
+    lb = LiteBox(make_data(0, 20000), ON, index=["s", ("x", "s")], defer_indices=True)
+    names = index_names(lb)
+    lb.add_many(make_data(20000, 50000))
+    assert index_names(lb) == names
+    assert len(lb) == 50000
+    assert ids(lb.find("x = 5")) == [i for i in range(50000) if i % 10 == 5]
+    assert ids(lb.find("s = '40000'")) == [40000]
+    assert "idx_s" in " ".join(lb.explain("s = '40000'")["plan"])
+    # Small batches keep the indices.
+    lb.add_many(make_data(50000, 50010))
+    assert index_names(lb) == names
+    assert lb.count("x = 5") == 5001
+
+
+def test_defer_indices_restores_on_error():
+    lb = LiteBox(make_data(0, 20000), ON, key="id", strict=True, defer_indices=True)
+    names = index_names(lb)
+    bad = make_data(20000, 50000)
+    bad[-1]["x"] = "big"
+    with pytest.raises(Exception):
+        lb.add_many(bad)
+    assert index_names(lb) == names
+
+
+@pytest.mark.parametrize("concurrent", [False, True])
+def test_background_indices(concurrent):
+    lb = LiteBox(
+        make_data(0, 20000),
+        {**ON, "id": int},
+        index=["s", ("x", "s"), RTree("x", "id")],
+        background_indices=True,
+        concurrent=concurrent,
+    )
+    # Queries work while the indices are being built, by scanning.
+    assert ids(lb.find(Q.s == "5")) == [5]
+    assert lb.rtrees == {"x_id": ("x", "id")}
+    assert lb.wait_for_indices()
+    assert lb.indices == {"s": ("s",), "x_s": ("x", "s")}
+    assert "idx_s" in " ".join(lb.explain("s = '5'")["plan"])
+    assert lb._index_builder is None
+
+
+def test_background_writes_wait():
+    lb = LiteBox(make_data(0, 20000), ON, background_indices=True)
+    lb.add({"id": -1, "x": 5, "s": "new"})
+    assert lb.indices == {"x": ("x",), "s": ("s",)}
+    assert lb.count("x = 5") == 2001
+
+
+def test_background_queries_from_threads():
+    lb = LiteBox(make_data(0, 20000), ON, background_indices=True, concurrent=True)
+    counts = []
+
+    def query():
+        counts.append(lb.count("x < 1"))
+
+    threads = [threading.Thread(target=query) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert counts == [2000] * 4
+    lb.wait_for_indices()
+    assert lb.count("x < 1") == 2000
+
+
+@tracked
+@dataclass
+class Item:
+    id: int
+    size: int
+
+
+@pytest.fixture
+def release(monkeypatch):
+    """Hold background builds open until the test sets the returned event."""
+    event = threading.Event()
+    run = IndexBuilder.run
+
+    def held_run(builder):
+        event.wait(timeout=5)
+        run(builder)
+
+    monkeypatch.setattr(IndexBuilder, "run", held_run)
+    return event
+
+
+def test_background_tracked_changes(release):
+    items = [Item(i, i % 10) for i in range(100)]
+    lb = LiteBox(items, {"size": int}, background_indices=True, track=True)
+    items[0].size = 100
+    # Queries see the change during the build, and it isn't lost when the indexed copy is used.
+    assert lb.find("size = 100") == [items[0]]
+    assert lb._index_builder.is_alive()
+    release.set()
+    assert lb.wait_for_indices()
+    assert lb.find("size = 100") == [items[0]]
+    assert lb.count("size = 0") == 9
+
+
+def test_background_expiry(release):
+    lb = LiteBox(make_data(), ON, background_indices=True, ttl=0.05)
+    time.sleep(0.1)
+    assert lb.count("x < 10") == 0
+    assert lb._index_builder.is_alive()
+    release.set()
+    assert lb.wait_for_indices()
+    assert lb.count("x < 10") == 0
+    assert len(lb) == 0
+
+
+def test_background_auto_index_doesnt_wait(release):
+    lb = LiteBox(make_data(), ON, background_indices=True, auto_index=True)
+    for i in range(200):
+        lb.find(Q.s == str(i))
+    assert lb._index_builder.is_alive()
+    release.set()
+    assert lb.wait_for_indices()
+
+
+def test_background_nothing_to_build():
+    lb = LiteBox(make_data(), ON, index=[], background_indices=True)
+    assert lb._index_builder is None
+    assert lb.wait_for_indices(timeout=0)
+
+
+def test_errors():
+    with pytest.raises(InvalidEngineError):
+        LiteBox(make_data(0, 10), ON, engine="columnar", background_indices=True)
+    with pytest.raises(InvalidFields):
+        LiteBox(
+            [{"tags": ["a"]}],
+            {"tags": List[str]},
+            index=["tags"],
+            background_indices=True,
+        )
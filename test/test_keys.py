@@ -0,0 +1,108 @@
+import pytest
+
+from litebox import LiteBox, tracked
+from litebox.exceptions import KeyNotSetError, NotInIndexError
+from .conftest import ENGINES, ON, AssertRaises, make_data
+
+
+def test_key_identity():
+    data = make_data()
+    lb = LiteBox(data, ON, key="id")
+    copy = dict(data[3])
+    assert copy in lb  # same key, different object
+    lb.add(copy)  # already have that key
+    assert len(lb) == 100
+    assert lb.find("s = '3'")[0] is data[3]
+
+    copy["x"] = 99
+    lb.update(copy)  # replaces the stored object
+    assert lb.find("x = 99") == [copy]
+    lb.remove(data[3])
+    assert copy not in lb
+    assert lb.remove_many([data[4], {"id": -5}]) == [{"id": -5}]
+    assert len(lb) == 98
+
+
+def test_key_add_many_first_wins():
+    a = {"id": 1, "x": 1, "s": "a"}
+    b = {"id": 1, "x": 2, "s": "b"}
+    lb = LiteBox([a, b], ON, key="id")
+    assert len(lb) == 1
+    assert lb.find("x > 0") == [a]
+
+
+def test_key_callable():
+    data = make_data()
+    lb = LiteBox(data, ON, key=lambda d: (d["id"] * 7) % 1000)
+    assert len(lb.find("x = 1")) == 10
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_get_and_remove_key(engine):
+    data = make_data()
+    lb = LiteBox(data, ON, key="id", engine=engine)
+    assert lb.get(5) is data[5]
+    assert lb.get(500) is None
+    assert lb.get(500, "missing") == "missing"
+    lb.remove_key(5)
+    assert lb.get(5) is None
+    assert lb.find("s = '5'") == []
+    with AssertRaises(NotInIndexError):
+        lb.remove_key(5)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_upsert_many(engine):
+    data = make_data()
+    lb = LiteBox(data, ON, key="id", engine=engine)
+    changes = [
+        {"id": 1, "x": 50, "s": "changed"},
+        {"id": 200, "x": 50, "s": "new"},
+        {"id": 1, "x": 51, "s": "changed again"},  # last one wins
+    ]
+    lb.upsert_many(changes)
+    assert len(lb) == 101
+    assert lb.get(1) is changes[2]
+    assert lb.get(200) is changes[1]
+    assert {d["id"] for d in lb.find("x >= 50")} == {1, 200}
+    assert lb.find("s = '1'") == []
+    lb.upsert({"id": 200, "x": 0, "s": "200"})
+    assert lb.find("x >= 50") == [changes[2]]
+    assert len(lb.find("x = 0")) == 11
+
+
+def test_upsert_keeps_row_ids():
+    lb = LiteBox(make_data(), ON, key="id")
+    ptr = lb._key_ptrs[3]
+    lb.upsert_many([{"id": 3, "x": 7, "s": "three"}])
+    assert lb._key_ptrs[3] == ptr
+    # Removed keys don't give their row ids to new objects.
+    lb.remove_key(3)
+    lb.upsert({"id": 3, "x": 7, "s": "three"})
+    assert lb._key_ptrs[3] > ptr
+
+
+def test_upsert_tracked():
+    @tracked
+    class Item:
+        def __init__(self, id, x):
+            self.id = id
+            self.x = x
+
+    old, new = Item(1, 1), Item(1, 2)
+    lb = LiteBox([old], {"x": int}, key="id", track=True)
+    lb.upsert(new)
+    old.x = 100  # no longer in the box, so ignored
+    new.x = 3
+    assert lb.find("x = 3") == [new]
+    assert lb.find("x = 100") == []
+
+
+def test_key_methods_need_key():
+    lb = LiteBox(make_data(), ON)
+    with AssertRaises(KeyNotSetError):
+        lb.get(1)
+    with AssertRaises(KeyNotSetError):
+        lb.remove_key(1)
+    with AssertRaises(KeyNotSetError):
+        lb.upsert_many(make_data())
@@ -0,0 +1,190 @@
+import gc
+import sys
+from typing import List, Set
+
+import pytest
+
+from litebox import LiteBox, Q, tracked
+from litebox.exceptions import InvalidEngineError, InvalidFields
+from .conftest import ids, ids_where
+
+
+class Photo:
+    def __init__(self, i, tags):
+        self.id = i
+        self.tags = tags
+        self.size = i % 10
+
+
+PHOTO_FIELDS = {"tags": List[str], "size": int}
+
+
+def make_photos(n=100):
+    names = ["cat", "dog", "bird", "fish"]
+    return [Photo(i, [names[i % 4], names[i % 3]]) for i in range(n)]
+
+
+def test_contains():
+    photos = make_photos()
+    lb = LiteBox(photos, PHOTO_FIELDS)
+    assert ids(lb.find(Q.tags.contains("cat"))) == ids_where(
+        photos, lambda p: "cat" in p.tags
+    )
+    assert ids(lb.find(Q.tags.contains_any(["cat", "fish"]))) == ids_where(
+        photos, lambda p: "cat" in p.tags or "fish" in p.tags
+    )
+    assert ids(lb.find(Q.tags.contains_all(["cat", "dog"]))) == ids_where(
+        photos, lambda p: "cat" in p.tags and "dog" in p.tags
+    )
+    assert ids(lb.find(~Q.tags.contains("cat") & (Q.size < 5))) == ids_where(
+        photos, lambda p: "cat" not in p.tags and p.size < 5
+    )
+    assert lb.count(Q.tags.contains("bird") | (Q.size == 0)) == len(
+        ids_where(photos, lambda p: "bird" in p.tags or p.size == 0)
+    )
+    # Repeated tags count once; contains_all of nothing matches any tags list.
+    assert lb.count(Q.tags.contains_all(["cat", "cat"])) == lb.count(
+        Q.tags.contains("cat")
+    )
+    assert lb.count(Q.tags.contains_all([])) == 100
+    assert lb.count(Q.tags.contains_any([])) == 0
+
+
+def test_contains_all_nothing_needs_the_field():
+    photos = [Photo(0, ["cat"]), Photo(1, []), Photo(2, None)]
+    lb = LiteBox(photos, PHOTO_FIELDS)
+    assert ids(lb.find(Q.tags.contains_all([]))) == [0, 1]
+    assert ids(lb.find(~Q.tags.contains_all([]))) == [2]
+
+
+def test_long_value_lists():
+    photos = [Photo(i, [f"t{i}"]) for i in range(100)]
+    lb = LiteBox(photos, PHOTO_FIELDS)
+    wanted = [f"t{i}" for i in range(0, 100, 2)]
+    assert len(lb.find(Q.tags.contains_any(wanted))) == 50
+    assert len(lb.find(Q.tags.contains_all(wanted))) == 0
+
+
+def test_set_of_ints():
+    objs = [{"nums": {i, i + 1}, "x": i} for i in range(20)]
+    lb = LiteBox(objs, {"nums": Set[int], "x": int})
+    assert sorted(o["x"] for o in lb.find(Q.nums.contains(5))) == [4, 5]
+    assert lb.find(Q.nums.contains_all([5, 6]))[0]["x"] == 5
+
+
+@pytest.mark.skipif(sys.version_info < (3, 9), reason="needs builtin generics")
+def test_builtin_generics():
+    photos = make_photos()
+    lb = LiteBox(photos, {"tags": list[str], "size": int})
+    assert ids(lb.find(Q.tags.contains("cat"))) == ids_where(
+        photos, lambda p: "cat" in p.tags
+    )
+
+
+def test_missing_and_scalar_values():
+    objs = [{"tags": None}, {"tags": []}, {"tags": "solo"}, {}]
+    lb = LiteBox(objs, {"tags": List[str]})
+    assert lb.find(Q.tags.contains("solo")) == [objs[2]]
+    assert lb.count(~Q.tags.contains("solo")) == 3
+
+
+@pytest.mark.parametrize("key", [None, "id"])
+def test_changes(key):
+    photos = make_photos()
+    lb = LiteBox(photos, PHOTO_FIELDS, key=key)
+    photos[0].tags = ["zebra"]
+    lb.update(photos[0])
+    photos[1].tags = ["zebra", "cat"]
+    photos[2].tags = []
+    lb.update_many(photos[1:3])
+    assert ids(lb.find(Q.tags.contains("zebra"))) == [0, 1]
+    assert photos[2] not in lb.find(Q.tags.contains_any(["cat", "dog", "bird"]))
+    lb.remove(photos[1])
+    lb.remove_many(photos[3:5])
+    assert ids(lb.find(Q.tags.contains("zebra"))) == [0]
+    assert lb.conn.execute("SELECT count(*) FROM values_tags__").fetchone()[0] == sum(
+        len(set(p.tags)) for p in lb
+    )
+    if key is not None:
+        lb.upsert(Photo(0, ["yak"]))
+        assert ids(lb.find(Q.tags.contains("yak"))) == [0]
+        assert lb.find(Q.tags.contains("zebra")) == []
+
+
+def test_tracked():
+    @tracked
+    class Item:
+        def __init__(self, tags):
+            self.tags = tags
+
+    items = [Item(["a"]), Item(["b"])]
+    lb = LiteBox(items, {"tags": List[str]}, track=True)
+    items[0].tags = ["b", "c"]
+    assert len(lb.find(Q.tags.contains("b"))) == 2
+
+
+def test_weak_id_reuse():
+    lb = LiteBox(on={"tags": List[str]}, weak=True)
+    for i in range(50):
+        # Each Photo dies at once, so the next one may reuse its id.
+        lb.add(Photo(i, [f"t{i}"]))
+    keep = Photo(99, ["kept"])
+    lb.add(keep)
+    gc.collect()
+    assert lb.find(Q.tags.contains("kept")) == [keep]
+    assert lb.conn.execute("SELECT count(*) FROM values_tags__").fetchone()[0] == 1
+
+
+def test_eviction():
+    photos = make_photos()
+    lb = LiteBox(photos, PHOTO_FIELDS, max_size=10, eviction="fifo")
+    assert lb.count(Q.tags.contains_any(["cat", "dog", "bird", "fish"])) == len(lb)
+    n_values = lb.conn.execute("SELECT count(*) FROM values_tags__").fetchone()[0]
+    assert n_values == sum(len(set(p.tags)) for p in lb)
+
+
+def test_planned_queries():
+    # Big enough for the planner to sample.
+    photos = make_photos(10000)
+    lb = LiteBox(photos, PHOTO_FIELDS)
+    for _ in range(3):
+        assert lb.count(Q.tags.contains("cat")) == 5000
+        assert len(lb.find(Q.tags.contains("cat") & (Q.size == 1))) == len(
+            ids_where(photos, lambda p: "cat" in p.tags and p.size == 1)
+        )
+    plan = lb.explain(Q.tags.contains("fish"))
+    assert any("values_tags__" in step for step in plan["plan"])
+
+
+def test_columns():
+    photos = make_photos()
+    lb = LiteBox(photos, PHOTO_FIELDS)
+    rows = lb.find(Q.size == 0, columns=["tags", "size"])
+    assert sorted(rows) == sorted((p.tags, 0) for p in photos if p.size == 0)
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / "photos.db")
+    photos = make_photos()
+    lb = LiteBox(photos, PHOTO_FIELDS, key="id")
+    lb.save(path)
+    loaded = LiteBox.load(path, photos[10:], mmap=False)
+    assert loaded.fields == {"tags": List[str], "size": int}
+    assert ids(loaded.find(Q.tags.contains("cat"))) == ids_where(
+        photos[10:], lambda p: "cat" in p.tags
+    )
+    loaded = LiteBox.load(path, photos, on=PHOTO_FIELDS, key="id")
+    loaded.add(Photo(1000, ["new"]))
+    assert ids(loaded.find(Q.tags.contains("new"))) == [1000]
+
+
+def test_errors():
+    with pytest.raises(InvalidEngineError):
+        LiteBox(make_photos(), PHOTO_FIELDS, engine="columnar")
+    with pytest.raises(InvalidFields):
+        LiteBox(make_photos(), PHOTO_FIELDS, index=["tags"])
+    with pytest.raises(InvalidFields):
+        LiteBox(on={"tags": List[dict]})
+    lb = LiteBox(make_photos(), PHOTO_FIELDS)
+    with pytest.raises(InvalidFields):
+        lb.create_index(("size", "tags"))
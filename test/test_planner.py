@@ -0,0 +1,99 @@
+from litebox.exceptions import InvalidEngineError
+from litebox.main import LiteBox
+from litebox.planner import MIN_PLANNED_ROWS
+from .conftest import AssertRaises
+
+N = 2 * MIN_PLANNED_ROWS
+
+
+def make_box(**kwargs):
+    data = [{"x": i, "half": i % 2} for i in range(N)]
+    return LiteBox(data, on={"x": int, "half": int}, **kwargs)
+
+
+def test_planner_results():
+    lb = make_box()
+    narrow = lb.find("x < ?", (10,))
+    assert sorted(d["x"] for d in narrow) == list(range(10))
+    broad = lb.find("half == 0")
+    assert len(broad) == N // 2
+    assert all(d["half"] == 0 for d in broad)
+
+
+def test_explain_narrow_uses_index():
+    lb = make_box()
+    ex = lb.explain("x == ?", (5,))
+    assert ex["use_index"]
+    assert ex["estimate_source"] == "sample"
+    assert ex["rows"] == N
+    assert ex["estimated_rows"] < ex["threshold"]
+    assert any("idx_x" in step for step in ex["plan"])
+    assert ex["history"] is None
+
+
+def test_explain_broad_uses_scan():
+    lb = make_box()
+    ex = lb.explain("half == :h", {"h": 1})
+    assert not ex["use_index"]
+    assert "NOT INDEXED" in ex["sql"]
+    assert ex["estimated_rows"] > ex["threshold"]
+
+
+def test_count_and_exists_are_planned():
+    lb = make_box()
+    run = []
+    lb.conn.set_trace_callback(run.append)
+    assert lb.count("half == 0") == N // 2
+    assert lb.exists("half == 1")
+    assert lb.count("x < ?", (10,)) == 10
+    lb.conn.set_trace_callback(None)
+    queries = [sql for sql in run if f"FROM {lb.table_name} " in sql]
+    assert len(queries) == 3
+    assert "NOT INDEXED" in queries[0]
+    assert "NOT INDEXED" in queries[1]
+    assert "NOT INDEXED" not in queries[2]
+
+
+def test_history():
+    lb = make_box()
+    for i in range(3):
+        lb.find("x > ?", (i,))
+    history = lb.explain("x > ?", (0,))["history"]
+    assert history["runs"] == 3
+    assert history["index_runs"] == 0
+    assert history["last_rows"] == N - 3
+    # Far from the threshold, so later runs can decide from history alone
+    assert lb.explain("x > ?", (0,))["estimate_source"] == "history"
+
+
+def test_no_indices():
+    lb = make_box(index=[])
+    assert lb.indices == dict()
+    ex = lb.explain("x == 5")
+    assert not ex["use_index"]
+    assert ex["estimate_source"] == "no index"
+    assert len(lb.find("x == 5")) == 1
+
+
+def test_small_table():
+    lb = LiteBox([{"x": 1}], on={"x": int})
+    assert lb.indices == {"x": ("x",)}
+    ex = lb.explain("x == 1")
+    assert ex["use_index"]
+    assert ex["estimate_source"] == "small table"
+
+
+def test_sample_refresh():
+    lb = make_box()
+    assert lb.explain("x >= ?", (N,))["estimated_rows"] == 0
+    lb.add_many([{"x": N + i, "half": 0} for i in range(N)])
+    ex = lb.explain("x >= ?", (N,))
+    assert ex["rows"] == 2 * N
+    assert ex["estimated_rows"] > 0
+    assert len(lb.find("x >= ?", (N,))) == N
+
+
+def test_explain_columnar():
+    lb = LiteBox([{"x": 1}], on={"x": int}, engine="columnar")
+    with AssertRaises(InvalidEngineError):
+        lb.explain("x == 1")
@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+from litebox import LiteBox, Q
+from litebox.aio import AsyncLiteBox
+from litebox.exceptions import InvalidQueryError
+from .conftest import ENGINES, ON, make_data
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_columns(engine):
+    objs = make_data()
+    lb = LiteBox(objs, ON, engine=engine)
+    rows = lb.find("x = 3", columns=["x", "s"])
+    expected = [(o["x"], o["s"]) for o in objs if o["x"] == 3]
+    assert sorted(rows) == sorted(expected)
+    assert lb.find(Q.x == 3, columns=["s"]) == [(o["s"],) for o in lb.find(Q.x == 3)]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_columns_paged(engine):
+    lb = LiteBox(make_data(), ON, engine=engine)
+    rows = lb.find("x > 2", columns=["s", "x"], order_by="s desc", limit=3)
+    assert rows == [("99", 9), ("98", 8), ("97", 7)]
+    assert len(lb.find(columns=["x"])) == 100
+    assert lb.find(columns="x", limit=2, order_by="s") == [(0,), (1,)]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("key", [None, "id"])
+def test_find_ids(engine, key):
+    objs = make_data()
+    lb = LiteBox(objs, ON, engine=engine, key=key)
+    ids = lb.find_ids("x = 0")
+    assert len(ids) == 10
+    if key is None:
+        assert sorted(ids) == sorted(id(o) for o in objs if o["x"] == 0)
+    first_two = [objs[0], objs[10]]  # s is "0", then "10"
+    expected = [id(o) for o in first_two] if key is None else [1, 11]
+    assert lb.find_ids("x = 0", order_by="s", limit=2) == expected
+    assert len(lb.find_ids()) == 100
+
+
+def test_index_only_plan():
+    lb = LiteBox(make_data(), ON, index=[("x", "s")])
+    sql = lb._compile_query("x = ?", False, None, "x,s")[0]
+    plan = lb.conn.execute("EXPLAIN QUERY PLAN " + sql, (3,)).fetchall()
+    assert "COVERING INDEX" in plan[0][-1]
+
+
+def test_errors():
+    lb = LiteBox(make_data(), ON)
+    with pytest.raises(InvalidQueryError):
+        lb.find("x = 3", columns=["depth"])
+    with pytest.raises(InvalidQueryError):
+        lb.find("x = 3", columns=[])
+    with pytest.raises(InvalidQueryError):
+        lb.find("x = 3", arrays=True)
+
+
+def test_arrays():
+    np = pytest.importorskip("numpy")
+    lb = LiteBox(make_data(), ON)
+    arrs = lb.find("x = 3", columns=["x", "s"], arrays=True)
+    assert isinstance(arrs["x"], np.ndarray)
+    assert (arrs["x"] == 3).all()
+    assert len(arrs["s"]) == 10
+
+
+def test_lru_touch():
+    lb = LiteBox(make_data(), ON, max_size=100)
+    lb.find("x = 0", columns=["s"])
+    lb.add_many(make_data(100, 110))
+    kept = lb.find(columns=["x"])
+    assert kept.count((0,)) == 11  # the 10 found, and 1 of the 10 added
+
+
+def test_async():
+    async def run():
+        async with AsyncLiteBox(make_data(), ON) as alb:
+            a, b = await asyncio.gather(
+                alb.find("x = 1", columns=["s"]),
+                alb.find("x = 1", columns=["s"]),
+            )
+            assert a == b and len(a) == 10
+            assert len(await alb.find_ids("x = 1")) == 10
+
+    asyncio.run(run())
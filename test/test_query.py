@@ -0,0 +1,97 @@
+import pytest
+
+from litebox import LiteBox, Q
+from litebox.exceptions import InvalidQueryError
+from litebox.query import ISIN_MAX_PARAMS, to_sql
+from .conftest import ENGINES, AssertRaises, make_abc
+
+
+def make_box(engine, **kwargs):
+    data = make_abc(200)
+    data.append({"a": None, "b": None, "c": None})
+    return LiteBox(data, on={"a": int, "b": int, "c": str}, engine=engine, **kwargs)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize(
+    "expr, where",
+    [
+        (Q.a == 1, "a == 1"),
+        ((Q.a == 1) & (Q.b < 50), "a == 1 and b < 50"),
+        ((Q.c == "1") | Q.b.between(3, 5), "c == '1' or b between 3 and 5"),
+        (~((Q.a > 2) | (Q.b >= 100)), "not (a > 2 or b >= 100)"),
+        (Q.a.isin([1, 2]), "a in (1, 2)"),
+        (Q.a.notin([1, 2]), "a not in (1, 2)"),
+        (Q.a == None, "a is null"),
+        (Q("b") != None, "b is not null"),
+    ],
+)
+def test_q_matches_string(engine, expr, where):
+    lb = make_box(engine)
+    found = lb.find(expr)
+    assert len(found) == len(set(map(id, found)))
+    assert set(map(id, found)) == set(map(id, lb.find(where)))
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_q_long_isin(engine):
+    lb = make_box(engine)
+    values = list(range(0, 2 * ISIN_MAX_PARAMS, 2))
+    found = lb.find(Q.b.isin(values) & (Q.a < 5))
+    assert sorted(d["b"] for d in found) == [v for v in values if v % 10 < 5]
+    # The temp table is refilled for each query
+    assert len(lb.find(Q.b.isin(range(ISIN_MAX_PARAMS + 1)))) == ISIN_MAX_PARAMS + 1
+    assert len(lb.find(Q.b.notin(range(ISIN_MAX_PARAMS + 1)))) == 200 - 33
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_q_long_isin_find_iter(engine):
+    lb = make_box(engine)
+    values = list(range(0, 2 * ISIN_MAX_PARAMS + 2, 2))
+    found = []
+    for d in lb.find_iter(Q.b.isin(values), batch_size=5):
+        found.append(d["b"])
+        # Another long isin() mid-iteration doesn't change what's left to yield.
+        lb.find(Q.b.isin(range(100, 100 + ISIN_MAX_PARAMS + 1)))
+    assert sorted(found) == values
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_q_other_methods(engine):
+    lb = make_box(engine)
+    assert lb.count(Q.a == 1) == 20
+    assert lb.exists(Q.b == 199)
+    assert not lb.exists(Q.b > 1000)
+    assert lb.aggregate(Q.a == 1, {"n": "count(*)"}) == {"n": 20}
+    assert [d["b"] for d in lb.find_iter(Q.b < 3, order_by="b")] == [0, 1, 2]
+    assert [d["b"] for d in lb.find(Q.a == 1, order_by="b desc", limit=2)] == [191, 181]
+
+
+def test_q_canonical_sql():
+    sql1, args1, _ = to_sql((Q.a == 1) & (Q.b < 50) & (Q.c == "x"))
+    sql2, args2, _ = to_sql((Q.c == "y") & ((Q.b < 7) & (Q.a == 2)))
+    assert sql1 == sql2
+    assert args1 == [1, 50, "x"]
+    assert args2 == [2, 7, "y"]
+
+
+def test_q_index_choice():
+    lb = make_box("sqlite", index=["a", "b", ("a", "b")])
+    assert "INDEXED BY idx_a_b" in lb.explain((Q.b < 50) & (Q.a == 1))["sql"]
+    # Ties are left to SQLite
+    lb.drop_index(("a", "b"))
+    assert "INDEXED BY" not in lb.explain((Q.b < 50) & (Q.a == 1))["sql"]
+    assert "INDEXED BY idx_a" in lb.explain(Q.a == 1)["sql"]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_q_errors(engine):
+    lb = make_box(engine)
+    with AssertRaises(InvalidQueryError):
+        lb.find(Q.nope == 1)
+    with AssertRaises(InvalidQueryError):
+        lb.find(Q.a == 1, params=(1,))
+    with AssertRaises(InvalidQueryError):
+        (Q.a == 1) & "b == 2"
+    with AssertRaises(TypeError):
+        Q.a == 1 & Q.b == 2  # needs parentheses
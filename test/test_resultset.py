@@ -0,0 +1,98 @@
+import pytest
+
+from litebox import LiteBox, Q
+from litebox.exceptions import InvalidQueryError
+from litebox.resultset import ResultSet
+from .conftest import ENGINES, ids
+
+
+def make_box(n=60, **kwargs):
+    """a, b and c are the id mod 2, 3 and 5, so the sets where each is 0 overlap in every way."""
+    data = [{"id": i, "a": i % 2, "b": i % 3, "c": i % 5} for i in range(n)]
+    return LiteBox(data, {"a": int, "b": int, "c": int}, **kwargs)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("key", [None, "id"])
+def test_set_algebra(engine, key):
+    lb = make_box(engine=engine, key=key)
+    a = lb.find("a = 0", result_set=True)
+    b = lb.find(Q.b == 0, result_set=True)
+    blocked = lb.find("c = 0", result_set=True)
+    assert isinstance(a, ResultSet)
+    assert len(a) == 30 and len(b) == 20
+    assert ids(a & b) == [i for i in range(60) if i % 6 == 0]
+    assert ids(a | b) == [i for i in range(60) if i % 2 == 0 or i % 3 == 0]
+    combined = (a | b) - blocked
+    expected = [i for i in range(60) if (i % 2 == 0 or i % 3 == 0) and i % 5 != 0]
+    assert ids(combined) == expected
+    assert ids(combined.objs()) == expected
+    assert isinstance(combined.ids, frozenset)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_within(engine):
+    lb = make_box(engine=engine)
+    rs = lb.find("a = 0", result_set=True) - lb.find("c = 0", result_set=True)
+    found = lb.find("b = 0", within=rs)
+    assert ids(found) == [i for i in range(60) if i % 6 == 0 and i % 5 != 0]
+    assert ids(lb.find(within=rs)) == ids(rs)
+    assert lb.find(Q.b == 0, within=rs, order_by="c desc", limit=2, columns=["c"]) == [
+        (4,),
+        (4,),
+    ]
+    assert len(lb.find_ids("b = ?", (1,), within=rs)) == 8
+    nested = lb.find("b = 0", within=rs, result_set=True)
+    assert ids(nested) == ids(found)
+
+
+def test_within_empty():
+    lb = make_box()
+    empty = lb.find("a = 2", result_set=True)
+    assert len(empty) == 0
+    assert lb.find("b = 0", within=empty) == []
+    assert lb.find(within=lb.find(result_set=True), limit=3) != []
+
+
+def test_removed_objects():
+    lb = make_box()
+    objs = list(lb)
+    rs = lb.find("a = 0", result_set=True)
+    lb.remove(objs[0])
+    assert objs[0] not in rs
+    assert objs[2] in rs
+    assert len(rs.objs()) == 29
+    assert len(lb.find(within=rs)) == 29
+
+
+def test_errors():
+    lb1 = make_box()
+    lb2 = make_box()
+    rs1 = lb1.find("a = 0", result_set=True)
+    rs2 = lb2.find("a = 0", result_set=True)
+    with pytest.raises(InvalidQueryError):
+        rs1 & rs2
+    with pytest.raises(InvalidQueryError):
+        lb1.find("b = 0", within=rs2)
+    with pytest.raises(InvalidQueryError):
+        lb1.find("b = 0", columns=["b"], result_set=True)
+    with pytest.raises(TypeError):
+        rs1 | [1, 2]
+
+
+def test_concurrent():
+    lb = make_box(concurrent=True)
+    rs = lb.find("a = 0", result_set=True)
+    assert len(lb.find("b = 0", within=rs)) == 10
+
+
+@pytest.mark.parametrize("columns", [None, ["b"]])
+def test_within_strategies(columns):
+    # Big enough for the planner, which picks between joining within and filtering by it.
+    lb = make_box(10000)
+    few = lb.find("c = 0 and b = 0 and a = 0", result_set=True)  # 334 ids
+    many = lb.find("c != 0", result_set=True)  # 8000 ids
+    for within, where in [(few, "a = 0"), (many, "b = 0 and c = 1")]:
+        found = lb.find(where, within=within, columns=columns)
+        expected = [o for o in lb.find(where) if o in within]
+        assert len(found) == len(expected) > 0
@@ -0,0 +1,198 @@
+import gc
+import random
+
+import pytest
+
+from litebox import LiteBox, Q, RTree
+from litebox.exceptions import (
+    IndexNotFoundError,
+    InvalidEngineError,
+    InvalidFields,
+    InvalidQueryError,
+)
+from .conftest import ids, ids_where
+
+POINT_FIELDS = {"x": float, "y": float, "c": int, "name": str}
+
+
+def make_points(n=5000):
+    random.seed(7)
+    return [
+        {
+            "id": i,
+            "x": random.random() * 100,
+            "y": random.random() * 100,
+            "c": i % 3,
+            "name": f"n{i % 10}",
+        }
+        for i in range(n)
+    ]
+
+
+def in_box(o, x0=10, x1=14, y0=50, y1=54):
+    return (
+        o["x"] is not None
+        and o["y"] is not None
+        and x0 <= o["x"] < x1
+        and y0 <= o["y"] <= y1
+    )
+
+
+def brute_nearest(objs, point, k, test=lambda o: True):
+    objs = [o for o in objs if o["x"] is not None and o["y"] is not None and test(o)]
+    objs.sort(key=lambda o: (o["x"] - point["x"]) ** 2 + (o["y"] - point["y"]) ** 2)
+    return [o["id"] for o in objs[:k]]
+
+
+def test_range_queries():
+    objs = make_points()
+    lb = LiteBox(objs, POINT_FIELDS, index=[RTree("x", "y"), "c"])
+    expected = ids_where(objs, in_box)
+    queries = [
+        ("x >= ? and x < ? and y between ? and ?", (10, 14, 50, 54)),
+        (
+            "x >= :x0 and x < :x1 and y >= :y0 and y <= :y1",
+            dict(x0=10, x1=14, y0=50, y1=54),
+        ),
+        ((Q.x >= 10) & (Q.x < 14) & Q.y.between(50, 54), None),
+    ]
+    for where, params in queries:
+        assert ids(lb.find(where, params)) == expected
+        assert "rtree_x_y__" in lb.explain(where, params)["sql"]
+    found = lb.find("c = 1 and x >= 10 and x < 14 and y between 50 and 54")
+    assert ids(found) == [i for i in expected if i % 3 == 1]
+    # One range, or ranges on other fields, don't use the R*Tree.
+    assert "rtree" not in lb.explain("x < 1")["sql"]
+    assert "rtree" not in lb.explain("x < 1 or y < 1")["sql"]
+
+
+def test_non_numeric_bounds():
+    objs = make_points(100)
+    lb = LiteBox(objs, POINT_FIELDS, index=[RTree("x", "y")])
+    # SQLite compares numbers as less than text; the R*Tree can't, so it's skipped.
+    assert ids(lb.find("x < ? and y < ?", ("a", "a"))) == ids(objs)
+    assert "rtree" not in lb.explain("x < ? and y < ?", ("a", "a"))["sql"]
+
+
+def test_nearest():
+    objs = make_points()
+    lb = LiteBox(objs, POINT_FIELDS, index=[RTree("x", "y")])
+    for point in [{"x": 30, "y": 40}, {"x": 0, "y": 100}, {"y": 1e4, "x": -1e4}]:
+        for k in [1, 5, 50]:
+            assert [o["id"] for o in lb.find_nearest(point, k)] == brute_nearest(
+                objs, point, k
+            )
+    point = {"x": 30, "y": 40}
+    assert [o["id"] for o in lb.find_nearest(point, 5, "c = ?", (2,))] == brute_nearest(
+        objs, point, 5, lambda o: o["c"] == 2
+    )
+    assert [
+        o["id"] for o in lb.find_nearest(point, 3, "name = :name", {"name": "n7"})
+    ] == brute_nearest(objs, point, 3, lambda o: o["name"] == "n7")
+    assert [o["id"] for o in lb.find_nearest(point, 4, Q.c == 0)] == brute_nearest(
+        objs, point, 4, lambda o: o["c"] == 0
+    )
+    # Fewer matches than k.
+    assert len(lb.find_nearest(point, 10, "name = 'nobody'")) == 0
+    assert len(lb.find_nearest(point, 10**5)) == len(objs)
+    assert lb.find_nearest(point, 0) == []
+
+
+def test_nearest_small():
+    objs = make_points(20)
+    objs[0]["x"] = None
+    lb = LiteBox(objs, POINT_FIELDS, index=[RTree("x", "y")])
+    point = {"x": 50, "y": 50}
+    assert [o["id"] for o in lb.find_nearest(point, 25)] == brute_nearest(
+        objs, point, 25
+    )
+    assert (
+        LiteBox(on=POINT_FIELDS, index=[RTree("x", "y")]).find_nearest(point, 3) == []
+    )
+
+
+@pytest.mark.parametrize("key", [None, "id"])
+def test_changes(key):
+    objs = make_points(2000)
+    lb = LiteBox(objs, POINT_FIELDS, index=[RTree("x", "y")], key=key)
+    for o in objs[:100]:
+        o["x"] = 12.0
+        o["y"] = 52.0
+    objs[100]["x"] = None
+    lb.update(objs[0])
+    lb.update_many(objs[1:101])
+    lb.remove_many(objs[50:60])
+    lb.add({"id": 5000, "x": 11.0, "y": 53.0, "c": 0, "name": "new"})
+    if key is not None:
+        lb.upsert({"id": 0, "x": 90.0, "y": 90.0, "c": 0, "name": "moved"})
+    expected = ids_where(lb, in_box)
+    assert ids(lb.find("x >= 10 and x < 14 and y between 50 and 54")) == expected
+    n_points = lb.conn.execute("SELECT count(*) FROM rtree_x_y__").fetchone()[0]
+    assert n_points == len([o for o in lb if o["x"] is not None])
+    point = {"x": 12, "y": 52}
+    assert [o["id"] for o in lb.find_nearest(point, 3)][-1] in expected
+
+
+def test_weak_id_reuse():
+    class P:
+        def __init__(self, x, y):
+            self.x = x
+            self.y = y
+
+    lb = LiteBox(on={"x": float, "y": float}, index=[RTree("x", "y")], weak=True)
+    for i in range(50):
+        # Each P dies at once, so the next one may reuse its id.
+        lb.add(P(i, i))
+    keep = P(0.5, 0.5)
+    lb.add(keep)
+    gc.collect()
+    assert lb.find("x >= 0 and x < 1 and y >= 0 and y < 1") == [keep]
+    assert lb.conn.execute("SELECT count(*) FROM rtree_x_y__").fetchone()[0] == 1
+
+
+def test_create_and_drop():
+    objs = make_points(1000)
+    lb = LiteBox(objs, POINT_FIELDS, index=[("x", "y")])
+    lb.create_index(RTree("x", "y"))
+    lb.create_index(RTree("x", "y"))
+    assert lb.rtrees == {"x_y": ("x", "y")}
+    where = "x >= 10 and x < 14 and y between 50 and 54"
+    assert "rtree" in lb.explain(where)["sql"]
+    lb.drop_index(RTree("x", "y"))
+    assert lb.rtrees == {}
+    assert "rtree" not in lb.explain(where)["sql"]
+    assert ids(lb.find(where)) == ids_where(objs, in_box)
+    lb.add(objs[0].copy())  # no triggers left behind
+    with pytest.raises(IndexNotFoundError):
+        lb.drop_index(RTree("x", "y"))
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / "points.db")
+    objs = make_points(1000)
+    LiteBox(objs, POINT_FIELDS, index=[RTree("x", "y", "c")], key="id").save(path)
+    loaded = LiteBox.load(path, objs[100:])
+    assert loaded.rtrees == {"x_y_c": ("x", "y", "c")}
+    point = {"x": 20, "y": 20, "c": 1}
+    nearest = [o["id"] for o in loaded.find_nearest(point, 5)]
+    objs_3d = sorted(
+        objs[100:],
+        key=lambda o: (o["x"] - 20) ** 2 + (o["y"] - 20) ** 2 + (o["c"] - 1) ** 2,
+    )
+    assert nearest == [o["id"] for o in objs_3d[:5]]
+
+
+def test_errors():
+    with pytest.raises(InvalidFields):
+        RTree()
+    with pytest.raises(InvalidFields):
+        RTree("a", "b", "c", "d", "e", "f")
+    with pytest.raises(InvalidFields):
+        LiteBox(make_points(10), POINT_FIELDS, index=[RTree("x", "name")])
+    with pytest.raises(InvalidEngineError):
+        LiteBox(
+            make_points(10), POINT_FIELDS, index=[RTree("x", "y")], engine="columnar"
+        )
+    lb = LiteBox(make_points(10), POINT_FIELDS, index=[RTree("x", "y")])
+    with pytest.raises(InvalidQueryError):
+        lb.find_nearest({"x": 1}, 3)
@@ -0,0 +1,127 @@
+import random
+
+import pytest
+
+from litebox import LiteBox, Q
+from litebox.exceptions import InvalidFields, NotInIndexError
+from litebox.sharded import ShardedLiteBox
+from .conftest import ON
+
+
+def random_data(n=1000):
+    """x spread over the range shards' boundaries, s over a few hash buckets, and a null x."""
+    random.seed(0)
+    return [
+        {"x": random.randint(0, 99), "s": random.choice("abcd")} for _ in range(n)
+    ] + [{"x": None, "s": "z"}]
+
+
+def identities(objs):
+    return {id(o) for o in objs}
+
+
+SHARDINGS = [
+    dict(n_shards=4),
+    dict(n_shards=3, shard_on="x"),
+    dict(shard_on="x", boundaries=[25, 50, 75]),
+    dict(n_shards=1),
+]
+
+QUERIES = [
+    ("x = ?", (30,)),
+    ("x < 25", None),
+    ("x <= 25", None),
+    ("x > 50 and x <= 75", None),
+    ("x >= 50 and s = 'a'", None),
+    ("x between 10 and 30", None),
+    ("x in (1, 60, 99)", None),
+    ("x = 5 or s = 'b'", None),
+    ("x is null", None),
+    ("x is not null", None),
+    ("x != 3", None),
+    (Q.x.isin(range(40, 45)) | (Q.s == "c"), None),
+]
+
+
+@pytest.mark.parametrize("sharding", SHARDINGS)
+@pytest.mark.parametrize("where,params", QUERIES)
+def test_matches_litebox(sharding, where, params):
+    data = random_data()
+    lb = LiteBox(data, ON)
+    sb = ShardedLiteBox(data, ON, index=["x"], **sharding)
+    assert len(sb) == len(data)
+    assert identities(sb.find(where, params)) == identities(lb.find(where, params))
+    assert sb.count(where, params) == lb.count(where, params)
+    assert sb.exists(where, params) == lb.exists(where, params)
+
+
+@pytest.mark.parametrize("sharding", SHARDINGS)
+def test_order_by_limit(sharding):
+    data = random_data()
+    lb = LiteBox(data, ON)
+    sb = ShardedLiteBox(data, ON, **sharding)
+    for order_by in ["x", "x desc", "s, x desc", "s desc, x"]:
+        expected = lb.find("x >= 10", order_by=order_by, limit=20, offset=5)
+        found = sb.find("x >= 10", order_by=order_by, limit=20, offset=5)
+        key = [(d["s"], d["x"]) for d in expected]
+        assert [(d["s"], d["x"]) for d in found] == key
+    assert sb.find(order_by="x", limit=1)[0]["x"] is None  # nulls first
+
+
+def test_range_pruning():
+    data = random_data()
+    sb = ShardedLiteBox(data, ON, shard_on="x", boundaries=[25, 50, 75])
+    assert sb._prune("x = 30", None) == [sb.shards[1]]
+    assert sb._prune("x < 25", None) == sb.shards[:1]
+    assert sb._prune("x >= 50 and x < 60", None) == [sb.shards[2]]
+    assert sb._prune("x between ? and ?", (20, 30)) == sb.shards[:2]
+    assert sb._prune(Q.x.isin([1, 99]), None) == [sb.shards[0], sb.shards[3]]
+    assert sb._prune("x = 1 or s = 'a'", None) == sb.shards
+    assert sb._prune("x is null", None) == sb.shards[:1]
+    assert sb._prune("x = '30'", None) == sb.shards  # text might match a number
+
+
+def test_hash_pruning():
+    sb = ShardedLiteBox(random_data(), ON, n_shards=4, shard_on="s")
+    assert len(sb._prune("s = 'a'", None)) == 1
+    assert len(sb._prune("s > 'a'", None)) == 4
+
+
+def test_writes():
+    data = random_data(100)
+    sb = ShardedLiteBox(data, ON, shard_on="x", boundaries=[50])
+    extra = {"x": 10, "s": "e"}
+    sb.add(extra)
+    sb.add(extra)
+    sb.add_many([{"x": 60, "s": "e"}, {"x": 70, "s": "e"}])
+    assert sb.count("s = 'e'") == 3
+    assert extra in sb.shards[0]
+
+    extra["x"] = 90  # moves to the other shard on update
+    sb.update(extra)
+    assert extra in sb.shards[1]
+    assert sb.find("x = 90 and s = 'e'") == [extra]
+
+    sb.remove(extra)
+    assert extra not in sb
+    with pytest.raises(NotInIndexError):
+        sb.remove(extra)
+    assert sb.remove_many(data[:10] + [extra]) == [extra]
+    assert len(sb) == len(data) + 2 - 10
+
+
+def test_indices():
+    sb = ShardedLiteBox(random_data(), ON, index=[], n_shards=2)
+    sb.create_index("x")
+    assert all(s.indices == {"x": ("x",)} for s in sb.shards)
+    sb.drop_index("x")
+    assert all(s.indices == {} for s in sb.shards)
+
+
+def test_bad_config():
+    with pytest.raises(InvalidFields):
+        ShardedLiteBox(on=ON, boundaries=[1])
+    with pytest.raises(InvalidFields):
+        ShardedLiteBox(on=ON, shard_on="y")
+    with pytest.raises(InvalidFields):
+        ShardedLiteBox(on=ON, shard_on="x", boundaries=[2, 1])
@@ -0,0 +1,125 @@
+import sqlite3
+
+import pytest
+
+from litebox import LiteBox, Q
+from litebox.exceptions import (
+    InvalidEngineError,
+    InvalidFields,
+    InvalidSnapshotError,
+    KeyNotSetError,
+)
+from litebox.planner import MIN_PLANNED_ROWS
+from .conftest import ON, AssertRaises, make_data
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+@pytest.mark.parametrize("concurrent", [False, True])
+def test_save_load(tmp_path, mmap, concurrent):
+    path = str(tmp_path / "box.db")
+    lb = LiteBox(make_data(), ON, index=["x", ("x", "s")], key="id")
+    lb.save(path)
+
+    # Objects 0-9 are gone; 100-109 are new.
+    objs = make_data(10, 110)
+    loaded = LiteBox.load(path, objs, mmap=mmap, concurrent=concurrent)
+    assert len(loaded) == 100
+    assert loaded.indices == lb.indices
+    found = loaded.find("x = 3")
+    assert len(found) == 10
+    assert all(any(obj is o for o in objs) for obj in found)
+    assert {d["id"] for d in loaded.find(Q.s.isin(["5", "50", "105"]))} == {50, 105}
+
+    # The loaded box works like any other.
+    loaded.add({"id": -1, "x": 3, "s": "new"})
+    loaded.remove(objs[3])  # x = 3
+    assert loaded.count("x = 3") == 10
+    assert any("idx_x" in step for step in loaded.explain("x = ?", (3,))["plan"])
+
+
+def test_save_load_again(tmp_path):
+    path = str(tmp_path / "box.db")
+    LiteBox(make_data(), ON, key="id").save(path)
+    objs = make_data()
+    loaded = LiteBox.load(path, objs)
+    loaded.add({"id": 100, "x": 0, "s": "100"})
+    loaded.save(path)  # the file it's mapped onto
+    reloaded = LiteBox.load(path, objs + [{"id": 100, "x": 0, "s": "100"}])
+    assert reloaded.count("x = 0") == 11
+    loaded.save(str(tmp_path / "other.db"))
+    assert LiteBox.load(str(tmp_path / "other.db"), objs, mmap=False).count() == 100
+
+
+@pytest.mark.parametrize("concurrent", [False, True])
+def test_load_mmap_leaves_file_unchanged(tmp_path, concurrent):
+    path = str(tmp_path / "box.db")
+    objs = make_data()
+    LiteBox(objs, ON, key="id").save(path)
+    with open(path, "rb") as f:
+        saved = f.read()
+
+    loaded = LiteBox.load(path, objs, concurrent=concurrent)
+    assert loaded.count("x = 0") == 10
+    assert loaded._path is not None  # still read in place, as nothing changed
+    extra = {"id": 100, "x": 0, "s": "extra"}
+    loaded.add(extra)
+    loaded.remove(objs[0])
+    assert loaded.count("x = 0") == 10
+    assert loaded._path is None
+    del loaded
+    with open(path, "rb") as f:
+        assert f.read() == saved
+
+    # Row ids continue after the saved ones, even for rows the file has never seen.
+    new = {"id": 101, "x": 0, "s": "new"}
+    loaded = LiteBox.load(path, objs + [extra, new], concurrent=concurrent)
+    assert loaded.count("x = 0") == 12
+    loaded.add({"id": 102, "x": 0, "s": "newer"})
+    assert loaded.count("x = 0") == 13
+
+
+@pytest.mark.parametrize("concurrent", [False, True])
+def test_copy_on_write_closes_file(tmp_path, concurrent):
+    path = str(tmp_path / "box.db")
+    objs = make_data()
+    LiteBox(objs, ON, key="id").save(path)
+    loaded = LiteBox.load(path, objs, concurrent=concurrent)
+    assert loaded.count("x = 0") == 10
+    conns = [loaded.conn, loaded._reader()]
+    loaded.add({"id": 100, "x": 0, "s": "100"})
+    for conn in conns:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+    assert loaded.count("x = 0") == 11
+
+
+def test_load_keeps_planner_stats(tmp_path):
+    path = str(tmp_path / "box.db")
+    data = [{"id": i, "x": i} for i in range(2 * MIN_PLANNED_ROWS)]
+    LiteBox(data, {"x": int}, key="id").save(path)
+    loaded = LiteBox.load(path, data)
+    assert loaded._planner.sample_rows > 0
+    assert not loaded._planner.needs_refresh(len(loaded))
+    assert loaded.explain("x < 5")["estimate_source"] == "sample"
+
+
+def test_save_load_errors(tmp_path):
+    path = str(tmp_path / "box.db")
+    with AssertRaises(KeyNotSetError):
+        LiteBox(make_data(), ON).save(path)
+    with AssertRaises(InvalidEngineError):
+        LiteBox(make_data(), ON, key="id", engine="columnar").save(path)
+    with AssertRaises(InvalidSnapshotError):
+        LiteBox.load(path, [])
+    with open(path, "w") as f:
+        f.write("not a database")
+    with AssertRaises(InvalidSnapshotError):
+        LiteBox.load(path, [])
+
+    LiteBox(make_data(), ON, key="id").save(path)
+    with AssertRaises(InvalidFields):
+        LiteBox.load(path, [], on={"x": int})
+    with AssertRaises(InvalidFields):
+        LiteBox.load(path, [], key="s")
+    with AssertRaises(InvalidEngineError):
+        LiteBox.load(path, [], engine="columnar")
@@ -0,0 +1,178 @@
+import gc
+from typing import List
+
+import pytest
+
+from litebox import LiteBox, Q, Text
+from litebox.exceptions import InvalidEngineError, InvalidFields, InvalidQueryError
+from .conftest import ids
+
+DESCRIPTIONS = [
+    "the quick brown fox",
+    "a lazy dog sleeps all day",
+    "quick quick quick",
+    "the fox and the dog",
+    None,
+    "brown bear",
+]
+
+
+DOC_FIELDS = {"desc": Text, "price": int}
+
+
+def make_docs():
+    return [{"id": i, "desc": d, "price": i} for i, d in enumerate(DESCRIPTIONS)]
+
+
+def ranked_ids(objs):
+    """The ids of objs in the order found, for checking the ranking."""
+    return [o["id"] for o in objs]
+
+
+def check_index(lb, field="desc"):
+    lb.conn.execute(
+        f"INSERT INTO fts_{field}__(fts_{field}__) VALUES ('integrity-check')"
+    )
+
+
+def test_match():
+    lb = LiteBox(make_docs(), DOC_FIELDS)
+    assert ids(lb.find(Q.desc.match("fox"))) == [0, 3]
+    assert ids(lb.find(Q.desc.match("qu*") | (Q.price == 5))) == [0, 2, 5]
+    assert ids(lb.find(~Q.desc.match("fox") & (Q.price < 4))) == [1, 2]
+    assert lb.count(Q.desc.match("the")) == 2
+    assert lb.exists(Q.desc.match('"brown bear"'))
+    # The column is still an ordinary str column.
+    assert ids(lb.find("desc LIKE ?", ("%bear",))) == [5]
+
+
+def test_ranked():
+    lb = LiteBox(make_docs(), DOC_FIELDS)
+    # "quick" three times ranks above "quick" once.
+    assert ranked_ids(lb.find(match="quick")) == [2, 0]
+    assert ranked_ids(lb.find(match="quick", limit=1)) == [2]
+    assert ranked_ids(lb.find(match={"desc": "quick"}, order_by="price")) == [0, 2]
+    assert ranked_ids(lb.find("price > ?", (0,), match="quick OR fox")) == [2, 3]
+    assert ranked_ids(lb.find("price > :p", {"p": 0}, match="fox", offset=0)) == [3]
+    # A match of two of the words ranks above matches of one.
+    assert ranked_ids(lb.find(Q.price < 4, match="fox OR dog"))[0] == 3
+    assert lb.find(match="fox", columns=["price"], order_by="price") == [(0,), (3,)]
+    assert sorted(lb.find_ids(match="fox")) == sorted(
+        id(o) for o in lb.find(Q.desc.match("fox"))
+    )
+    assert lb.find(match="zebra") == []
+
+
+def test_two_text_fields():
+    objs = [
+        {"title": "fox", "body": "a dog"},
+        {"title": "dog", "body": "a fox"},
+        {"title": "cat", "body": "fox fox fox"},
+    ]
+    lb = LiteBox(objs, {"title": Text, "body": Text})
+    assert lb.find(match={"title": "fox", "body": "dog"}) == [objs[0]]
+    assert lb.find(Q.title.match("dog") | Q.body.match("dog"), order_by="title") == [
+        objs[1],
+        objs[0],
+    ]
+    with pytest.raises(InvalidQueryError):
+        lb.find(match="fox")
+
+
+def test_within():
+    lb = LiteBox(make_docs(), DOC_FIELDS)
+    cheap = lb.find("price < 3", result_set=True)
+    assert ids(lb.find(match="quick OR dog", within=cheap)) == [0, 1, 2]
+    assert ids(lb.find(Q.desc.match("fox"), within=cheap)) == [0]
+
+
+@pytest.mark.parametrize("key", [None, "id"])
+def test_changes(key):
+    objs = make_docs()
+    lb = LiteBox(objs, DOC_FIELDS, key=key)
+    objs[0]["desc"] = "a slow turtle"
+    lb.update(objs[0])
+    objs[1]["desc"] = "turtle soup"
+    objs[4]["desc"] = "fox soup"
+    lb.update_many(objs[1:5])
+    assert ids(lb.find(Q.desc.match("turtle"))) == [0, 1]
+    assert ids(lb.find(match="fox")) == [3, 4]
+    lb.remove(objs[3])
+    lb.add({"id": 6, "desc": "red fox", "price": 6})
+    assert ids(lb.find(match="fox")) == [4, 6]
+    if key is not None:
+        lb.upsert({"id": 4, "desc": "no longer", "price": 4})
+        assert ids(lb.find(match="fox")) == [6]
+        lb.remove_key(6)
+        assert lb.find(match="fox") == []
+    check_index(lb)
+
+
+def test_weak_id_reuse():
+    class Doc:
+        def __init__(self, desc):
+            self.desc = desc
+
+    lb = LiteBox(on={"desc": Text}, weak=True)
+    for i in range(50):
+        # Each Doc dies at once, so the next one may reuse its id.
+        lb.add(Doc(f"word{i}"))
+    keep = Doc("kept")
+    lb.add(keep)
+    gc.collect()
+    assert lb.find(match="kept") == [keep]
+    assert lb.find(Q.desc.match("word1")) == []
+    check_index(lb)
+
+
+def test_eviction():
+    lb = LiteBox(make_docs(), DOC_FIELDS, max_size=3, eviction="fifo")
+    assert ids(lb) == [3, 4, 5]
+    assert ids(lb.find(match="quick OR fox OR bear")) == [3, 5]
+    check_index(lb)
+
+
+def test_planned_queries():
+    # Big enough for the planner to sample.
+    objs = [{"id": i, "desc": f"item {i % 7}", "price": i % 10} for i in range(10000)]
+    lb = LiteBox(objs, DOC_FIELDS)
+    for _ in range(3):
+        assert lb.count(Q.desc.match("3")) == len(
+            [i for i in range(10000) if i % 7 == 3]
+        )
+        found = lb.find(Q.desc.match("3") & (Q.price == 1))
+        assert len(found) == len(
+            [i for i in range(10000) if i % 7 == 3 and i % 10 == 1]
+        )
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / "docs.db")
+    objs = make_docs()
+    LiteBox(objs, DOC_FIELDS, key="id").save(path)
+    loaded = LiteBox.load(path, objs[1:], mmap=False)
+    assert loaded.fields == DOC_FIELDS
+    assert ids(loaded.find(match="quick")) == [2]
+    loaded = LiteBox.load(path, objs, key="id")
+    loaded.add({"id": 10, "desc": "new fox", "price": 10})
+    assert ids(loaded.find(Q.desc.match("fox"))) == [0, 3, 10]
+    check_index(loaded)
+
+
+def test_errors():
+    with pytest.raises(InvalidEngineError):
+        LiteBox(make_docs(), DOC_FIELDS, engine="columnar")
+    with pytest.raises(InvalidFields):
+        LiteBox(on={"desc": List[Text]})
+    lb = LiteBox(make_docs(), DOC_FIELDS)
+    with pytest.raises(InvalidQueryError):
+        lb.find(Q.price.match("3"))
+    with pytest.raises(InvalidQueryError):
+        lb.find(Q.desc.contains("fox"))
+    with pytest.raises(InvalidQueryError):
+        lb.find(match={"price": "3"})
+    with pytest.raises(InvalidQueryError):
+        lb.find(match={})
+    columnar = LiteBox(make_docs(), {"price": int}, engine="columnar")
+    with pytest.raises(InvalidEngineError):
+        columnar.find(match="fox")
@@ -0,0 +1,91 @@
+import copy
+import pickle
+from dataclasses import dataclass
+
+import pytest
+
+from litebox import LiteBox, Tracked, tracked
+from .conftest import ENGINES
+
+
+@tracked
+@dataclass
+class Photo:
+    width: int
+    height: int
+    caption: str = ""
+
+
+class Sprite(Tracked):
+    def __init__(self, x):
+        self.x = x
+        self.label = "sprite"
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_tracked_dataclass(engine):
+    photos = [Photo(width=i, height=i) for i in range(10)]
+    lb = LiteBox(photos, on={"width": int, "height": int}, track=True, engine=engine)
+    photos[0].width = 100
+    photos[1].width = 200
+    assert len(lb._dirty) == 2
+    found = lb.find("width >= 100")
+    assert sorted(found, key=lambda p: p.width) == [photos[0], photos[1]]
+    assert not lb._dirty
+
+
+def test_tracked_mixin():
+    sprites = [Sprite(i) for i in range(5)]
+    lb = LiteBox(on={"x": int}, track=True)
+    lb.add(sprites[0])
+    lb.add_many(sprites[1:])
+    sprites[2].x = 50
+    sprites[3].label = "not indexed"
+    assert list(lb._dirty.values()) == [sprites[2]]
+    assert lb.find("x == 50") == [sprites[2]]
+
+
+def test_untracked_box_ignores_changes():
+    photos = [Photo(width=1, height=1)]
+    lb = LiteBox(photos, on={"width": int})
+    photos[0].width = 5
+    assert lb.find("width == 5") == []
+
+
+def test_removed_objects_stop_tracking():
+    photos = [Photo(width=1, height=1), Photo(width=2, height=2)]
+    lb = LiteBox(photos, on={"width": int}, track=True)
+    photos[0].width = 5
+    lb.remove(photos[0])
+    lb.remove_many([photos[1]])
+    photos[1].width = 6
+    assert not lb._dirty
+    assert lb.find("width > 0") == []
+
+
+def test_one_object_in_two_boxes():
+    photo = Photo(width=1, height=1)
+    lb1 = LiteBox([photo], on={"width": int}, track=True)
+    lb2 = LiteBox([photo], on={"height": int}, track=True)
+    photo.width = 3
+    assert lb1.find("width == 3") == [photo]
+    assert not lb2._dirty  # height wasn't changed
+
+
+def test_callable_fields_track_every_attribute():
+    def area(p):
+        return p.width * p.height
+
+    photo = Photo(width=2, height=2)
+    lb = LiteBox([photo], on={area: int}, track=True)
+    photo.height = 5
+    assert lb.find("area == 10") == [photo]
+
+
+def test_copies_are_not_tracked():
+    photo = Photo(width=1, height=1)
+    lb = LiteBox([photo], on={"width": int}, track=True)
+    dupe = copy.copy(photo)
+    dupe.width = 7
+    assert not lb._dirty
+    assert pickle.loads(pickle.dumps(photo)) == photo
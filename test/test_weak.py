@@ -0,0 +1,80 @@
+import gc
+import threading
+
+import pytest
+
+from litebox import LiteBox, tracked
+from .conftest import ENGINES, Item
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("key", [None, "id"])
+def test_dead_objects_drop_out(engine, key):
+    items = [Item(i) for i in range(100)]
+    lb = LiteBox(items, {"x": int}, engine=engine, key=key, weak=True)
+    assert lb.count("x = 3") == 10
+    del items[:50]
+    gc.collect()
+    assert len(lb) == 50
+    assert lb.count("x = 3") == 5  # rows deleted before the query
+    assert all(obj.id >= 50 for obj in lb.find("x = 3"))
+    assert len(list(lb)) == 50
+    assert len(lb._dead) == 0
+
+
+@pytest.mark.parametrize("key", [None, "id"])
+def test_add_after_death(key):
+    lb = LiteBox(on={"x": int}, key=key, weak=True)
+    for i in range(100):
+        # Each Item dies right away, so new ones may reuse its id before the row is gone.
+        lb.add(Item(i))
+        lb.add_many([Item(i)])
+    keep = [Item(i) for i in range(10)]
+    lb.add_many(keep)
+    assert lb.count() == 10
+    assert sorted(o.id for o in lb.find("x >= 0")) == list(range(10))
+
+
+def test_weak_keys():
+    a = Item(1)
+    lb = LiteBox([a], {"x": int}, key="id", weak=True)
+    assert lb.get(1) is a
+    del a
+    gc.collect()
+    assert lb.get(1) is None
+    assert Item(1) not in lb
+    b = Item(1)
+    lb.upsert(b)
+    assert lb.get(1) is b
+    assert lb.find("x = 1") == [b]
+
+
+def test_weak_tracked():
+    @tracked
+    class Tracked:
+        def __init__(self, x):
+            self.x = x
+
+    objs = [Tracked(i) for i in range(10)]
+    lb = LiteBox(objs, {"x": int}, weak=True, track=True)
+    objs[0].x = 100
+    del objs[1:]
+    assert lb.find("x >= 0") == [objs[0]]
+
+
+def test_weak_concurrent():
+    items = [Item(i) for i in range(1000)]
+    lb = LiteBox(items, {"x": int}, weak=True, concurrent=True)
+
+    def drop():
+        del items[:500]
+
+    t = threading.Thread(target=drop)
+    t.start()
+    t.join()
+    assert lb.count("x = 3") == 50
+
+
+def test_weak_needs_weakrefs():
+    with pytest.raises(TypeError):
+        LiteBox([{"x": 1}], {"x": int}, weak=True)